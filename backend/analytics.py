@@ -1,32 +1,28 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from models import QuizAttempt, KnowledgeNode
+from datetime import datetime, timedelta
+import user_stats
 
 class AnalyticsEngine:
     def __init__(self, db: Session):
         self.db = db
 
     def get_student_stats(self, user_id: int):
-        # Total Quizzes
-        total_quizzes = self.db.query(QuizAttempt).filter(QuizAttempt.user_id == user_id).count()
-        
+        # Materialized in user_stats (maintained on submit): one primary-key lookup
+        stats = user_stats.get_stats(self.db, user_id)
+
         # Average Score
-        avg_score = self.db.query(func.avg(QuizAttempt.score)).filter(QuizAttempt.user_id == user_id).scalar() or 0.0
-        
-        # Strongest Topic
-        strongest = self.db.query(KnowledgeNode).filter(
-            KnowledgeNode.user_id == user_id
-        ).order_by(KnowledgeNode.strength_score.desc()).first()
+        avg_score = (stats.score_sum or 0.0) / stats.total_quizzes if stats.total_quizzes else 0.0
 
-        # Weakest Topic
-        weakest = self.db.query(KnowledgeNode).filter(
-            KnowledgeNode.user_id == user_id
-        ).order_by(KnowledgeNode.strength_score.asc()).first()
+        # Streak is broken once a full day passes without answers
+        today = datetime.utcnow().date()
+        active = stats.last_active_date is not None and stats.last_active_date >= today - timedelta(days=1)
 
         return {
-            "total_quizzes": total_quizzes,
+            "total_quizzes": stats.total_quizzes or 0,
             "average_score": round(avg_score, 1),
-            "strongest_topic": strongest.topic if strongest else "N/A",
-            "weakest_topic": weakest.topic if weakest else "N/A",
-            "mastery_level": "Intermediate" if avg_score > 70 else "Beginner" # Simple logic
-        }
\ No newline at end of file
+            "strongest_topic": stats.strongest_topic or "N/A",
+            "weakest_topic": stats.weakest_topic or "N/A",
+            "mastery_level": "Intermediate" if avg_score > 70 else "Beginner", # Simple logic
+            "current_streak": stats.current_streak if active else 0,
+            "longest_streak": stats.longest_streak or 0
+        }
@@ -0,0 +1,179 @@
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+import threading
+
+import config
+from models import QuestionLog, QuizAttempt, QuestionLogRollup
+from write_behind import log_writer
+
+# A chunk holding more than this many IDs is converted to a bitmap (both are ~8KB at that size)
+ARRAY_CONTAINER_LIMIT = 4096
+BITMAP_BYTES = 1 << 13  # 2^16 bits
+
+
+class AnsweredSet:
+    """
+    Compressed set of question IDs (roaring-style).
+    IDs are split by their high 16 bits into chunks. Sparse chunks are sorted
+    uint16 arrays, dense chunks are fixed 8KB bitmaps.
+    """
+    __slots__ = ("_chunks", "_size")
+
+    def __init__(self, ids=()):
+        self._chunks = {}
+        self._size = 0
+        for qid in ids:
+            self.add(qid)
+
+    def add(self, qid: int) -> bool:
+        """Adds an ID. Returns False if it was already present."""
+        high, low = qid >> 16, qid & 0xFFFF
+        chunk = self._chunks.get(high)
+
+        if chunk is None:
+            self._chunks[high] = array("H", [low])
+        elif isinstance(chunk, array):
+            i = bisect_left(chunk, low)
+            if i < len(chunk) and chunk[i] == low:
+                return False
+            if len(chunk) < ARRAY_CONTAINER_LIMIT:
+                chunk.insert(i, low)
+            else:
+                # Promote to bitmap container
+                bitmap = bytearray(BITMAP_BYTES)
+                for v in chunk:
+                    bitmap[v >> 3] |= 1 << (v & 7)
+                bitmap[low >> 3] |= 1 << (low & 7)
+                self._chunks[high] = bitmap
+        else:
+            byte, bit = low >> 3, 1 << (low & 7)
+            if chunk[byte] & bit:
+                return False
+            chunk[byte] |= bit
+
+        self._size += 1
+        return True
+
+    def __contains__(self, qid) -> bool:
+        chunk = self._chunks.get(qid >> 16)
+        if chunk is None:
+            return False
+        low = qid & 0xFFFF
+        if isinstance(chunk, array):
+            i = bisect_left(chunk, low)
+            return i < len(chunk) and chunk[i] == low
+        return bool(chunk[low >> 3] & (1 << (low & 7)))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        for high in sorted(self._chunks):
+            chunk = self._chunks[high]
+            base = high << 16
+            if isinstance(chunk, array):
+                for low in chunk:
+                    yield base | low
+            else:
+                for byte_idx, byte in enumerate(chunk):
+                    if not byte:
+                        continue
+                    for bit in range(8):
+                        if byte & (1 << bit):
+                            yield base | (byte_idx << 3) | bit
+
+
+class AnsweredSetCache:
+    """
+    LRU cache of AnsweredSet per user.
+    Sets are rebuilt lazily from question_logs (and archive rollups) on a miss and then kept
+    up to date by record() on every submit, so selection never re-reads history.
+    A rebuild that overlaps invalidate() (reset) is returned but not cached.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._sets = OrderedDict()
+        self._loading = {}  # user_id -> one list per rebuild in flight, of IDs recorded meanwhile
+        self._generations = {}  # user_id -> number of invalidations
+        self._lock = threading.Lock()
+
+    def get(self, db, user_id: int) -> AnsweredSet:
+        with self._lock:
+            answered = self._sets.get(user_id)
+            if answered is not None:
+                self._sets.move_to_end(user_id)
+                return answered
+            generation = self._generations.get(user_id, 0)
+            recorded = []
+            self._loading.setdefault(user_id, []).append(recorded)
+
+        try:
+            answered = self._load(db, user_id)
+        finally:
+            with self._lock:
+                pending = self._loading[user_id]
+                pending.remove(recorded)
+                if not pending:
+                    del self._loading[user_id]
+
+        with self._lock:
+            for qid in recorded:
+                answered.add(qid)
+            if self._generations.get(user_id, 0) != generation:
+                return answered # Reset during the rebuild: it may hold deleted answers
+            existing = self._sets.get(user_id)
+            if existing is not None:
+                # Another request finished the rebuild first
+                return existing
+            self._sets[user_id] = answered
+            while len(self._sets) > self.capacity:
+                self._sets.popitem(last=False)
+        return answered
+
+    def record(self, user_id: int, question_id: int):
+        """Marks a question as answered. No-op for users not in cache (rebuilt on next miss)."""
+        with self._lock:
+            answered = self._sets.get(user_id)
+            if answered is not None:
+                answered.add(question_id)
+            for recorded in self._loading.get(user_id, ()):
+                recorded.append(question_id)
+
+    def record_many(self, user_id: int, question_ids):
+        with self._lock:
+            answered = self._sets.get(user_id)
+            if answered is not None:
+                for qid in question_ids:
+                    answered.add(qid)
+            for recorded in self._loading.get(user_id, ()):
+                recorded.extend(question_ids)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._sets.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+
+    def _load(self, db, user_id: int) -> AnsweredSet:
+        rows = (
+            db.query(QuestionLog.question_id)
+            .join(QuizAttempt, QuestionLog.attempt_id == QuizAttempt.id)
+            .filter(QuizAttempt.user_id == user_id)
+            .yield_per(1000)
+        )
+        answered = AnsweredSet(qid for (qid,) in rows if qid is not None)
+        # Questions whose logs are archived (see log_archive.py)
+        for (qid,) in db.query(QuestionLogRollup.question_id).filter(QuestionLogRollup.user_id == user_id):
+            answered.add(qid)
+        # Answers still in the write-behind buffer aren't in question_logs yet
+        for qid in log_writer.pending_question_ids(user_id):
+            answered.add(qid)
+        return answered
+
+
+answered_cache = AnsweredSetCache(config.ANSWERED_CACHE_SIZE)
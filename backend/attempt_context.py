@@ -0,0 +1,119 @@
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+import threading
+
+import config
+from models import QuizAttempt, Quiz
+
+QUIZ_MODES = ("practice", "topic_mock", "final_mock")
+MOCK_EXAM_MODE = "mock_exam"
+
+DEFAULT_MAX_QUESTIONS = 50
+MOCK_EXAM_QUESTIONS = 90
+
+
+def questions_for_mode(mode: Optional[str]) -> int:
+    """Question cap for /quiz/start. Only an explicit practice mode is open-ended."""
+    return 30 if mode == "topic_mock" else (1000 if mode == "practice" else DEFAULT_MAX_QUESTIONS)
+
+
+def parse_legacy_quiz_title(title: str):
+    """
+    Recovers (mode, topic) from placeholder Quiz titles like "Kinematics (topic_mock)".
+    Used for attempts created before mode/topic were stored on the attempt.
+    """
+    if not title:
+        return None, None
+    topic, sep, rest = title.rpartition(" (")
+    mode = rest.rstrip(")") if sep else None
+    if mode in QUIZ_MODES:
+        return mode, topic
+    # Older titles
+    if "Final Adaptive Mock" in title:
+        return "final_mock", None
+    if "Mock" in title and sep:
+        return "topic_mock", topic
+    return None, None
+
+
+class AttemptContext(NamedTuple):
+    attempt_id: int
+    user_id: Optional[int]
+    subject_id: Optional[int]
+    exam_id: Optional[int]
+    mode: Optional[str]
+    topic: Optional[str]
+    max_questions: int
+    paper: Optional[tuple] = None # Pre-assembled mock exam: question IDs in order
+
+    @property
+    def forced_topic(self):
+        """Topic that every question must come from, if any."""
+        return self.topic if self.mode in ("topic_mock", "practice", None) else None
+
+
+class AttemptContextCache:
+    """
+    Resolved attempt metadata, loaded once per attempt.
+    Mode, topic and cap never change during an attempt, so next-question requests
+    don't need to re-read the attempt and its Quiz.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db, attempt_id: int) -> Optional[AttemptContext]:
+        with self._lock:
+            ctx = self._contexts.get(attempt_id)
+            if ctx is not None:
+                self._contexts.move_to_end(attempt_id)
+                return ctx
+
+        ctx = self._load(db, attempt_id)
+        if ctx is None:
+            return None
+
+        with self._lock:
+            self._contexts[attempt_id] = ctx
+            while len(self._contexts) > self.capacity:
+                self._contexts.popitem(last=False)
+        return ctx
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for attempt_id in [a for a, ctx in self._contexts.items() if ctx.user_id == user_id]:
+                del self._contexts[attempt_id]
+
+    def _load(self, db, attempt_id: int) -> Optional[AttemptContext]:
+        attempt = db.query(QuizAttempt).filter(QuizAttempt.id == attempt_id).first()
+        if not attempt:
+            return None
+
+        subject_id, mode, topic, max_q = attempt.subject_id, attempt.mode, attempt.topic, attempt.max_questions
+        if attempt.quiz_id and (mode is None or max_q is None or not subject_id):
+            # Attempt not migrated yet: fall back to its placeholder Quiz
+            quiz = db.query(Quiz).filter(Quiz.id == attempt.quiz_id).first()
+            if quiz:
+                subject_id = subject_id or quiz.subject_id
+                if mode is None:
+                    mode, topic = parse_legacy_quiz_title(quiz.title)
+                if max_q is None:
+                    max_q = quiz.questions_count
+        if max_q is None:
+            max_q = MOCK_EXAM_QUESTIONS if attempt.exam_id else DEFAULT_MAX_QUESTIONS
+
+        return AttemptContext(
+            attempt_id=attempt.id,
+            user_id=attempt.user_id,
+            subject_id=subject_id,
+            exam_id=attempt.exam_id,
+            mode=mode,
+            topic=topic,
+            max_questions=max_q,
+            paper=tuple(attempt.paper) if attempt.paper else None,
+        )
+
+
+attempt_contexts = AttemptContextCache(config.ATTEMPT_CONTEXT_CACHE_SIZE)
@@ -0,0 +1,68 @@
+from sqlalchemy import func, cast, Float, Integer
+
+from models import QuizAttempt, QuestionLog
+
+
+def apply_answers(db, attempt_id: int, answered: int, correct: int, time_taken: float):
+    """
+    Folds answers into the attempt's aggregates with a single atomic UPDATE (no commit).
+    The right-hand sides read the pre-update row, so concurrent submits can't lose counts.
+    """
+    answered_before = func.coalesce(QuizAttempt.answered_count, 0)
+    correct_before = func.coalesce(QuizAttempt.correct_count, 0)
+    return db.query(QuizAttempt).filter(QuizAttempt.id == attempt_id).update({
+        QuizAttempt.answered_count: answered_before + answered,
+        QuizAttempt.correct_count: correct_before + correct,
+        QuizAttempt.score: correct_before + correct, # Raw score
+        QuizAttempt.accuracy: cast(correct_before + correct, Float) / (answered_before + answered),
+        QuizAttempt.total_time: func.coalesce(QuizAttempt.total_time, 0.0) + time_taken,
+    }, synchronize_session=False)
+
+
+def recompute_aggregates(db, attempt_ids=None, fix: bool = False, hot_only: bool = True):
+    """
+    Recomputes attempt aggregates from question_logs and compares them with the stored ones.
+    Returns a list of (attempt_id, stored, expected) for every mismatch; rewrites them if fix=True.
+    hot_only skips attempts whose logs are archived (their stored aggregates are kept).
+    """
+    logs = db.query(
+        QuestionLog.attempt_id,
+        func.count(QuestionLog.id),
+        func.sum(cast(QuestionLog.is_correct, Integer)),
+        func.sum(QuestionLog.time_taken),
+    ).group_by(QuestionLog.attempt_id)
+    if attempt_ids is not None:
+        logs = logs.filter(QuestionLog.attempt_id.in_(attempt_ids))
+    expected_by_attempt = {
+        attempt_id: (total, correct or 0, time_taken or 0.0)
+        for attempt_id, total, correct, time_taken in logs
+    }
+
+    attempts = db.query(
+        QuizAttempt.id, QuizAttempt.answered_count, QuizAttempt.correct_count, QuizAttempt.total_time
+    )
+    if attempt_ids is not None:
+        attempts = attempts.filter(QuizAttempt.id.in_(attempt_ids))
+    if hot_only:
+        attempts = attempts.filter(QuizAttempt.archived_month.is_(None))
+
+    mismatches = []
+    for attempt_id, answered, correct, total_time in attempts.yield_per(1000):
+        total_e, correct_e, time_e = expected_by_attempt.get(attempt_id, (0, 0, 0.0))
+        stored = (answered or 0, correct or 0, round(total_time or 0.0, 3))
+        expected = (total_e, correct_e, round(time_e, 3))
+        if stored != expected:
+            mismatches.append((attempt_id, stored, expected))
+
+    if fix:
+        for attempt_id, _, (total_e, correct_e, time_e) in mismatches:
+            db.query(QuizAttempt).filter(QuizAttempt.id == attempt_id).update({
+                QuizAttempt.answered_count: total_e,
+                QuizAttempt.correct_count: correct_e,
+                QuizAttempt.score: correct_e,
+                QuizAttempt.accuracy: (correct_e / total_e) if total_e else 0.0,
+                QuizAttempt.total_time: time_e,
+            }, synchronize_session=False)
+        db.commit()
+
+    return mismatches
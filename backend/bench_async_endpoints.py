@@ -0,0 +1,189 @@
+"""
+Load test for the hot endpoints (/quiz/{id}/next, /quiz/submit, /dashboard/stats) with
+ASYNC_DB off (threadpool) and on. For each mode it starts the API on a fresh database
+and runs many concurrent simulated students: next question -> submit, and the dashboard
+every few answers. Prints throughput and latency per mode.
+
+BENCH_DB_LATENCY_MS adds a delay to every statement, standing in for the network round
+trip to a database server (a blocking sleep on the sync engine, an awaited one on the
+async engine); with a local database the run is CPU-bound and both modes look alike.
+
+Usage: python bench_async_endpoints.py [DATABASE_URL]   (default: a temporary SQLite file;
+       a PostgreSQL database is wiped and reseeded for each mode)
+Env:   BENCH_USERS (default 200), BENCH_SECONDS (default 20), BENCH_DB_LATENCY_MS (default 0)
+"""
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+USERS = int(os.getenv("BENCH_USERS", "200"))
+SECONDS = float(os.getenv("BENCH_SECONDS", "20"))
+LATENCY_MS = float(os.getenv("BENCH_DB_LATENCY_MS", "0"))
+PORT = 8765
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def prepare():
+    """Runs in a subprocess with the mode's env: fresh schema, exams and USERS students."""
+    import database
+    import models
+    from seed_exams import seed_exams
+
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    seed_exams()
+    db = database.SessionLocal()
+    users = [models.User(username=f"load{i}", email=f"load{i}@demo.com", hashed_password="x", is_verified=True)
+             for i in range(USERS)]
+    db.add_all(users)
+    db.commit()
+    print(json.dumps([u.id for u in users]))
+
+
+def serve():
+    """Runs the API in this process, with the simulated database latency."""
+    import uvicorn
+    from sqlalchemy import event
+    from sqlalchemy.util import await_only
+    import database
+    import main
+
+    delay = LATENCY_MS / 1000
+    if delay:
+        for engine in (database.engine, database.read_engine):
+            if engine is not None:
+                event.listen(engine, "before_cursor_execute", lambda *a: time.sleep(delay))
+        for engine in (database.async_engine, database.async_read_engine):
+            if engine is not None:
+                event.listen(engine.sync_engine, "before_cursor_execute",
+                             lambda *a: await_only(asyncio.sleep(delay)))
+    uvicorn.run(main.app, port=PORT, log_level="warning", timeout_keep_alive=300)
+
+
+async def student(client, user_id, deadline, latencies, errors):
+    async def call(name, method, url, **kwargs):
+        started = time.perf_counter()
+        r = await client.request(method, url, **kwargs)
+        latencies.setdefault(name, []).append(time.perf_counter() - started)
+        return r
+
+    attempt_id, answered = None, 0
+    while time.perf_counter() < deadline:
+        if attempt_id is None:
+            r = await call("start", "POST", f"/quiz/start?user_id={user_id}", json={
+                "subject_id": 1, "type": "basics", "topic": None, "mode": "practice",
+            })
+            attempt_id = r.json()["attempt_id"]
+        r = await call("next", "GET", f"/quiz/{attempt_id}/next?user_id={user_id}")
+        if r.status_code == 404:
+            attempt_id = None # Completed or out of questions: start another attempt
+            continue
+        if r.status_code != 200:
+            errors.append(r.status_code)
+            continue
+        q = r.json()
+        r = await call("submit", "POST", f"/quiz/submit?user_id={user_id}", json={
+            "question_id": q["id"], "selected_answer": random.choice(q["options"]),
+            "time_taken": 10.0, "attempt_id": attempt_id,
+        })
+        if r.status_code != 200:
+            errors.append(r.status_code)
+        answered += 1
+        if answered % 5 == 0:
+            await call("dashboard", "GET", f"/dashboard/stats?user_id={user_id}")
+
+
+async def load(user_ids):
+    latencies, errors = {}, []
+    limits = httpx.Limits(max_connections=len(user_ids), max_keepalive_connections=len(user_ids))
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=120) as client:
+        deadline = time.perf_counter() + SECONDS
+        started = time.perf_counter()
+        await asyncio.gather(*(student(client, uid, deadline, latencies, errors) for uid in user_ids))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+
+@contextlib.contextmanager
+def api_server(url, **env):
+    """Fresh database (prepare) and the API serving it, with env overrides; yields the user ids."""
+    env = dict(os.environ, DATABASE_URL=url, WRITE_BEHIND="false", PYTHONPATH=BACKEND_DIR, **env)
+    with tempfile.TemporaryDirectory() as tmp:
+        prep = subprocess.run([sys.executable, os.path.abspath(__file__), "--prepare"],
+                              cwd=tmp, env=env, capture_output=True, text=True)
+        if prep.returncode != 0:
+            raise RuntimeError(prep.stderr[-2000:])
+        user_ids = json.loads(prep.stdout.strip().splitlines()[-1])
+
+        log = open(os.path.join(tmp, "server.log"), "w")
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve"],
+            cwd=tmp, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        try:
+            ready_by = time.monotonic() + 600 # Startup seeds the question bank
+            while True:
+                try:
+                    if httpx.get(f"http://127.0.0.1:{PORT}/streams", timeout=5).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    if time.monotonic() > ready_by or server.poll() is not None:
+                        raise
+                time.sleep(0.5)
+            yield user_ids
+        except httpx.HTTPError as e:
+            with open(log.name) as f:
+                raise RuntimeError(f"Load failed: {e!r}\n{f.read()[-3000:]}")
+        finally:
+            server.terminate()
+            server.wait()
+            log.close()
+
+
+def run_mode(url, async_db):
+    try:
+        with api_server(url, ASYNC_DB=async_db) as user_ids:
+            return asyncio.run(load(user_ids))
+    except RuntimeError as e:
+        print(e)
+        return None
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--prepare"]:
+        prepare()
+        sys.exit(0)
+    if sys.argv[1:] == ["--serve"]:
+        serve()
+        sys.exit(0)
+
+    url = sys.argv[1] if len(sys.argv) > 1 else None
+    print(f"{USERS} concurrent students for {SECONDS:.0f}s per mode, {LATENCY_MS:g}ms per statement\n")
+    print(f"{'mode':<10} {'req/s':>8} {'answers/s':>10} {'next p50/p95 ms':>17} {'submit p50/p95 ms':>19} {'dash p95 ms':>12} {'errors':>7}")
+    for async_db in ("false", "true"):
+        with tempfile.TemporaryDirectory() as db_dir:
+            result = run_mode(url or f"sqlite:///{os.path.join(db_dir, 'bench.db')}", async_db)
+        name = "async" if async_db == "true" else "threadpool"
+        if result is None:
+            print(f"{name:<10} failed")
+            continue
+        latencies, errors, elapsed = result
+        requests = sum(len(v) for v in latencies.values())
+        nxt, sub = latencies.get("next", []), latencies.get("submit", [])
+        print(f"{name:<10} {requests / elapsed:>8.1f} {len(sub) / elapsed:>10.1f} "
+              f"{percentile(nxt, 0.5):>8.1f}/{percentile(nxt, 0.95):<8.1f} "
+              f"{percentile(sub, 0.5):>9.1f}/{percentile(sub, 0.95):<9.1f} "
+              f"{percentile(latencies.get('dashboard', []), 0.95):>12.1f} {len(errors):>7}")
@@ -0,0 +1,57 @@
+"""
+Micro-benchmark for BKT batch replay (bkt.run_sequences) against a per-answer Python loop.
+Builds synthetic answer histories (one sequence per user/topic) in memory.
+
+Usage: python bench_bkt.py [rows...]   (default: 100000 1000000)
+"""
+import sys
+import time
+
+import numpy as np
+
+from bkt import BKTParams, DEFAULT_PARAMS, bkt_step, run_sequences
+
+MEAN_SEQUENCE = 40
+
+
+def build(rows, rng):
+    lengths = rng.geometric(1 / MEAN_SEQUENCE, rows // MEAN_SEQUENCE)
+    lengths = lengths[np.cumsum(lengths) <= rows]
+    correct = rng.random(int(lengths.sum())) < 0.6
+    params = BKTParams(*(np.full(len(lengths), v) for v in DEFAULT_PARAMS))
+    return lengths, correct, params
+
+
+def loop(lengths, correct):
+    out, pos = [], 0
+    for n in lengths:
+        p = DEFAULT_PARAMS.prior
+        for k in range(n):
+            p = float(bkt_step(p, correct[pos + k], DEFAULT_PARAMS))
+        out.append(p)
+        pos += n
+    return np.array(out)
+
+
+def run(rows, rng):
+    lengths, correct, params = build(rows, rng)
+    start = time.perf_counter()
+    fast = run_sequences(lengths, correct, params)
+    vectorized = time.perf_counter() - start
+
+    # The loop is slow: time it on a slice and extrapolate
+    sample = min(len(lengths), 500)
+    start = time.perf_counter()
+    slow = loop(lengths[:sample], correct)
+    looped = (time.perf_counter() - start) * len(lengths) / sample
+
+    assert np.allclose(fast[:sample], slow)
+    print(f"{int(lengths.sum()):>9} answers ({len(lengths):>6} sequences)  "
+          f"vectorized={vectorized * 1000:8.1f}ms  loop~{looped * 1000:9.1f}ms")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000]
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        run(n, rng)
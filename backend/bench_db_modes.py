@@ -0,0 +1,113 @@
+"""
+Compares /quiz/submit throughput across database backends: SQLite with default
+settings, SQLite with the tuned profile (WAL etc., see database.py) and, when a URL
+is given, PostgreSQL. Each mode runs in its own process against a fresh database,
+with concurrent users each answering in their own attempt.
+
+Usage: python bench_db_modes.py [postgresql+psycopg2://user:pw@host/scratch_db]
+       (the PostgreSQL database should be empty; tables are created and reseeded)
+Env:   BENCH_USERS (default 8), BENCH_ANSWERS per user (default 50)
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+USERS = int(os.getenv("BENCH_USERS", "8"))
+ANSWERS = int(os.getenv("BENCH_ANSWERS", "50"))
+
+
+def worker():
+    """Runs inside the per-mode process: DATABASE_URL / SQLITE_PROFILE are already set."""
+    from fastapi.testclient import TestClient
+    import database
+    import main
+    import models
+    from seed_exams import seed_exams
+
+    seed_exams()
+    db = database.SessionLocal()
+    user_ids = []
+    for i in range(USERS):
+        user = models.User(username=f"bench{i}", email=f"bench{i}@demo.com", hashed_password="x", is_verified=True)
+        db.add(user)
+        db.flush()
+        user_ids.append(user.id)
+    db.commit()
+
+    with TestClient(main.app) as client:
+        subject_id, topic = db.query(models.Question.subject_id, models.Question.topic).first()
+        questions = [
+            (q.id, q.correct_answer) for q in
+            db.query(models.Question).filter(models.Question.subject_id == subject_id).limit(500)
+        ]
+        db.close()
+
+        def run_user(user_id):
+            attempt = client.post(f"/quiz/start?user_id={user_id}", json={
+                "subject_id": subject_id, "type": "basics", "topic": topic, "mode": "topic_mock",
+            }).json()
+            latencies = []
+            for _ in range(ANSWERS):
+                question_id, correct = random.choice(questions)
+                started = time.perf_counter()
+                r = client.post(f"/quiz/submit?user_id={user_id}", json={
+                    "question_id": question_id,
+                    "selected_answer": correct if random.random() < 0.6 else "x",
+                    "time_taken": 5.0,
+                    "attempt_id": attempt["attempt_id"],
+                })
+                latencies.append(time.perf_counter() - started)
+                r.raise_for_status()
+            return latencies
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=USERS) as pool:
+            latencies = sorted(l for user in pool.map(run_user, user_ids) for l in user)
+        elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        "answers": len(latencies),
+        "per_sec": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }))
+
+
+def run_mode(url, sqlite_profile):
+    env = dict(os.environ, DATABASE_URL=url, SQLITE_PROFILE=sqlite_profile, WRITE_BEHIND="false")
+    with tempfile.TemporaryDirectory() as tmp:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker"],
+            cwd=tmp, env=env, capture_output=True, text=True,
+        )
+    if out.returncode != 0:
+        print(out.stderr[-2000:])
+        return None
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--worker"]:
+        worker()
+        sys.exit(0)
+
+    modes = [
+        ("sqlite (default)", "sqlite:///./bench.db", "default"),
+        ("sqlite (tuned)", "sqlite:///./bench.db", "tuned"),
+    ]
+    if len(sys.argv) > 1:
+        modes.append(("postgresql", sys.argv[1], "tuned"))
+
+    print(f"{USERS} concurrent users x {ANSWERS} answers\n")
+    print(f"{'mode':<18} {'answers/s':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, url, profile in modes:
+        result = run_mode(url, profile)
+        if result is None:
+            print(f"{name:<18} failed")
+            continue
+        print(f"{name:<18} {result['per_sec']:>10.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}")
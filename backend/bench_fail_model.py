@@ -0,0 +1,70 @@
+"""
+Benchmark for dashboard fail-probability scoring: feature rows for every topic of a user
+and one vectorized FailModel.predict call, with a model trained on synthetic data.
+Fails (exit 1) if the p99 per user exceeds the budget.
+
+Usage: python bench_fail_model.py [topics...]   (default: 10 50 200)
+"""
+import sys
+import time
+
+import numpy as np
+
+from fail_model import FailModel, topic_features, train, RECENT_WINDOW
+
+BUDGET_MS = 3.0
+USERS = 2000
+
+
+def synthetic_model(rng):
+    rows = 20_000
+    strength = rng.random(rows)
+    X = np.column_stack([
+        strength, rng.random(rows), rng.random(rows), rng.random(rows) * 4,
+        rng.normal(0, 0.3, rows), rng.random(rows) * 3,
+    ])
+    y = (rng.random(rows) < 1 - 0.8 * strength).astype(int)
+    pipeline, _ = train(X, y, rng.integers(0, 500, rows))
+
+    model = FailModel.from_pipeline(pipeline)
+
+    # Folded weights must match the sklearn pipeline
+    assert np.allclose(model.predict(X[:100]), pipeline.predict_proba(X[:100])[:, 1])
+    return model, pipeline
+
+
+def run(topics, model, pipeline, rng):
+    users = []
+    for _ in range(USERS):
+        users.append([
+            (rng.random(), [(rng.random() < 0.6, rng.random() * 60, rng.random()) for _ in range(rng.integers(0, RECENT_WINDOW + 1))], rng.random() * 30)
+            for _ in range(topics)
+        ])
+
+    timings = []
+    for user in users:
+        start = time.perf_counter()
+        probabilities = model.predict([topic_features(s, recent, idle) for s, recent, idle in user])
+        np.argsort(-probabilities)[:3]
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # Same rows through sklearn's predict_proba, for reference
+    rows = np.array([topic_features(s, recent, idle) for s, recent, idle in users[0]])
+    start = time.perf_counter()
+    for _ in range(200):
+        pipeline.predict_proba(rows)
+    sklearn_ms = (time.perf_counter() - start) * 1000 / 200
+
+    p50, p99 = np.percentile(timings, [50, 99])
+    ok = p99 <= BUDGET_MS
+    print(f"{topics:>4} topics/user  p50={p50:.3f}ms  p99={p99:.3f}ms  "
+          f"(sklearn predict_proba alone {sklearn_ms:.3f}ms)  {'OK' if ok else 'OVER BUDGET'}")
+    return ok
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10, 50, 200]
+    rng = np.random.default_rng(0)
+    model, pipeline = synthetic_model(rng)
+    results = [run(n, model, pipeline, rng) for n in sizes]
+    sys.exit(0 if all(results) else 1)
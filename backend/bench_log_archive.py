@@ -0,0 +1,137 @@
+"""
+Measures what archiving question_logs buys on a database with long histories.
+Builds a temporary SQLite database with BENCH_USERS students, each with BENCH_ATTEMPTS
+completed attempts spread over the last two years, times the log-reading paths, runs
+log_archive.archive_logs() (default horizon) and times them again.
+
+Usage: python bench_log_archive.py
+Env:   BENCH_USERS (default 1000), BENCH_ATTEMPTS per user (default 30), BENCH_LOGS per attempt (default 20)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ["LOG_ARCHIVE_DIR"] = os.path.join(_tmp, "archive")
+
+from sqlalchemy import text
+
+import database
+import item_calibration
+import log_archive
+import migrations
+import models
+from answered_cache import AnsweredSetCache
+from attempt_scoring import recompute_aggregates
+from predictor import PredictorEngine
+
+USERS = int(os.getenv("BENCH_USERS", "1000"))
+ATTEMPTS = int(os.getenv("BENCH_ATTEMPTS", "30"))
+LOGS = int(os.getenv("BENCH_LOGS", "20"))
+QUESTIONS = 3000
+TOPICS = [f"Topic {i}" for i in range(30)]
+SAMPLE = 200
+
+
+def build():
+    models.Base.metadata.create_all(bind=database.engine)
+    migrations.upgrade()
+    random.seed(7)
+    now = datetime.utcnow()
+    with database.engine.begin() as conn:
+        conn.execute(text("INSERT INTO streams (id, name) VALUES (1, 'Bench')"))
+        conn.execute(text("INSERT INTO exams (id, name, stream_id) VALUES (1, 'Bench', 1)"))
+        conn.execute(text("INSERT INTO subjects (id, name, exam_id) VALUES (1, 'Bench', 1)"))
+        conn.execute(models.Question.__table__.insert(), [
+            {"id": q, "subject_id": 1, "topic": random.choice(TOPICS), "difficulty": random.random(),
+             "content": f"Q{q}", "options": ["a", "b", "c", "d"], "correct_answer": "a"}
+            for q in range(1, QUESTIONS + 1)
+        ])
+        conn.execute(models.User.__table__.insert(), [
+            {"id": u, "username": f"bench{u}", "email": f"bench{u}@demo.com", "hashed_password": "x", "is_verified": True}
+            for u in range(1, USERS + 1)
+        ])
+        attempt_id, log_id = 0, 0
+        for u in range(1, USERS + 1):
+            attempts, logs = [], []
+            for started in sorted(now - timedelta(days=random.uniform(0, 730)) for _ in range(ATTEMPTS)):
+                attempt_id += 1
+                correct = 0
+                for _ in range(LOGS):
+                    log_id += 1
+                    is_correct = random.random() < 0.6
+                    correct += is_correct
+                    logs.append({"id": log_id, "attempt_id": attempt_id, "question_id": random.randint(1, QUESTIONS),
+                                 "selected_answer": "a" if is_correct else "b", "is_correct": is_correct,
+                                 "time_taken": 5.0, "difficulty_at_time": 0.5})
+                attempts.append({"id": attempt_id, "user_id": u, "subject_id": 1, "timestamp": started,
+                                 "completed": True, "answered_count": LOGS, "correct_count": correct,
+                                 "score": correct, "total_time": 5.0 * LOGS, "mode": "practice", "max_questions": LOGS})
+            conn.execute(models.QuizAttempt.__table__.insert(), attempts)
+            conn.execute(models.QuestionLog.__table__.insert(), logs)
+    return log_id
+
+
+def live_bytes():
+    with database.engine.connect() as conn:
+        pages, free, size = (conn.exec_driver_sql(f"PRAGMA {p}").scalar() for p in ("page_count", "freelist_count", "page_size"))
+    return (pages - free) * size
+
+
+def measure():
+    """Seconds for: cold answered-set loads and predictor history reads of SAMPLE users,
+    a full attempt-aggregate check and item calibration."""
+    users = random.Random(1).sample(range(1, USERS + 1), min(SAMPLE, USERS))
+    db = database.SessionLocal()
+    try:
+        timings = {}
+        started = time.perf_counter()
+        for u in users:
+            AnsweredSetCache(1)._load(db, u)
+        timings["answered set (per user)"] = (time.perf_counter() - started) / len(users)
+        predictor = PredictorEngine(db)
+        started = time.perf_counter()
+        for u in users:
+            predictor._recent_answers(u)
+        timings["predictor history (per user)"] = (time.perf_counter() - started) / len(users)
+        started = time.perf_counter()
+        recompute_aggregates(db)
+        timings["aggregate check"] = time.perf_counter() - started
+        started = time.perf_counter()
+        item_calibration.calibrate(db)
+        timings["item calibration (incl. archive)"] = time.perf_counter() - started
+        sets = {u: sorted(AnsweredSetCache(1)._load(db, u)) for u in users}
+        return timings, sets
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print(f"Building {USERS} users x {ATTEMPTS} attempts x {LOGS} logs over two years...")
+    total = build()
+    size_before = live_bytes()
+    before, sets_before = measure()
+
+    started = time.perf_counter()
+    moved = log_archive.archive_logs()
+    archive_seconds = time.perf_counter() - started
+    archived = sum(logs for _, logs in moved.values())
+    size_after = live_bytes()
+    after, sets_after = measure()
+
+    archive_dir = os.environ["LOG_ARCHIVE_DIR"]
+    files = sum(os.path.getsize(os.path.join(archive_dir, f)) for f in os.listdir(archive_dir))
+    print(f"Archived {archived} of {total} logs into {len(moved)} months in {archive_seconds:.1f}s "
+          f"({archived / archive_seconds:.0f} logs/s)")
+    print(f"Main database live data: {size_before / 2**20:.1f} MiB -> {size_after / 2**20:.1f} MiB "
+          f"(archives {files / 2**20:.1f} MiB; VACUUM returns the freed pages to the OS)\n")
+    print(f"{'':<34} {'before':>10} {'after':>10}")
+    for name in before:
+        unit, scale = ("ms", 1000) if "per user" in name else ("s", 1)
+        print(f"{name:<34} {before[name] * scale:>8.2f}{unit:>2} {after[name] * scale:>8.2f}{unit:>2}")
+    print(f"\nAnswered sets unchanged: {sets_before == sets_after}")
+    sys.exit(0 if sets_before == sets_after else 1)
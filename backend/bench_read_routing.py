@@ -0,0 +1,73 @@
+"""
+Load test for read/write routing: READ_ROUTING off (every request on the primary) and
+on (read-only endpoints on the read engine). Half the users answer questions; the
+other half are viewers polling dashboards and leaderboards of users who aren't
+answering, so their reads are eligible for the read engine. The dashboard cache is
+off so every view reaches the database. Prints throughput, latency and the
+read_routing metrics of each run.
+
+Usage: python bench_read_routing.py [DATABASE_URL [READ_DATABASE_URL]]
+       (default: a temporary SQLite file, read through a second mode=ro pool)
+Env:   BENCH_USERS (default 200), BENCH_SECONDS (default 20), BENCH_DB_LATENCY_MS (default 0)
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench_async_endpoints import PORT, SECONDS, LATENCY_MS, USERS, api_server, percentile, student
+
+
+async def viewer(client, user_ids, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        user_id = random.choice(user_ids)
+        for name, url in (("dashboard", f"/dashboard/stats?user_id={user_id}"),
+                          ("leaderboard", f"/leaderboard/subject/1?user_id={user_id}")):
+            started = time.perf_counter()
+            r = await client.get(url)
+            latencies.setdefault(name, []).append(time.perf_counter() - started)
+            if r.status_code != 200:
+                errors.append(r.status_code)
+
+
+async def load(user_ids):
+    latencies, errors = {}, []
+    students, viewed = user_ids[::2], user_ids[1::2]
+    limits = httpx.Limits(max_connections=len(user_ids), max_keepalive_connections=len(user_ids))
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=120) as client:
+        deadline = time.perf_counter() + SECONDS
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(student(client, uid, deadline, latencies, errors) for uid in students),
+            *(viewer(client, viewed, deadline, latencies, errors) for _ in viewed),
+        )
+        elapsed = time.perf_counter() - started
+        routing = (await client.get("/admin/metrics")).json()["read_routing"]
+    return latencies, errors, elapsed, routing
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else None
+    read_url = sys.argv[2] if len(sys.argv) > 2 else ""
+    print(f"{USERS // 2} students + {USERS - USERS // 2} viewers for {SECONDS:.0f}s per mode, "
+          f"{LATENCY_MS:g}ms per statement\n")
+    print(f"{'routing':<8} {'req/s':>8} {'answers/s':>10} {'submit p95 ms':>14} {'dash p50/p95 ms':>17} "
+          f"{'board p95 ms':>13} {'errors':>7}  replica share")
+    for routing in ("false", "true"):
+        with tempfile.TemporaryDirectory() as db_dir:
+            try:
+                with api_server(url or f"sqlite:///{os.path.join(db_dir, 'bench.db')}", READ_ROUTING=routing,
+                                READ_DATABASE_URL=read_url, DASHBOARD_CACHE_SIZE="0") as user_ids:
+                    latencies, errors, elapsed, stats = asyncio.run(load(user_ids))
+            except RuntimeError as e:
+                print(f"{routing:<8} failed\n{e}")
+                continue
+        requests = sum(len(v) for v in latencies.values())
+        sub, dash = latencies.get("submit", []), latencies.get("dashboard", [])
+        print(f"{routing:<8} {requests / elapsed:>8.1f} {len(sub) / elapsed:>10.1f} {percentile(sub, 0.95):>14.1f} "
+              f"{percentile(dash, 0.5):>8.1f}/{percentile(dash, 0.95):<8.1f} "
+              f"{percentile(latencies.get('leaderboard', []), 0.95):>13.1f} {len(errors):>7}  {stats['replica_share']}")
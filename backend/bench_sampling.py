@@ -0,0 +1,86 @@
+"""
+Benchmarks random question picking as the question bank grows.
+Builds a throwaway SQLite bank per size and times each sampling mode on the
+targeted query shape used by get_next_question (subject + topic + difficulty window).
+
+Usage: python bench_sampling.py [sizes...]   (default: 10000 100000 1000000)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from models import Question
+from question_index import QuestionIndex
+from sampling import SAMPLERS
+
+TOPICS = 20
+SUBJECTS = 5
+RUNS = 50
+
+
+def build_bank(path, size):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    rows = [
+        (random.randint(1, SUBJECTS), f"Topic {random.randrange(TOPICS)}", "Advanced", random.random(), "Q", "[]", "A", 1.0)
+        for _ in range(size)
+    ]
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO questions (subject_id, topic, subtopic, difficulty, content, options, correct_answer, exam_weightage) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    return engine
+
+
+def time_ms(fn):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        fn()
+    return (time.perf_counter() - start) * 1000 / RUNS
+
+
+def run(size):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_bank(os.path.join(tmp, "bench.db"), size)
+        db = sessionmaker(bind=engine)()
+        # A heavy user: a few hundred answered questions
+        answered = set(random.sample(range(1, size + 1), min(500, size // 10)))
+        target = 0.5
+
+        def targeted():
+            return db.query(Question).filter(
+                Question.subject_id == 1,
+                Question.topic == "Topic 1",
+                Question.difficulty.between(target - 0.3, target + 0.3),
+            )
+
+        results = {}
+        for mode, sampler in SAMPLERS.items():
+            results[mode] = time_ms(lambda: sampler(targeted(), answered))
+
+        index = QuestionIndex()
+        start = time.perf_counter()
+        index.build(db)
+        build_ms = (time.perf_counter() - start) * 1000
+        results["index"] = time_ms(lambda: index.pick(1, "Topic 1", target, 0.3, answered))
+
+        db.close()
+        engine.dispose()
+
+    cols = "  ".join(f"{m}={ms:9.3f}ms" for m, ms in results.items())
+    print(f"{size:>9} rows  {cols}  (index build {build_ms:.0f}ms)")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"Mean latency per pick over {RUNS} runs")
+    for n in sizes:
+        run(n)
@@ -0,0 +1,158 @@
+import json
+import os
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+
+import config
+import log_archive
+from models import QuizAttempt, Question, KnowledgeNode
+from mastery_decay import decay_key
+
+
+class BKTParams(NamedTuple):
+    prior: float   # P(L0): mastery before the first answer
+    learn: float   # P(T): unmastered -> mastered after an answer
+    slip: float    # P(S): wrong answer while mastered
+    guess: float   # P(G): right answer while unmastered
+    forget: float  # P(F): mastered -> unmastered after an answer
+
+
+# Four-option MCQs: guess close to 1/4
+DEFAULT_PARAMS = BKTParams(prior=0.1, learn=0.15, slip=0.1, guess=0.25, forget=0.02)
+
+
+def load_topic_params(path: str) -> dict:
+    """Per-topic overrides from a JSON file: {"Kinematics": {"learn": 0.2, ...}, ...}."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        raw = json.load(f)
+    return {topic: DEFAULT_PARAMS._replace(**values) for topic, values in raw.items()}
+
+
+def bkt_step(p, correct, params):
+    """
+    One BKT update: condition mastery p on the observation, then apply learn/forget.
+    Works element-wise on NumPy arrays (params may be arrays too).
+    """
+    _, learn, slip, guess, forget = params
+    p = np.asarray(p, dtype=np.float64)
+    correct = np.asarray(correct, dtype=bool)
+    right = p * (1 - slip) / (p * (1 - slip) + (1 - p) * guess)
+    wrong = p * slip / (p * slip + (1 - p) * (1 - guess))
+    posterior = np.where(correct, right, wrong)
+    return posterior * (1 - forget) + (1 - posterior) * learn
+
+
+def run_sequences(lengths, correct, params):
+    """
+    Final mastery of many answer sequences at once.
+    lengths: answers per sequence; correct: all observations, sequence after sequence;
+    params: BKTParams of per-sequence arrays. Each step updates every sequence still running.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    correct = np.asarray(correct, dtype=bool)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    # Longest first, so the sequences still running at step k are a prefix
+    order = np.argsort(-lengths, kind="stable")
+    lengths, starts = lengths[order], starts[order]
+    p = np.asarray(params.prior, dtype=np.float64)[order].copy()
+    step_params = BKTParams(*(np.asarray(v, dtype=np.float64)[order] for v in params))
+
+    active = len(lengths)
+    for k in range(int(lengths[0]) if len(lengths) else 0):
+        while active and lengths[active - 1] <= k:
+            active -= 1
+        p[:active] = bkt_step(
+            p[:active], correct[starts[:active] + k], BKTParams(*(v[:active] for v in step_params))
+        )
+
+    result = np.empty_like(p)
+    result[order] = p
+    return result
+
+
+class BKTEngine:
+    """Bayesian Knowledge Tracing with per-topic parameters, writing KnowledgeNode.strength_score."""
+
+    def __init__(self, topic_params: dict = None):
+        self.topic_params = topic_params or {}
+
+    def params_for(self, topic: str) -> BKTParams:
+        return self.topic_params.get(topic, DEFAULT_PARAMS)
+
+    def next_strength(self, current, topic: str, is_correct: bool) -> float:
+        """Incremental update for one answer (used on submit)."""
+        params = self.params_for(topic)
+        if current is None:
+            current = params.prior
+        return float(bkt_step(current, is_correct, params))
+
+    def replay(self, db, subject_ids=None, users_per_chunk: int = 1000):
+        """
+        Recomputes mastery from the full answer history (question_logs and its archives)
+        and writes it to the knowledge nodes.
+        Processes users in chunks; each chunk's sequences are run in one vectorized pass.
+        subject_ids: only these subjects (default: every subject using BKT).
+        Returns the number of nodes written. Run offline (the write-back cache isn't updated).
+        """
+        user_ids = [uid for (uid,) in db.query(QuizAttempt.user_id).filter(QuizAttempt.user_id.isnot(None)).distinct().order_by(QuizAttempt.user_id)]
+        written = 0
+        for i in range(0, len(user_ids), users_per_chunk):
+            chunk = user_ids[i:i + users_per_chunk]
+            where = [Question.subject_id.in_(subject_ids)] if subject_ids is not None else []
+            rows = log_archive.user_histories(db.connection(), chunk, ["is_correct"], where)
+            rows = [r for r in rows if subject_ids is not None or uses_bkt(r.subject_id)]
+            if rows:
+                written += self._write(db, *self._run_chunk(rows))
+        return written
+
+    def _run_chunk(self, rows):
+        keys, lengths, correct = [], [], np.fromiter((bool(r.is_correct) for r in rows), dtype=bool, count=len(rows))
+        for r in rows:
+            key = (r.user_id, r.subject_id, r.topic)
+            if keys and keys[-1] == key:
+                lengths[-1] += 1
+            else:
+                keys.append(key)
+                lengths.append(1)
+        per_seq = [self.params_for(topic) for _, _, topic in keys]
+        params = BKTParams(*(np.array(v) for v in zip(*per_seq)))
+        return keys, run_sequences(lengths, correct, params)
+
+    def _write(self, db, keys, mastery):
+        existing = {}
+        for node_id, user_id, subject_id, topic, last_updated in db.query(
+            KnowledgeNode.id, KnowledgeNode.user_id, KnowledgeNode.subject_id, KnowledgeNode.topic, KnowledgeNode.last_updated
+        ).filter(KnowledgeNode.user_id.in_({k[0] for k in keys})):
+            existing[(user_id, subject_id, topic)] = (node_id, last_updated)
+
+        # Replayed mastery keeps the node's last_updated, so read-time decay still applies
+        now = datetime.utcnow()
+        updates, inserts = [], []
+        for key, strength in zip(keys, mastery.tolist()):
+            node_id, last_updated = existing.get(key, (None, None))
+            if node_id is not None:
+                updates.append({"id": node_id, "strength_score": strength, "decay_key": decay_key(strength, last_updated)})
+            else:
+                user_id, subject_id, topic = key
+                inserts.append({"user_id": user_id, "subject_id": subject_id, "topic": topic, "strength_score": strength,
+                                "last_updated": now, "decay_key": decay_key(strength, now)})
+        db.bulk_update_mappings(KnowledgeNode, updates)
+        db.bulk_insert_mappings(KnowledgeNode, inserts)
+        db.commit()
+        return len(keys)
+
+
+_BKT_SUBJECTS = {s.strip() for s in config.BKT_SUBJECTS.split(",") if s.strip()}
+
+
+def uses_bkt(subject_id) -> bool:
+    """Whether mastery in this subject is tracked with BKT (config.BKT_SUBJECTS)."""
+    return "*" in _BKT_SUBJECTS or (subject_id is not None and str(subject_id) in _BKT_SUBJECTS)
+
+
+bkt_engine = BKTEngine(load_topic_params(config.BKT_PARAMS_FILE))
@@ -0,0 +1,51 @@
+import argparse
+import time
+from database import SessionLocal
+from models import Question
+import item_calibration
+
+def calibrate_items(dry_run: bool = False, min_responses: int = item_calibration.MIN_RESPONSES, report: int = 25):
+    """
+    Offline job: fits per-item difficulty and discrimination from question_logs,
+    writes them back (with history in item_calibrations) and reports items whose
+    empirical difficulty diverges from the seed.
+    The server picks up new difficulties when its question index / item bank TTL expires.
+    """
+    db = SessionLocal()
+    try:
+        print("--- Item Calibration ---")
+        start = time.perf_counter()
+        result = item_calibration.calibrate(db)
+        fitted = time.perf_counter() - start
+        print(f"Fitted {int((result.responses > 0).sum())} items from {int(result.responses.sum())} responses in {fitted:.1f}s")
+
+        flagged = item_calibration.divergent_items(result, min_responses=min_responses)
+        if len(flagged):
+            topics = dict(db.query(Question.id, Question.topic).filter(
+                Question.id.in_([int(result.question_ids[i]) for i in flagged[:report]])
+            ).all())
+            print(f"[DIVERGENT] {len(flagged)} items with |empirical - seed| > {item_calibration.DIVERGENCE_THRESHOLD}:")
+            for i in flagged[:report]:
+                qid = int(result.question_ids[i])
+                disc = result.discrimination[i]
+                print(f"  Q{qid} ({topics.get(qid)}): seed={result.seed[i]:.2f} empirical={1 - result.p_correct[i]:.2f} "
+                      f"calibrated={result.difficulty[i]:.2f} n={result.responses[i]} disc={disc:.2f}")
+        negative = int(((result.responses >= min_responses) & (result.discrimination < 0)).sum())
+        if negative:
+            print(f"[WARN] {negative} items have negative discrimination (possible wrong answer key)")
+
+        updated = item_calibration.write_back(db, result, min_responses=min_responses, dry_run=dry_run)
+        if dry_run:
+            print("[DRY RUN] History recorded, questions not updated")
+        else:
+            print(f"[DONE] Updated {updated} questions (min {min_responses} responses) in {time.perf_counter() - start:.1f}s")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate question difficulty from question_logs")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--min-responses", type=int, default=item_calibration.MIN_RESPONSES)
+    parser.add_argument("--report", type=int, default=25, help="Divergent items to print")
+    args = parser.parse_args()
+    calibrate_items(dry_run=args.dry_run, min_responses=args.min_responses, report=args.report)
@@ -0,0 +1,27 @@
+import sys
+from database import SessionLocal
+from attempt_scoring import recompute_aggregates
+
+def check_attempt_aggregates(fix: bool = False):
+    """Offline consistency check: recomputes attempt aggregates from question_logs."""
+    db = SessionLocal()
+    try:
+        print("--- Attempt Aggregate Check ---")
+        mismatches = recompute_aggregates(db, fix=fix)
+        for attempt_id, stored, expected in mismatches[:50]:
+            print(f"[MISMATCH] Attempt {attempt_id}: stored (answered, correct, time)={stored} expected={expected}")
+        if len(mismatches) > 50:
+            print(f"... and {len(mismatches) - 50} more")
+
+        if not mismatches:
+            print("[PASS] All attempt aggregates match question_logs")
+        elif fix:
+            print(f"[FIXED] Rewrote {len(mismatches)} attempts")
+        else:
+            print(f"[FAIL] {len(mismatches)} attempts out of sync (run with --fix to repair)")
+        return mismatches
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    check_attempt_aggregates(fix="--fix" in sys.argv)
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import hashlib
+import itertools
+import json
+import threading
+import time
+
+import config
+
+
+class DashboardCache:
+    """
+    Per-user /dashboard/stats responses (LRU with TTL) and their ETags.
+    Entries are dropped by invalidate() on submit, reset and attempt start; the TTL
+    bounds staleness from time-based changes (mastery decay, streaks).
+    A build that overlaps an invalidation is returned but not cached.
+    """
+
+    def __init__(self, capacity: int, ttl: float):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expires_at, etag, payload)
+        self._building = {}  # user_id -> token of the latest build in flight
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0}
+
+    def get(self, user_id: int):
+        """(etag, payload) if cached and fresh, else None."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(user_id, None)
+                self.metrics["misses"] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.metrics["hits"] += 1
+            return entry[1], entry[2]
+
+    def begin(self, user_id: int) -> int:
+        """Call before building a response; pass the token to put()."""
+        with self._lock:
+            token = next(self._tokens)
+            self._building[user_id] = token
+            return token
+
+    def put(self, user_id: int, token: int, payload) -> str:
+        """Caches the built payload unless invalidated meanwhile. Returns its ETag."""
+        etag = make_etag(payload)
+        with self._lock:
+            if self._building.get(user_id) != token:
+                return etag
+            del self._building[user_id]
+            self._entries[user_id] = (time.monotonic() + self.ttl, etag, payload)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return etag
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            if user_id in self._building:
+                self._building[user_id] = None
+            self.metrics["invalidations"] += 1
+
+    def invalidate_many(self, user_ids):
+        for user_id in user_ids:
+            self.invalidate(user_id)
+
+    def count_not_modified(self):
+        with self._lock:
+            self.metrics["not_modified"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "ttl": self.ttl, **self.metrics}
+
+
+def make_etag(payload) -> str:
+    body = json.dumps(payload, sort_keys=True, default=str).encode()
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as for GET (RFC 9110)
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+dashboard_cache = DashboardCache(config.DASHBOARD_CACHE_SIZE, config.DASHBOARD_CACHE_TTL)
@@ -0,0 +1,224 @@
+import csv
+import io
+import json
+from datetime import datetime, date
+from typing import NamedTuple
+
+from sqlalchemy import select, func, or_, Integer, Float, Boolean, DateTime, Date
+
+import database
+import log_archive
+from models import QuizAttempt, QuestionLog, KnowledgeNode, Subject
+
+# Rows per keyset page (one short read transaction each)
+CHUNK_SIZE = 50_000
+
+
+class ExportTable(NamedTuple):
+    model: type
+    watermark: str  # Column compared with `since` for incremental exports (None: always in full)
+
+
+# Attempts and logs are append-only by id. Knowledge nodes are exported in full every time:
+# they are updated in place without a monotonic column (write-back flushes keep the answer
+# time, BKT replay doesn't touch last_updated) and deleted on reset, so no watermark sees it all
+TABLES = {
+    "quiz_attempts": ExportTable(QuizAttempt, "id"),
+    "question_logs": ExportTable(QuestionLog, "id"),
+    "knowledge_nodes": ExportTable(KnowledgeNode, None),
+}
+
+
+class ExportPlan(NamedTuple):
+    table: str
+    columns: list
+    where: list
+    watermark: object  # Upper bound of this export; pass it as `since` next time (None: full export)
+
+
+def _attempt_filters(start, end, exam_id):
+    where = []
+    if start:
+        where.append(QuizAttempt.timestamp >= start)
+    if end:
+        where.append(QuizAttempt.timestamp < end)
+    if exam_id:
+        subject_ids = select(Subject.id).where(Subject.exam_id == exam_id)
+        where.append(or_(QuizAttempt.exam_id == exam_id, QuizAttempt.subject_id.in_(subject_ids)))
+    return where
+
+
+def plan(table: str, start: datetime = None, end: datetime = None, exam_id: int = None, since=None) -> ExportPlan:
+    """
+    Resolves filters and the watermark for one table.
+    start/end filter by attempt time (logs by their attempt's time, nodes by last_updated);
+    exam_id keeps rows of the exam's mock attempts and subjects. The export is bounded by
+    the watermark's current maximum, so rows written while it runs go to the next export.
+    Tables without a watermark ignore `since` and export every (filtered) row.
+    """
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table!r} (expected one of {', '.join(TABLES)})")
+    model, watermark_name = TABLES[table]
+    columns = list(model.__table__.columns) # id first
+
+    if model is QuizAttempt:
+        where = _attempt_filters(start, end, exam_id)
+    elif model is QuestionLog:
+        attempt_where = _attempt_filters(start, end, exam_id)
+        where = [QuestionLog.attempt_id.in_(select(QuizAttempt.id).where(*attempt_where))] if attempt_where else []
+    else:
+        where = []
+        if start:
+            where.append(KnowledgeNode.last_updated >= start)
+        if end:
+            where.append(KnowledgeNode.last_updated < end)
+        if exam_id:
+            where.append(KnowledgeNode.subject_id.in_(select(Subject.id).where(Subject.exam_id == exam_id)))
+
+    if watermark_name is None:
+        return ExportPlan(table, columns, where, None)
+
+    watermark = model.__table__.c[watermark_name]
+    with database.engine.connect() as conn:
+        upper = conn.execute(select(func.max(watermark))).scalar()
+        if model is QuestionLog:
+            upper = max(filter(None, (upper, log_archive.max_id(conn))), default=None)
+    if since is not None:
+        where.append(watermark > _parse_watermark(watermark, since))
+    if upper is not None:
+        where.append(watermark <= upper)
+    return ExportPlan(table, columns, where, upper)
+
+
+def iter_pages(export: ExportPlan, chunk_size: int = CHUNK_SIZE):
+    """
+    Yields lists of row tuples, keyset-paginated by primary key. Each page runs in its own
+    short connection, so a long export never holds a read transaction (SQLite lock) open.
+    question_logs continues with the archived logs, month by month. Logs the archiver moves
+    after the hot pass yielded them are skipped there (bitmap of yielded ids).
+    """
+    if TABLES[export.table].model is not QuestionLog:
+        yield from _table_pages(export, chunk_size)
+        return
+    seen = bytearray(((export.watermark or 0) >> 3) + 1)
+    for rows in _table_pages(export, chunk_size):
+        for row in rows:
+            seen[row[0] >> 3] |= 1 << (row[0] & 7)
+        yield rows
+    with database.engine.connect() as conn:
+        months = log_archive.months(conn)
+    for month in months:
+        for rows in _table_pages(export, chunk_size, month):
+            rows = [row for row in rows if not seen[row[0] >> 3] & (1 << (row[0] & 7))]
+            if rows:
+                yield rows
+
+
+def _table_pages(export: ExportPlan, chunk_size: int, month: str = None):
+    last = 0
+    while True:
+        with database.engine.connect() as conn:
+            if month is None:
+                rows = _page(conn, TABLES[export.table].model.__table__, export.where, export, last, chunk_size)
+            else:
+                with log_archive.attach(conn, month) as archive:
+                    if archive is None:
+                        return
+                    where = [log_archive.adapt(w, archive) for w in export.where] + [log_archive.archived_rows(archive, month)]
+                    rows = _page(conn, archive, where, export, last, chunk_size)
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield rows
+
+
+def _page(conn, table, where, export: ExportPlan, last, chunk_size: int):
+    key = table.c.id
+    return conn.execute(
+        select(*[table.c[c.name] for c in export.columns]).where(key > last, *where).order_by(key).limit(chunk_size)
+    ).all()
+
+
+# --- CSV ---
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def iter_csv(export: ExportPlan, chunk_size: int = CHUNK_SIZE):
+    """CSV as encoded chunks (header first, then one chunk per page), for streaming responses."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c.name for c in export.columns])
+    for rows in iter_pages(export, chunk_size):
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def write_csv(export: ExportPlan, path: str, chunk_size: int = CHUNK_SIZE) -> int:
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([c.name for c in export.columns])
+        for page in iter_pages(export, chunk_size):
+            writer.writerows([_csv_value(v) for v in row] for row in page)
+            rows += len(page)
+    return rows
+
+
+# --- Parquet ---
+
+def write_parquet(export: ExportPlan, path_or_file, chunk_size: int = CHUNK_SIZE) -> int:
+    """One row group per page. Needs pyarrow (optional dependency)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    def arrow_type(column):
+        kind = type(column.type)
+        if issubclass(kind, Boolean):
+            return pa.bool_()
+        if issubclass(kind, Integer):
+            return pa.int64()
+        if issubclass(kind, Float):
+            return pa.float64()
+        if issubclass(kind, DateTime):
+            return pa.timestamp("us")
+        if issubclass(kind, Date):
+            return pa.date32()
+        return pa.string()
+
+    schema = pa.schema([(c.name, arrow_type(c)) for c in export.columns])
+    strings = [i for i, field in enumerate(schema) if field.type == pa.string()]
+    rows = 0
+    with pq.ParquetWriter(path_or_file, schema) as writer:
+        for page in iter_pages(export, chunk_size):
+            columns = [list(col) for col in zip(*page)]
+            for i in strings:
+                columns[i] = [v if v is None or isinstance(v, str) else json.dumps(v) for v in columns[i]]
+            arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            rows += len(page)
+    return rows
+
+
+# --- Watermarks ---
+
+def _parse_watermark(column, value):
+    if isinstance(column.type, DateTime) and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return int(value) if isinstance(column.type, Integer) else value
+
+
+def format_watermark(value):
+    return value.isoformat() if isinstance(value, datetime) else value
@@ -0,0 +1,53 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import data_export
+
+
+def export_data(tables, fmt="csv", out_dir="./exports", start=None, end=None, exam_id=None,
+                watermark_file=None, chunk_size=data_export.CHUNK_SIZE):
+    """
+    Exports tables to <out_dir>/<table>[_<timestamp>].<fmt> while the API keeps serving.
+    With a watermark file, only attempts and logs added since the previous run are exported
+    (knowledge nodes always in full) and the file is updated after each table.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    watermarks = {}
+    if watermark_file and os.path.exists(watermark_file):
+        with open(watermark_file) as f:
+            watermarks = json.load(f)
+
+    suffix = datetime.utcnow().strftime("_%Y%m%dT%H%M%S") if watermark_file else ""
+    for table in tables:
+        print(f"--- Exporting {table} ---")
+        started = time.perf_counter()
+        plan = data_export.plan(table, start=start, end=end, exam_id=exam_id, since=watermarks.get(table))
+        path = os.path.join(out_dir, f"{table}{suffix}.{fmt}")
+        if fmt == "parquet":
+            rows = data_export.write_parquet(plan, path, chunk_size)
+        else:
+            rows = data_export.write_csv(plan, path, chunk_size)
+        print(f"[DONE] {rows} rows -> {path} in {time.perf_counter() - started:.1f}s")
+
+        if watermark_file and plan.watermark is not None:
+            watermarks[table] = data_export.format_watermark(plan.watermark)
+            with open(watermark_file, "w") as f:
+                json.dump(watermarks, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export attempts, answer logs and knowledge nodes")
+    parser.add_argument("tables", nargs="*", default=list(data_export.TABLES), help="Default: all")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--out", default="./exports", help="Output directory")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Attempts from this date/time (inclusive)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Attempts before this date/time")
+    parser.add_argument("--exam-id", type=int)
+    parser.add_argument("--watermark-file", help="JSON file of last exported positions (incremental export)")
+    parser.add_argument("--chunk-size", type=int, default=data_export.CHUNK_SIZE)
+    args = parser.parse_args()
+    export_data(args.tables, args.format, args.out, args.start, args.end, args.exam_id,
+                args.watermark_file, args.chunk_size)
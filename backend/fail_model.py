@@ -0,0 +1,181 @@
+import math
+import os
+import pickle
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+import config
+import log_archive
+from models import QuizAttempt
+from mastery_decay import decayed_strength
+from knowledge_graph import KnowledgeGraphEngine
+
+# Answers per topic the recent-performance features look at
+RECENT_WINDOW = 10
+# A user's latest answers loaded when scoring their topics
+LOOKBACK = 200
+
+FEATURES = ("strength", "recent_accuracy", "recent_answers", "log_time", "difficulty_gap", "log_idle_days")
+
+
+def topic_features(strength: float, recent, idle_days: float):
+    """
+    Feature row for one topic. recent: up to RECENT_WINDOW (is_correct, time_taken, difficulty)
+    of the latest answers in the topic; idle_days: days since the topic was last practised.
+    Shared by training and scoring so both see the same definitions.
+    """
+    n = len(recent)
+    correct = sum(1 for c, _, _ in recent if c)
+    times = [t for _, t, _ in recent if t is not None]
+    difficulties = [d for _, _, d in recent if d is not None]
+    return (
+        strength,
+        (correct + 1) / (n + 2), # Smoothed towards 0.5 for topics with few answers
+        n / RECENT_WINDOW,
+        math.log1p(sum(times) / len(times)) if times else 0.0,
+        (sum(difficulties) / len(difficulties) - strength) if difficulties else 0.0,
+        math.log1p(max(idle_days, 0.0)),
+    )
+
+
+def heuristic_fail_probability(strength):
+    return (1.0 - strength) * 0.9
+
+
+class FailModel:
+    """
+    P(next answer in a topic is wrong) from a logistic regression trained by train_fail_model.py.
+    The pickled scaler + classifier are folded into one weight vector at load time, so
+    scoring every topic of a user is a single matrix-vector product.
+    Without a model file, falls back to the strength heuristic.
+    """
+
+    def __init__(self, weights=None, bias: float = 0.0, info: dict = None):
+        self.weights = weights
+        self.bias = bias
+        self.info = info or {}
+
+    @property
+    def loaded(self) -> bool:
+        return self.weights is not None
+
+    @classmethod
+    def load(cls, path: str) -> "FailModel":
+        if not path or not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "rb") as f:
+                saved = pickle.load(f)
+            if tuple(saved["features"]) != FEATURES:
+                print(f"Fail model at {path} was trained on other features, using the heuristic")
+                return cls()
+            return cls.from_pipeline(saved["pipeline"], {k: v for k, v in saved.items() if k != "pipeline"})
+        except Exception as e:
+            print(f"Could not load fail model from {path}: {e}")
+            return cls()
+
+    @classmethod
+    def from_pipeline(cls, pipeline, info: dict = None) -> "FailModel":
+        scaler, clf = pipeline.named_steps["scale"], pipeline.named_steps["clf"]
+        # w . ((x - mean) / scale) + b  ==  (w / scale) . x + (b - w . mean / scale)
+        coef = clf.coef_[0] / scaler.scale_
+        bias = float(clf.intercept_[0] - coef @ scaler.mean_)
+        return cls(coef.astype(np.float64), bias, info)
+
+    def predict(self, features) -> np.ndarray:
+        """Fail probabilities for an (n, len(FEATURES)) array."""
+        features = np.asarray(features, dtype=np.float64)
+        if not self.loaded:
+            return heuristic_fail_probability(features[:, 0])
+        return 1.0 / (1.0 + np.exp(-(features @ self.weights + self.bias)))
+
+
+# --- Training ---
+
+def build_training_set(db, max_rows: int = None, users_per_chunk: int = 1000):
+    """
+    One example per answer that has at least one earlier answer in its (user, subject, topic):
+    features from the history before it, label 1 if it was wrong.
+    Strength is replayed with the app's own update rule and forgetting curve.
+    Answers are stamped with their attempt's timestamp (logs have no time of their own).
+    Reads question_logs and its archives, users_per_chunk users at a time.
+    Returns (X, y, user_ids).
+    """
+    user_ids = [uid for (uid,) in db.query(QuizAttempt.user_id).filter(QuizAttempt.user_id.isnot(None)).distinct().order_by(QuizAttempt.user_id)]
+    rows = (
+        row
+        for i in range(0, len(user_ids), users_per_chunk)
+        for row in log_archive.user_histories(
+            db.connection(), user_ids[i:i + users_per_chunk],
+            [QuizAttempt.timestamp, "is_correct", "time_taken", "difficulty_at_time"],
+        )
+    )
+
+    X, y, users = [], [], []
+    key, strength, last_time, recent = None, None, None, None
+    for user_id, subject_id, topic, ts, is_correct, time_taken, difficulty, _ in rows:
+        if (user_id, subject_id, topic) != key:
+            key, strength, last_time, recent = (user_id, subject_id, topic), None, None, deque(maxlen=RECENT_WINDOW)
+        ts = ts or last_time
+        if strength is not None:
+            current = decayed_strength(strength, last_time, ts) if ts and last_time else strength
+            idle = (ts - last_time).total_seconds() / 86400.0 if ts and last_time else 0.0
+            X.append(topic_features(current, recent, idle))
+            y.append(0 if is_correct else 1)
+            users.append(user_id)
+            strength = current
+        strength = KnowledgeGraphEngine._next(strength, subject_id, topic, bool(is_correct), difficulty or 0.5)
+        last_time = ts
+        recent.append((bool(is_correct), time_taken, difficulty))
+
+    X, y, users = np.array(X, dtype=np.float64).reshape(-1, len(FEATURES)), np.array(y), np.array(users)
+    if max_rows and len(y) > max_rows:
+        keep = np.sort(np.random.default_rng(0).choice(len(y), max_rows, replace=False))
+        X, y, users = X[keep], y[keep], users[keep]
+    return X, y, users
+
+
+def train(X, y, users, holdout: float = 0.2):
+    """
+    Fits scaler + logistic regression. Evaluates on a holdout of whole users first
+    (AUC / log loss, against the strength heuristic), then refits on everything.
+    Returns (pipeline, metrics).
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import roc_auc_score, log_loss
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    def pipeline():
+        return Pipeline([("scale", StandardScaler()), ("clf", LogisticRegression(max_iter=1000))])
+
+    metrics = {"examples": int(len(y)), "fail_rate": float(y.mean()) if len(y) else 0.0}
+    unique_users = np.unique(users)
+    test_users = np.random.default_rng(0).choice(unique_users, max(1, int(len(unique_users) * holdout)), replace=False)
+    test = np.isin(users, test_users)
+    if test.any() and (~test).any() and len(np.unique(y[test])) == 2 and len(np.unique(y[~test])) == 2:
+        model = pipeline().fit(X[~test], y[~test])
+        p = model.predict_proba(X[test])[:, 1]
+        heuristic = np.clip(heuristic_fail_probability(X[test, 0]), 1e-6, 1 - 1e-6)
+        metrics.update({
+            "holdout_auc": float(roc_auc_score(y[test], p)),
+            "holdout_log_loss": float(log_loss(y[test], p)),
+            "heuristic_auc": float(roc_auc_score(y[test], heuristic)),
+            "heuristic_log_loss": float(log_loss(y[test], heuristic)),
+        })
+    return pipeline().fit(X, y), metrics
+
+
+def save(pipeline, metrics: dict, path: str):
+    with open(path, "wb") as f:
+        pickle.dump({
+            "pipeline": pipeline,
+            "features": FEATURES,
+            "trained_at": datetime.utcnow().isoformat(),
+            "metrics": metrics,
+        }, f)
+
+
+fail_model = FailModel.load(config.FAIL_MODEL_PATH)
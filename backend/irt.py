@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+
+import numpy as np
+
+import config
+from models import Question
+from knowledge_cache import knowledge_cache
+from mastery_decay import current_strength
+
+# Question.difficulty and strength_score live on [0, 1]; IRT works on the logit scale
+LOGIT_CLIP = 4.0
+# Ability assumed for topics the user has no knowledge node in (same as the heuristic's 0.3)
+DEFAULT_STRENGTH = 0.3
+# Bounds for the slope derived from calibrated discrimination
+MIN_SLOPE, MAX_SLOPE = 0.2, 3.0
+# Pick randomly among the k most informative items so the same item isn't always served
+RANDOMESQUE_K = 5
+
+
+def to_logit(p):
+    p = np.clip(np.asarray(p, dtype=np.float64), 1e-3, 1 - 1e-3)
+    return np.clip(np.log(p / (1 - p)), -LOGIT_CLIP, LOGIT_CLIP)
+
+
+def to_slope(discrimination):
+    """
+    IRT slope a from a calibrated point-biserial discrimination r (normal-ogive
+    approximation a = 1.7 r / sqrt(1 - r^2)). Uncalibrated items (nan) get a = 1.
+    """
+    r = np.clip(np.asarray(discrimination, dtype=np.float64), -0.95, 0.95)
+    a = np.where(np.isnan(r), 1.0, 1.7 * r / np.sqrt(1 - r * r))
+    return np.clip(a, MIN_SLOPE, MAX_SLOPE)
+
+
+def fisher_information(theta, a, b, c):
+    """3PL item information at ability theta (all arrays broadcast)."""
+    p = c + (1 - c) / (1 + np.exp(-a * (theta - b)))
+    return (a ** 2) * ((p - c) ** 2 / (1 - c) ** 2) * ((1 - p) / p)
+
+
+class ItemBank:
+    """
+    Item parameters of the whole question bank as NumPy arrays,
+    sorted by (subject_id, topic) so a subject is a contiguous slice.
+    """
+
+    def __init__(self, ids, subject_ids, topic_codes, topics, a, b, c):
+        self.ids = ids
+        self.subject_ids = subject_ids
+        self.topic_codes = topic_codes
+        self.topics = topics
+        self.topic_index = {t: i for i, t in enumerate(topics)}
+        self.a = a
+        self.b = b
+        self.c = c
+
+    @classmethod
+    def load(cls, db):
+        rows = (
+            db.query(Question.id, Question.subject_id, Question.topic, Question.difficulty, Question.options,
+                     Question.discrimination)
+            .filter(Question.subject_id.isnot(None))
+            .all()
+        )
+        # Codes in Python order (None first); the arrays are sorted by them below rather than
+        # by SQL ORDER BY, whose collation may not agree
+        topics = sorted({r[2] for r in rows}, key=lambda t: (t is not None, t or ""))
+        topic_index = {t: i for i, t in enumerate(topics)}
+        n = len(rows)
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        subject_ids = np.fromiter((r[1] for r in rows), dtype=np.int64, count=n)
+        topic_codes = np.fromiter((topic_index[r[2]] for r in rows), dtype=np.int32, count=n)
+        difficulty = np.fromiter((r[3] if r[3] is not None else 0.5 for r in rows), dtype=np.float64, count=n)
+        # Guessing parameter: chance of picking the right option blindly
+        c = np.fromiter((1.0 / len(r[4]) if r[4] else 0.0 for r in rows), dtype=np.float64, count=n)
+        discrimination = np.fromiter((r[5] if r[5] is not None else np.nan for r in rows), dtype=np.float64, count=n)
+        order = np.lexsort((topic_codes, subject_ids))
+        return cls(ids[order], subject_ids[order], topic_codes[order], topics,
+                   to_slope(discrimination[order]), to_logit(difficulty[order]), c[order])
+
+    def subject_range(self, subject_id: int):
+        lo = int(np.searchsorted(self.subject_ids, subject_id, side="left"))
+        hi = int(np.searchsorted(self.subject_ids, subject_id, side="right"))
+        return lo, hi
+
+    def topic_range(self, lo: int, hi: int, topic_code: int):
+        """Narrows a subject slice to one topic (topics are sorted within a subject)."""
+        codes = self.topic_codes[lo:hi]
+        return (
+            lo + int(np.searchsorted(codes, topic_code, side="left")),
+            lo + int(np.searchsorted(codes, topic_code, side="right")),
+        )
+
+    def best_items(self, lo: int, hi: int, theta_by_topic, excluded_ids, k: int = RANDOMESQUE_K):
+        """
+        Scores items [lo, hi) by Fisher information at the user's ability in each item's
+        topic and returns the IDs of the k most informative eligible items (best first).
+        """
+        codes = self.topic_codes[lo:hi]
+        info = fisher_information(theta_by_topic[codes], self.a[lo:hi], self.b[lo:hi], self.c[lo:hi])
+
+        if len(excluded_ids):
+            info[np.isin(self.ids[lo:hi], excluded_ids)] = -np.inf
+
+        k = min(k, hi - lo)
+        top = np.argpartition(info, -k)[-k:]
+        top = top[np.argsort(info[top])[::-1]]
+        top = top[np.isfinite(info[top])]
+        return self.ids[lo:hi][top]
+
+
+class ItemBankCache:
+    """Lazily loaded ItemBank, reloaded after invalidate() or once older than ttl."""
+
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        self._bank = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def get(self, db) -> ItemBank:
+        if self._bank is None or (self.ttl and time.monotonic() - self._loaded_at > self.ttl):
+            with self._lock:
+                if self._bank is None or (self.ttl and time.monotonic() - self._loaded_at > self.ttl):
+                    self._bank = ItemBank.load(db)
+                    self._loaded_at = time.monotonic()
+        return self._bank
+
+    def invalidate(self):
+        self._bank = None
+
+
+item_bank = ItemBankCache(ttl=config.QUESTION_INDEX_TTL)
+
+
+class IRTSelectionEngine:
+    """
+    Item selection by maximum Fisher information.
+    Question.difficulty is the initial b-parameter and the user's KnowledgeNode
+    strength_score in each topic is the ability prior.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def abilities(self, user_id: int, subject_id: int, bank: ItemBank):
+        """Ability (theta) per topic code for this user."""
+        strengths = np.full(len(bank.topics), DEFAULT_STRENGTH, dtype=np.float64)
+        for node in knowledge_cache.nodes(self.db, user_id, subject_id):
+            code = bank.topic_index.get(node.topic)
+            if code is not None and node.strength_score is not None:
+                strengths[code] = current_strength(node)
+        return to_logit(strengths)
+
+    def select(self, user_id: int, subject_id: int, answered, topic: str = None):
+        bank = item_bank.get(self.db)
+        lo, hi = bank.subject_range(subject_id)
+        if lo == hi:
+            return None
+
+        if topic is not None:
+            topic_code = bank.topic_index.get(topic)
+            if topic_code is None:
+                return None
+            lo, hi = bank.topic_range(lo, hi, topic_code)
+            if lo == hi:
+                return None
+
+        excluded = np.fromiter(answered, dtype=np.int64)
+        candidates = bank.best_items(lo, hi, self.abilities(user_id, subject_id, bank), excluded)
+        if len(candidates) == 0:
+            return None
+        return self.db.get(Question, int(random.choice(candidates)))
@@ -0,0 +1,182 @@
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import select, func, cast, Integer
+from sqlalchemy.orm import Session
+
+import log_archive
+from models import Question, QuizAttempt, ItemCalibration
+
+# Responses needed before a fitted difficulty replaces the current one
+MIN_RESPONSES = 30
+# Pseudo-responses at the seed difficulty (Bayesian smoothing towards the seed)
+PRIOR_WEIGHT = 10
+# |empirical - seed| above this is reported as divergent
+DIVERGENCE_THRESHOLD = 0.15
+# Rows fetched per keyset page
+CHUNK_SIZE = 200_000
+
+
+class CalibrationResult(NamedTuple):
+    question_ids: np.ndarray
+    responses: np.ndarray
+    p_correct: np.ndarray      # Raw proportion correct (nan without responses)
+    difficulty: np.ndarray     # 1 - smoothed proportion correct
+    discrimination: np.ndarray # Point-biserial vs rest-of-attempt accuracy (nan if undefined)
+    seed: np.ndarray           # Seed difficulty per question
+    current: np.ndarray        # Difficulty before this run
+
+
+def iter_chunks(db, key, *columns, where=(), chunk_size: int = CHUNK_SIZE):
+    """
+    Streams a table as NumPy column arrays, one keyset page
+    (WHERE key > last ORDER BY key LIMIT n) at a time. Yields (keys, col1, col2, ...).
+    Rows are fetched from the DBAPI cursor and converted per column, which is several
+    times faster than going through ORM or Row objects. db: a Session or Connection.
+    """
+    conn = db.connection() if isinstance(db, Session) else db
+    last = 0
+    while True:
+        result = conn.execute(
+            select(key, *columns).where(key > last, *where).order_by(key).limit(chunk_size)
+        )
+        rows = result.cursor.fetchall()
+        result.close()
+        if not rows:
+            return
+        arrays = [np.array(col, dtype=np.float64) for col in zip(*rows)]
+        last = int(arrays[0][-1])
+        yield arrays
+
+
+def iter_log_chunks(db, chunk_size: int = CHUNK_SIZE):
+    """Streams (question_id, attempt_id, is_correct) from question_logs and its archives as NumPy arrays."""
+    conn = db.connection()
+    for logs, where in log_archive.log_tables(conn):
+        yield from _log_chunks(conn, logs, where, chunk_size)
+
+
+def _log_chunks(conn, logs, where, chunk_size: int):
+    for _, question_ids, attempt_ids, correct in iter_chunks(
+        conn, logs.c.id, logs.c.question_id, logs.c.attempt_id, cast(logs.c.is_correct, Integer),
+        where=(logs.c.question_id.isnot(None), logs.c.attempt_id.isnot(None), *where), chunk_size=chunk_size,
+    ):
+        yield question_ids.astype(np.int64), attempt_ids.astype(np.int64), correct
+
+
+def calibrate(db, chunk_size: int = CHUNK_SIZE, prior_weight: float = PRIOR_WEIGHT) -> CalibrationResult:
+    """
+    One streaming pass over question_logs and its archives, each chunk reduced with np.bincount:
+    responses and correct answers per item, plus sums for the point-biserial correlation
+    between an item and the rest of its attempt (attempt accuracy without that item).
+    Attempt totals come from the answered_count / correct_count aggregates on quiz_attempts.
+    Memory is O(max question id + max attempt id), independent of the number of log rows.
+    """
+    questions = db.execute(select(Question.id, Question.difficulty, Question.seed_difficulty)).all()
+    max_qid = max((q.id for q in questions), default=0) + 1
+    max_attempt = (db.execute(select(func.max(QuizAttempt.id))).scalar() or 0) + 1
+
+    attempt_n = np.zeros(max_attempt)
+    attempt_c = np.zeros(max_attempt)
+    for ids, answered, correct in iter_chunks(
+        db, QuizAttempt.id, func.coalesce(QuizAttempt.answered_count, 0), func.coalesce(QuizAttempt.correct_count, 0),
+        chunk_size=chunk_size,
+    ):
+        ids = ids.astype(np.int64)
+        attempt_n[ids] = answered
+        attempt_c[ids] = correct
+
+    item_n = np.zeros(max_qid)
+    item_c = np.zeros(max_qid)
+    n = np.zeros(max_qid)
+    sx, sxx, sy, sxy = (np.zeros(max_qid) for _ in range(4))
+    for qids, aids, correct in iter_log_chunks(db, chunk_size):
+        keep = (aids < max_attempt) & (qids < max_qid)
+        qids, aids, correct = qids[keep], aids[keep], correct[keep]
+        item_n += np.bincount(qids, minlength=max_qid)
+        item_c += np.bincount(qids, weights=correct, minlength=max_qid)
+
+        # Rest-score needs at least one other answer in the attempt
+        others = attempt_n[aids] - 1
+        keep = others > 0
+        qids, correct = qids[keep], correct[keep]
+        x = (attempt_c[aids[keep]] - correct) / others[keep]
+        n += np.bincount(qids, minlength=max_qid)
+        sx += np.bincount(qids, weights=x, minlength=max_qid)
+        sxx += np.bincount(qids, weights=x * x, minlength=max_qid)
+        sy += np.bincount(qids, weights=correct, minlength=max_qid)
+        sxy += np.bincount(qids, weights=x * correct, minlength=max_qid)
+
+    ids = np.array([q.id for q in questions], dtype=np.int64)
+    current = np.array([q.difficulty if q.difficulty is not None else 0.5 for q in questions], dtype=np.float64)
+    seed = np.array([q.seed_difficulty if q.seed_difficulty is not None else d for q, d in zip(questions, current)])
+
+    responses = item_n[ids]
+    correct = item_c[ids]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_correct = correct / responses
+        # Smoothed towards the seed: few responses barely move the difficulty
+        smoothed = (correct + prior_weight * (1 - seed)) / (responses + prior_weight)
+
+        # Pearson correlation of a binary item score with rest-score (sum y^2 = sum y)
+        nn, x, xx, y, xy = n[ids], sx[ids], sxx[ids], sy[ids], sxy[ids]
+        cov = nn * xy - x * y
+        var = (nn * xx - x * x) * (nn * y - y * y)
+        discrimination = np.where(var > 0, cov / np.sqrt(var), np.nan)
+
+    return CalibrationResult(
+        question_ids=ids,
+        responses=responses.astype(np.int64),
+        p_correct=p_correct,
+        difficulty=np.clip(1 - smoothed, 0.01, 0.99),
+        discrimination=discrimination,
+        seed=seed,
+        current=current,
+    )
+
+
+def divergent_items(result: CalibrationResult, min_responses: int = MIN_RESPONSES,
+                    threshold: float = DIVERGENCE_THRESHOLD):
+    """Indices of items whose empirical difficulty (1 - p) is far from the seed, worst first."""
+    with np.errstate(invalid="ignore"):
+        gap = np.abs((1 - result.p_correct) - result.seed)
+        flagged = np.flatnonzero((result.responses >= min_responses) & (gap > threshold))
+    return flagged[np.argsort(-gap[flagged])]
+
+
+def write_back(db, result: CalibrationResult, min_responses: int = MIN_RESPONSES, dry_run: bool = False) -> int:
+    """
+    Stores a history row for every item with responses and, unless dry_run, updates
+    Question.difficulty / discrimination for items with at least min_responses.
+    The first calibration copies the hand-picked difficulty into seed_difficulty.
+    Returns the number of questions updated.
+    """
+    run_at = datetime.utcnow()
+    history, updates = [], []
+    for i in np.flatnonzero(result.responses > 0):
+        qid = int(result.question_ids[i])
+        applied = not dry_run and result.responses[i] >= min_responses
+        discrimination = None if np.isnan(result.discrimination[i]) else float(result.discrimination[i])
+        history.append({
+            "question_id": qid,
+            "run_at": run_at,
+            "responses": int(result.responses[i]),
+            "p_correct": float(result.p_correct[i]),
+            "difficulty_before": float(result.current[i]),
+            "difficulty_after": float(result.difficulty[i]),
+            "discrimination": discrimination,
+            "applied": bool(applied),
+        })
+        if applied:
+            updates.append({
+                "id": qid,
+                "difficulty": float(result.difficulty[i]),
+                "discrimination": discrimination,
+                "seed_difficulty": float(result.seed[i]),
+            })
+
+    db.bulk_insert_mappings(ItemCalibration, history)
+    db.bulk_update_mappings(Question, updates)
+    db.commit()
+    return len(updates)
@@ -0,0 +1,299 @@
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import time
+
+import config
+import database
+from models import KnowledgeNode
+from mastery_decay import current_strength, decay_key
+
+
+class NodeState:
+    """In-memory copy of a KnowledgeNode (same attribute names, so readers can take either)."""
+    __slots__ = ("id", "user_id", "subject_id", "topic", "strength_score", "last_updated", "dirty")
+
+    def __init__(self, id, user_id, subject_id, topic, strength_score, last_updated, dirty=False):
+        self.id = id
+        self.user_id = user_id
+        self.subject_id = subject_id
+        self.topic = topic
+        self.strength_score = strength_score
+        self.last_updated = last_updated
+        self.dirty = dirty
+
+
+class UserNodes:
+    def __init__(self, states):
+        self.nodes = {(s.subject_id, s.topic): s for s in states}
+        self.last_access = time.monotonic()
+
+    def find(self, subject_id, topic):
+        if subject_id:
+            return self.nodes.get((subject_id, topic))
+        # No subject given: any node of that topic (same as the unfiltered DB lookup)
+        node = self.nodes.get((None, topic))
+        if node is None:
+            node = next((s for s in self.nodes.values() if s.topic == topic), None)
+        return node
+
+    def dirty_count(self):
+        return sum(1 for s in self.nodes.values() if s.dirty)
+
+
+class KnowledgeCache:
+    """
+    Write-back cache of each active user's knowledge nodes, keyed by (subject_id, topic).
+    Selection, dashboard and predictor read from here; answers update strengths in
+    memory only. A background thread writes dirty nodes in batches every flush_seconds
+    and drops users idle for idle_seconds. Disabled: every read goes to the DB.
+
+    Strength updates since the last flush are lost on a crash (logs are not), so keep
+    flush_seconds short. invalidate() (reset) bumps the user's generation; a flush drops
+    snapshot entries from an older generation, so it never re-creates nodes a reset deleted.
+
+    With several worker processes each keeps its own copy of a user's nodes and the last
+    flush wins; route a user to one worker or leave KNOWLEDGE_WRITE_BACK off.
+    """
+
+    def __init__(self, enabled: bool, capacity: int, flush_seconds: float, idle_seconds: float):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.flush_seconds = flush_seconds
+        self.idle_seconds = idle_seconds
+        self._users = OrderedDict()
+        self._generations = {}  # user_id -> number of invalidations
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.metrics = {"hits": 0, "misses": 0, "flushes": 0, "flushed_nodes": 0, "evicted_users": 0}
+
+    # --- Reads ---
+
+    def nodes(self, db, user_id: int, subject_id: int = None):
+        """The user's knowledge nodes (optionally for one subject)."""
+        if not self.enabled:
+            query = db.query(KnowledgeNode).filter(KnowledgeNode.user_id == user_id)
+            if subject_id:
+                query = query.filter(KnowledgeNode.subject_id == subject_id)
+            return query.all()
+
+        user = self._user(db, user_id)
+        with self._lock:
+            return [s for s in user.nodes.values() if not subject_id or s.subject_id == subject_id]
+
+    def weakest(self, db, user_id: int, n: int):
+        """The user's n weakest nodes by decayed strength (index scan on (user_id, decay_key) when disabled)."""
+        if not self.enabled:
+            return db.query(KnowledgeNode).filter(
+                KnowledgeNode.user_id == user_id
+            ).order_by(KnowledgeNode.decay_key.asc()).limit(n).all()
+
+        now = datetime.utcnow()
+        return sorted(self.nodes(db, user_id), key=lambda s: current_strength(s, now))[:n]
+
+    # --- Writes ---
+
+    def update(self, db, user_id: int, answers, next_strength, propagate=None):
+        """
+        Applies (subject_id, topic, is_correct, difficulty) answers in order, in memory.
+        next_strength(current, subject_id, topic, is_correct, difficulty) gives the new strength;
+        new nodes start at current=None. propagate(subject_id, topic, delta) optionally lists
+        (related topic, weight): existing related nodes move by weight * delta.
+        Returns the strength after each answer.
+        """
+        user = self._user(db, user_id)
+        now = datetime.utcnow()
+        strengths = []
+        with self._lock:
+            for subject_id, topic, is_correct, difficulty in answers:
+                node = user.find(subject_id, topic)
+                if node is None:
+                    node = NodeState(None, user_id, subject_id, topic, None, now)
+                    user.nodes[(subject_id, topic)] = node
+                elif node.strength_score is not None:
+                    node.strength_score = current_strength(node, now)
+                before = node.strength_score
+                node.strength_score = next_strength(before, subject_id, topic, is_correct, difficulty)
+                node.last_updated = now
+                node.dirty = True
+                strengths.append(node.strength_score)
+
+                if propagate is None or before is None:
+                    continue
+                delta = node.strength_score - before
+                for related_topic, weight in propagate(subject_id, topic, delta):
+                    related = user.nodes.get((subject_id, related_topic))
+                    if related is None or related.strength_score is None:
+                        continue
+                    related.strength_score = min(1.0, max(0.0, current_strength(related, now) + weight * delta))
+                    related.last_updated = now
+                    related.dirty = True
+        return strengths
+
+    def invalidate(self, user_id: int):
+        """Drops the user's nodes, including unflushed changes (used by reset)."""
+        with self._lock:
+            self._users.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    # --- Flushing ---
+
+    def flush(self) -> int:
+        """Writes every dirty node in one transaction. Returns the number of nodes written."""
+        with self._flush_lock:
+            with self._lock:
+                dirty = [s for user in self._users.values() for s in user.nodes.values() if s.dirty]
+                snapshot = [(s, s.strength_score, s.last_updated, self._generations.get(s.user_id, 0)) for s in dirty]
+                for s in dirty:
+                    s.dirty = False
+
+            while snapshot:
+                stale = self._write(snapshot)
+                if stale is None:
+                    return 0
+                if not stale:
+                    break
+                # Reset while writing: rolled back, write the other users again
+                snapshot = [entry for entry in snapshot if entry[0].user_id not in stale]
+            if not snapshot:
+                return 0
+
+            self.metrics["flushes"] += 1
+            self.metrics["flushed_nodes"] += len(snapshot)
+            return len(snapshot)
+
+    def _write(self, snapshot):
+        """
+        Writes snapshot entries in one transaction. Returns the users invalidated since the
+        snapshot (nothing committed if any), or None if the write failed.
+        """
+        db = database.SessionLocal()
+        try:
+            db.bulk_update_mappings(KnowledgeNode, [
+                {"id": s.id, "strength_score": strength, "last_updated": updated,
+                 "decay_key": decay_key(strength, updated)}
+                for s, strength, updated, _ in snapshot if s.id is not None
+            ])
+            created = []
+            for s, strength, updated, _ in snapshot:
+                if s.id is None:
+                    node = KnowledgeNode(user_id=s.user_id, subject_id=s.subject_id, topic=s.topic,
+                                         strength_score=strength, last_updated=updated,
+                                         decay_key=decay_key(strength, updated))
+                    db.add(node)
+                    created.append((s, node))
+            db.flush() # Get IDs of new nodes
+            # Checked and committed under the lock, so a reset can't slip in between
+            with self._lock:
+                stale = {s.user_id for s, _, _, generation in snapshot
+                         if self._generations.get(s.user_id, 0) != generation}
+                if stale:
+                    db.rollback()
+                    return stale
+                db.commit()
+            for s, node in created:
+                s.id = node.id
+            return stale
+        except Exception as e:
+            db.rollback()
+            print(f"Knowledge cache flush failed, will retry: {e}")
+            with self._lock:
+                for s, _, _, generation in snapshot:
+                    if self._generations.get(s.user_id, 0) == generation:
+                        s.dirty = True
+            return None
+        finally:
+            db.close()
+
+    def evict_idle(self):
+        """Flushes, then drops users not seen for idle_seconds."""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [uid for uid, user in self._users.items() if user.last_access < cutoff]
+        if not idle:
+            return
+        self.flush()
+        with self._lock:
+            for uid in idle:
+                user = self._users.get(uid)
+                if user is not None and user.last_access < cutoff and not user.dirty_count():
+                    del self._users[uid]
+                    self.metrics["evicted_users"] += 1
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="knowledge-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+            self.evict_idle()
+
+    # --- Internals ---
+
+    def _user(self, db, user_id: int) -> UserNodes:
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                self._users.move_to_end(user_id)
+                user.last_access = time.monotonic()
+                self.metrics["hits"] += 1
+                return user
+            generation = self._generations.get(user_id, 0)
+
+        rows = db.query(
+            KnowledgeNode.id, KnowledgeNode.subject_id, KnowledgeNode.topic,
+            KnowledgeNode.strength_score, KnowledgeNode.last_updated
+        ).filter(KnowledgeNode.user_id == user_id).all()
+        loaded = UserNodes(NodeState(r.id, user_id, r.subject_id, r.topic, r.strength_score, r.last_updated) for r in rows)
+        if db.info.get("read_only"):
+            return loaded # A lagging replica must not become the base that answers update
+
+        with self._lock:
+            self.metrics["misses"] += 1
+            if self._generations.get(user_id, 0) != generation:
+                return loaded # Reset during the load: don't cache what it may have deleted
+            user = self._users.setdefault(user_id, loaded)
+            self._users.move_to_end(user_id)
+            self._evict_over_capacity(keep=user_id)
+            return user
+
+    def _evict_over_capacity(self, keep: int):
+        # Only clean users are evicted here; dirty ones go after their next flush
+        excess = len(self._users) - self.capacity
+        if excess <= 0:
+            return
+        clean = [uid for uid, user in self._users.items() if uid != keep and not user.dirty_count()]
+        for uid in clean[:excess]:
+            del self._users[uid]
+            self.metrics["evicted_users"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "users": len(self._users),
+                "dirty_nodes": sum(user.dirty_count() for user in self._users.values()),
+                **self.metrics,
+            }
+
+
+knowledge_cache = KnowledgeCache(
+    enabled=config.KNOWLEDGE_WRITE_BACK,
+    capacity=config.KNOWLEDGE_CACHE_USERS,
+    flush_seconds=config.KNOWLEDGE_FLUSH_SECONDS,
+    idle_seconds=config.KNOWLEDGE_IDLE_SECONDS,
+)
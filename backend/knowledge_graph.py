@@ -1,69 +1,132 @@
 from sqlalchemy.orm import Session
 import models
 from models import KnowledgeNode, User, QuestionLog
+from knowledge_cache import knowledge_cache
+from bkt import bkt_engine, uses_bkt
+from mastery_decay import current_strength, decay_key
+from topic_graph import topic_graph
 from datetime import datetime
 
 class KnowledgeGraphEngine:
     def __init__(self, db: Session):
         self.db = db
 
-    def update_topic_strength(self, user_id: int, topic: str, is_correct: bool, difficulty: float, subject_id: int = None):
+    def update_topic_strength(self, user_id: int, topic: str, is_correct: bool, difficulty: float, subject_id: int = None, commit: bool = True):
         """
         Updates the knowledge node strength for a user/topic based on recent performance.
         Uses a moving average approach with difficulty weighting.
+        Pass commit=False to leave the commit to the caller's transaction.
         """
-        # Try to find existing node
+        new_score = self.apply_answers(user_id, [(subject_id, topic, is_correct, difficulty)])[0]
+        if commit:
+            self.db.commit()
+        return new_score
+
+    def apply_answers(self, user_id: int, answers):
+        """
+        Folds a batch of answers into the graph without committing.
+        answers: ordered list of (subject_id, topic, is_correct, difficulty).
+        Each topic's node is loaded once and updated in answer order.
+        Returns the strength after each answer, in input order.
+        Updates start from the decayed strength, so forgetting is folded in on write.
+        The change is also propagated along the subject's prerequisite graph (topic_graph.py)
+        to topics the user has practised; the first answer in a topic has no change to propagate.
+        """
+        graphs = {subject_id: topic_graph.for_subject(self.db, subject_id) for subject_id, _, _, _ in answers}
+        propagate = lambda subject_id, topic, delta: topic_graph.propagation(graphs[subject_id], topic, delta)
+
+        if knowledge_cache.enabled:
+            # Updated in memory, written by the cache's batch flush
+            return knowledge_cache.update(self.db, user_id, answers, self._next, propagate)
+
+        now = datetime.utcnow()
+        nodes = {}
+        strengths = []
+        for subject_id, topic, is_correct, difficulty in answers:
+            key = (subject_id, topic)
+            node = nodes.get(key)
+            if node is None:
+                node = nodes[key] = self._get_or_create_node(user_id, topic, subject_id)
+                if node.strength_score is not None:
+                    node.strength_score = current_strength(node, now)
+            before = node.strength_score
+            node.strength_score = self._next(before, subject_id, topic, is_correct, difficulty)
+            strengths.append(node.strength_score)
+
+            if before is None:
+                continue
+            delta = node.strength_score - before
+            for related_topic, weight in propagate(subject_id, topic, delta):
+                related = nodes.get((subject_id, related_topic))
+                if related is None:
+                    related = self._find_node(user_id, related_topic, subject_id)
+                    if related is None or related.strength_score is None:
+                        continue
+                    related.strength_score = current_strength(related, now)
+                    nodes[(subject_id, related_topic)] = related
+                related.strength_score = min(1.0, max(0.0, related.strength_score + weight * delta))
+
+        for node in nodes.values():
+            node.last_updated = now
+            node.decay_key = decay_key(node.strength_score, now)
+        return strengths
+
+    def _find_node(self, user_id: int, topic: str, subject_id: int = None):
         query = self.db.query(KnowledgeNode).filter(
             KnowledgeNode.user_id == user_id, 
             KnowledgeNode.topic == topic
         )
         if subject_id:
             query = query.filter(KnowledgeNode.subject_id == subject_id)
-            
-        node = query.first()
+        return query.first()
+
+    def _get_or_create_node(self, user_id: int, topic: str, subject_id: int = None):
+        # Try to find existing node
+        node = self._find_node(user_id, topic, subject_id)
 
         if not node:
-            node = KnowledgeNode(user_id=user_id, topic=topic, strength_score=0.1, subject_id=subject_id)
+            node = KnowledgeNode(user_id=user_id, topic=topic, strength_score=None, subject_id=subject_id)
             self.db.add(node)
-        
+        return node
+
+    @classmethod
+    def _next(cls, current, subject_id, topic: str, is_correct: bool, difficulty: float) -> float:
+        """New strength after an answer; None = new node. BKT for subjects in config.BKT_SUBJECTS."""
+        if uses_bkt(subject_id):
+            return bkt_engine.next_strength(current, topic, is_correct)
+        return cls.next_strength(0.1 if current is None else current, is_correct, difficulty)
+
+    @staticmethod
+    def next_strength(current: float, is_correct: bool, difficulty: float) -> float:
         # Adaptive Logic:
         # If correct: Increase strength. Gain is higher if difficulty > current strength.
         # If wrong: Decrease strength. Penalty is higher if difficulty < current strength.
-        
-        current = node.strength_score
         learning_rate = 0.1
         
         if is_correct:
             # Boost based on difficulty vs mastery gap
             gap = max(0, difficulty - current)
             boost = learning_rate * (1 + gap)
-            new_score = min(1.0, current + boost)
+            return min(1.0, current + boost)
         else:
             # Penalize. If I failed an easy question, huge penalty.
             gap = max(0, current - difficulty)
             penalty = learning_rate * (1 + gap)
-            new_score = max(0.0, current - penalty)
-
-        node.strength_score = new_score
-        node.last_updated = datetime.utcnow()
-        self.db.commit()
-        return new_score
+            return max(0.0, current - penalty)
 
     def get_user_knowledge_graph(self, user_id: int):
         """Returns all knowledge nodes for a user, including subject info."""
-        # Join with Subject table to get names
-        results = (
-            self.db.query(KnowledgeNode, models.Subject.name)
-            .outerjoin(models.Subject, KnowledgeNode.subject_id == models.Subject.id)
-            .filter(KnowledgeNode.user_id == user_id)
-            .all()
-        )
+        user_nodes = knowledge_cache.nodes(self.db, user_id)
+        subject_ids = {node.subject_id for node in user_nodes if node.subject_id}
+        subject_names = dict(
+            self.db.query(models.Subject.id, models.Subject.name).filter(models.Subject.id.in_(subject_ids)).all()
+        ) if subject_ids else {}
         
         nodes = []
-        for node, subject_name in results:
+        for node in user_nodes:
             nodes.append({
                 "topic": node.topic, 
-                "strength": node.strength_score,
-                "subject": subject_name or "General"
+                "strength": current_strength(node),
+                "subject": subject_names.get(node.subject_id) or "General"
             })
         return nodes
\ No newline at end of file
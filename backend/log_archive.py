@@ -0,0 +1,389 @@
+"""
+Hot/cold partitioning of question_logs.
+
+Logs of completed attempts started more than LOG_RETENTION_DAYS ago move to a
+per-month archive: one SQLite file per month, attached to a connection only while
+it is read or written, or the question_logs_archive table (LOG_ARCHIVE_STORE).
+quiz_attempts.archived_month records where an attempt's logs went, and
+question_log_rollups keeps per-user, per-question totals in the hot database, so
+question selection never reads archives. Exports, item calibration, BKT replay and
+fail-model training read them through log_tables() / user_histories().
+
+A move copies the logs first (idempotent), then folds them into the rollups, marks
+the attempts and deletes them in one transaction on the main database. Readers only
+take archived rows of marked attempts, so an interrupted move is never counted
+twice; the next run completes it.
+
+Usage: python log_archive.py [status | run [DAYS] | restore MONTH]
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import chain
+import os
+import sys
+import threading
+
+from sqlalchemy import select, update, delete, func, cast, literal, bindparam, and_, Integer, MetaData
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.sql import visitors
+
+import config
+import database
+from models import QuizAttempt, Question, QuestionLog, QuestionLogArchive, QuestionLogRollup
+
+# Name a month's file is attached as
+SCHEMA = "log_archive"
+LOG_COLUMNS = [c.name for c in QuestionLog.__table__.columns]
+
+_file_table = QuestionLogArchive.__table__.to_metadata(MetaData(), schema=SCHEMA)
+
+
+def store(engine=None) -> str:
+    """'files' or 'table': LOG_ARCHIVE_STORE with auto resolved for the database."""
+    dialect = (engine or database.engine).dialect.name
+    if config.LOG_ARCHIVE_STORE == "auto":
+        return "files" if dialect == "sqlite" else "table"
+    if config.LOG_ARCHIVE_STORE == "files" and dialect != "sqlite":
+        raise ValueError("LOG_ARCHIVE_STORE=files needs a SQLite database")
+    return config.LOG_ARCHIVE_STORE
+
+
+def month_path(month: str) -> str:
+    return os.path.join(config.LOG_ARCHIVE_DIR, f"question_logs_{month.replace('-', '_')}.db")
+
+
+def months(conn) -> list:
+    """Months holding archived attempts, oldest first."""
+    return [m for (m,) in conn.execute(
+        select(QuizAttempt.archived_month).where(QuizAttempt.archived_month.isnot(None))
+        .distinct().order_by(QuizAttempt.archived_month)
+    )]
+
+
+@contextmanager
+def attach(conn, month: str, create: bool = False):
+    """
+    The archive table holding month's logs, usable in queries on conn (a connection to
+    the main database). With files, the month's file is attached for the duration of
+    the block; yields None if it doesn't exist (unless create). Commit writes before
+    the block ends.
+    """
+    if store(conn.engine) == "table":
+        yield QuestionLogArchive.__table__
+        return
+    path = month_path(month)
+    if not create and not os.path.exists(path):
+        yield None
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn.exec_driver_sql(f"ATTACH DATABASE ? AS {SCHEMA}", (os.path.abspath(path),))
+    try:
+        if create:
+            _file_table.create(conn, checkfirst=True)
+            conn.commit()
+        yield _file_table
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            conn.exec_driver_sql(f"DETACH DATABASE {SCHEMA}")
+        except Exception:
+            conn.invalidate() # Never hand a connection with the file still attached back to the pool
+            raise
+
+
+def archived_rows(archive, month: str):
+    """Filter for month's rows in archive that belong to attempts marked with it."""
+    return and_(
+        archive.c.archived_month == month,
+        archive.c.attempt_id.in_(select(QuizAttempt.id).where(QuizAttempt.archived_month == month)),
+    )
+
+
+def log_tables(conn):
+    """
+    Yields (table, where) for question_logs, then for each archived month: its archive table
+    and the filter for its rows. A month's file stays attached only until the next item.
+    """
+    yield QuestionLog.__table__, ()
+    for month in months(conn):
+        with attach(conn, month) as archive:
+            if archive is not None:
+                yield archive, (archived_rows(archive, month),)
+
+
+def user_histories(conn, user_ids, columns, where=()) -> list:
+    """
+    Answers of user_ids from question_logs and the archives as rows of
+    (user_id, subject_id, topic, *columns, log_id), ordered by user, subject, topic and
+    log id (answer order). columns: log column names or QuizAttempt / Question columns;
+    where: filters on QuizAttempt / Question.
+    """
+    parts = []
+    for logs, archived in log_tables(conn):
+        rows = conn.execute(
+            select(QuizAttempt.user_id, Question.subject_id, Question.topic,
+                   *[logs.c[c] if isinstance(c, str) else c for c in columns], logs.c.id.label("log_id"))
+            .join_from(logs, QuizAttempt, logs.c.attempt_id == QuizAttempt.id)
+            .join(Question, logs.c.question_id == Question.id)
+            .where(QuizAttempt.user_id.in_(user_ids), *where, *archived)
+            .order_by(QuizAttempt.user_id, Question.subject_id.nulls_first(), Question.topic.nulls_first(), logs.c.id)
+        ).all()
+        if rows:
+            parts.append(rows)
+    if len(parts) <= 1:
+        return parts[0] if parts else []
+    # Same order as the query: NULL subjects and topics first
+    return sorted(chain(*parts), key=lambda r: (r[0], r[1] is not None, r[1] or 0, r[2] is not None, r[2] or "", r[-1]))
+
+
+def adapt(clause, archive):
+    """clause (on question_logs columns) rewritten for the archive table."""
+    logs = QuestionLog.__table__
+
+    def replace(element):
+        if getattr(element, "table", None) is logs:
+            return archive.c[element.name]
+        return None
+    return visitors.replacement_traverse(clause, {}, replace)
+
+
+def max_id(conn):
+    """Highest archived log id (None without archives)."""
+    ids = []
+    for month in months(conn):
+        with attach(conn, month) as archive:
+            if archive is not None:
+                ids.append(conn.execute(select(func.max(archive.c.id)).where(archive.c.archived_month == month)).scalar())
+    return max(filter(None, ids), default=None)
+
+
+# --- Moving ---
+
+def _insert(conn, table):
+    return (postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert)(table)
+
+
+def _add_to_rollups(conn, rows, sign: int = 1):
+    """rows: dicts of user_id, question_id, answered, correct, time_taken (subtracted with sign=-1)."""
+    table = QuestionLogRollup.__table__
+    if sign > 0:
+        stmt = _insert(conn, table)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "question_id"],
+            set_={name: table.c[name] + stmt.excluded[name] for name in ("answered", "correct", "time_taken")},
+        ), rows)
+        return
+    conn.execute(update(table).where(
+        table.c.user_id == bindparam("b_user_id"), table.c.question_id == bindparam("b_question_id")
+    ).values(
+        answered=table.c.answered - bindparam("b_answered"),
+        correct=table.c.correct - bindparam("b_correct"),
+        time_taken=table.c.time_taken - bindparam("b_time_taken"),
+    ), [{f"b_{k}": v for k, v in row.items()} for row in rows])
+    conn.execute(delete(table).where(table.c.answered <= 0))
+
+
+def _totals(conn, logs, where):
+    """Per (user, question) totals of the logs in table `logs` matching where, as rollup rows."""
+    rows = conn.execute(
+        select(QuizAttempt.user_id, logs.c.question_id, func.count(logs.c.id),
+               func.sum(cast(logs.c.is_correct, Integer)), func.sum(logs.c.time_taken))
+        .join(QuizAttempt, logs.c.attempt_id == QuizAttempt.id)
+        .where(where, logs.c.question_id.isnot(None), QuizAttempt.user_id.isnot(None))
+        .group_by(QuizAttempt.user_id, logs.c.question_id)
+    ).all()
+    return [{"user_id": u, "question_id": q, "answered": n, "correct": c or 0, "time_taken": t or 0.0}
+            for u, q, n, c, t in rows]
+
+
+def _move(conn, month: str, attempt_ids: list) -> int:
+    """Archives the logs of attempt_ids (all started in month). Returns the number of logs moved."""
+    logs = QuestionLog.__table__
+    with attach(conn, month, create=True) as archive:
+        conn.execute(_insert(conn, archive).from_select(
+            LOG_COLUMNS + ["archived_month"],
+            select(*[logs.c[name] for name in LOG_COLUMNS], literal(month))
+            .where(logs.c.attempt_id.in_(attempt_ids)),
+        ).on_conflict_do_nothing(index_elements=["id"]))
+        conn.commit()
+
+    totals = _totals(conn, logs, logs.c.attempt_id.in_(attempt_ids))
+    if totals:
+        _add_to_rollups(conn, totals)
+    conn.execute(update(QuizAttempt).where(QuizAttempt.id.in_(attempt_ids)).values(archived_month=month))
+    moved = conn.execute(delete(logs).where(logs.c.attempt_id.in_(attempt_ids))).rowcount
+    conn.commit()
+    return moved
+
+
+def archive_logs(before: datetime = None, batch: int = None) -> dict:
+    """
+    Moves the logs of completed attempts started before `before` (default: now minus
+    LOG_RETENTION_DAYS) to their month's archive. Returns {month: [attempts, logs]}.
+    """
+    before = before or datetime.utcnow() - timedelta(days=config.LOG_RETENTION_DAYS)
+    batch = batch or config.LOG_ARCHIVE_BATCH
+    moved = defaultdict(lambda: [0, 0])
+    with database.engine.connect() as conn:
+        while True:
+            rows = conn.execute(
+                select(QuizAttempt.id, QuizAttempt.timestamp).where(
+                    QuizAttempt.archived_month.is_(None), QuizAttempt.completed == True,
+                    QuizAttempt.timestamp < before,
+                ).order_by(QuizAttempt.id).limit(batch)
+            ).all()
+            conn.commit()
+            if not rows:
+                break
+            by_month = defaultdict(list)
+            for attempt_id, started in rows:
+                by_month[started.strftime("%Y-%m")].append(attempt_id)
+            for month, attempt_ids in by_month.items():
+                logs = _move(conn, month, attempt_ids)
+                moved[month][0] += len(attempt_ids)
+                moved[month][1] += logs
+    return dict(moved)
+
+
+def restore(month: str, batch: int = None) -> int:
+    """Moves month's logs back into question_logs (undoes archive_logs). Returns the number of logs restored."""
+    batch = batch or config.LOG_ARCHIVE_BATCH
+    logs = QuestionLog.__table__
+    restored = 0
+    with database.engine.connect() as conn:
+        attempt_ids = [i for (i,) in conn.execute(select(QuizAttempt.id).where(QuizAttempt.archived_month == month))]
+        conn.commit()
+        for start in range(0, len(attempt_ids), batch):
+            chunk = attempt_ids[start:start + batch]
+            with attach(conn, month) as archive:
+                if archive is None:
+                    raise FileNotFoundError(f"Archive of {month} is missing ({month_path(month)})")
+                where = and_(archive.c.archived_month == month, archive.c.attempt_id.in_(chunk))
+                totals = _totals(conn, archive, where)
+                restored += conn.execute(_insert(conn, logs).from_select(
+                    LOG_COLUMNS, select(*[archive.c[name] for name in LOG_COLUMNS]).where(where)
+                ).on_conflict_do_nothing(index_elements=["id"])).rowcount
+                if totals:
+                    _add_to_rollups(conn, totals, sign=-1)
+                conn.execute(update(QuizAttempt).where(QuizAttempt.id.in_(chunk)).values(archived_month=None))
+                conn.commit()
+    prune(month)
+    return restored
+
+
+def prune(month: str) -> int:
+    """
+    Deletes month's archived logs whose attempt is no longer marked with it (reset,
+    restore, interrupted move); removes the file once empty. Returns the rows deleted.
+    """
+    with database.engine.connect() as conn:
+        with attach(conn, month) as archive:
+            if archive is None:
+                return 0
+            marked = select(QuizAttempt.id).where(QuizAttempt.archived_month == month)
+            deleted = conn.execute(delete(archive).where(
+                archive.c.archived_month == month, archive.c.attempt_id.not_in(marked)
+            )).rowcount
+            left = conn.execute(select(func.count()).select_from(archive).where(archive.c.archived_month == month)).scalar()
+            conn.commit()
+    if not left and store() == "files":
+        os.remove(month_path(month))
+    return deleted
+
+
+def forget_user(db, user_id: int) -> list:
+    """
+    Drops the user's rollups (no commit), for reset. Returns the months holding their
+    archived logs: prune() them once the attempts are deleted.
+    """
+    user_months = [m for (m,) in db.query(QuizAttempt.archived_month).filter(
+        QuizAttempt.user_id == user_id, QuizAttempt.archived_month.isnot(None)
+    ).distinct()]
+    db.query(QuestionLogRollup).filter(QuestionLogRollup.user_id == user_id).delete(synchronize_session=False)
+    return user_months
+
+
+# --- Background runs ---
+
+class LogArchiver:
+    """Runs archive_logs() every interval_hours in the API process (0 = never)."""
+
+    def __init__(self, interval_hours: float):
+        self.interval_hours = interval_hours
+        self._stop = threading.Event()
+        self._thread = None
+        self.metrics = {"runs": 0, "failures": 0, "archived_attempts": 0, "archived_logs": 0, "last_run": None}
+
+    def run_once(self) -> dict:
+        try:
+            moved = archive_logs()
+        except Exception as e:
+            self.metrics["failures"] += 1
+            print(f"Log archive run failed: {e}")
+            return {}
+        self.metrics["runs"] += 1
+        self.metrics["archived_attempts"] += sum(attempts for attempts, _ in moved.values())
+        self.metrics["archived_logs"] += sum(logs for _, logs in moved.values())
+        self.metrics["last_run"] = datetime.utcnow().isoformat()
+        return moved
+
+    def start(self):
+        if self.interval_hours <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="log-archive", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {"interval_hours": self.interval_hours, "retention_days": config.LOG_RETENTION_DAYS, **self.metrics}
+
+    def _run(self):
+        delay = min(60.0, self.interval_hours * 3600) # First run shortly after startup
+        while not self._stop.wait(delay):
+            self.run_once()
+            delay = self.interval_hours * 3600
+
+
+log_archiver = LogArchiver(config.LOG_ARCHIVE_INTERVAL_HOURS)
+
+
+def status():
+    with database.engine.connect() as conn:
+        hot = conn.execute(select(func.count()).select_from(QuestionLog.__table__)).scalar()
+        print(f"Store: {store()}, retention {config.LOG_RETENTION_DAYS:g} days")
+        print(f"Hot: {hot} logs")
+        for month in months(conn):
+            attempts = conn.execute(
+                select(func.count()).select_from(QuizAttempt).where(QuizAttempt.archived_month == month)
+            ).scalar()
+            with attach(conn, month) as archive:
+                logs = conn.execute(select(func.count()).select_from(archive).where(archived_rows(archive, month))).scalar() \
+                    if archive is not None else 0
+            print(f"{month}: {attempts} attempts, {logs} logs")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "status":
+        status()
+    elif command == "run":
+        days = float(sys.argv[2]) if len(sys.argv) > 2 else config.LOG_RETENTION_DAYS
+        moved = archive_logs(before=datetime.utcnow() - timedelta(days=days))
+        for month, (attempts, logs) in sorted(moved.items()):
+            print(f"{month}: archived {logs} logs of {attempts} attempts")
+        print(f"[DONE] Archived {sum(logs for _, logs in moved.values())} logs")
+    elif command == "restore" and len(sys.argv) > 2:
+        print(f"[DONE] Restored {restore(sys.argv[2])} logs")
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -1,15 +1,37 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 from datetime import datetime
 from pydantic import BaseModel
 from typing import List, Optional
+import random
+import secrets
+import tempfile
+import config
 import database
 import models
 from knowledge_graph import KnowledgeGraphEngine
 from predictor import PredictorEngine
 from question_generator import QuestionGenerator
 from analytics import AnalyticsEngine
+from answered_cache import answered_cache
+from question_index import question_index
+from question_queue import prefetch_queues
+from attempt_context import attempt_contexts, questions_for_mode, MOCK_EXAM_MODE, MOCK_EXAM_QUESTIONS
+from mock_exam import MockExamAssembler
+from attempt_scoring import apply_answers
+from write_behind import log_writer
+from knowledge_cache import knowledge_cache
+import user_stats
+from dashboard_cache import dashboard_cache, etag_matches
+from read_routing import read_router
+import data_export
+import log_archive
+from log_archive import log_archiver
+import migrations
+from score_percentiles import score_percentiles, best_score, EXAM, SUBJECT
 import pdf_quiz
 from pydantic import EmailStr
 import os
@@ -51,6 +73,11 @@ class AnswerSubmission(BaseModel):
     question_id: int
     selected_answer: str
     time_taken: float
+    attempt_id: Optional[int] = None # Session attempt; omitted = one-off attempt per answer (legacy)
+
+class BatchAnswerSubmission(BaseModel):
+    attempt_id: Optional[int] = None # Session attempt; omitted = one new attempt for the whole batch
+    answers: List[AnswerSubmission] # In the order they were answered
 
 class ChatRequest(BaseModel):
     message: str
@@ -135,11 +162,23 @@ def google_login(req: GoogleLoginRequest, db: Session = Depends(get_db)):
 
 @app.on_event("startup")
 def startup_event():
+    # Bring an existing database up to the current schema
+    if config.AUTO_MIGRATE:
+        try:
+            migrations.upgrade()
+        except Exception as e:
+            print(f"Migration Error: {e}")
+
     # Seed data
     db = database.SessionLocal()
     try:
         gen = QuestionGenerator(db)
         gen.seed_questions()
+        question_index.build(db)
+        log_writer.start() # Replays any journaled answers first
+        knowledge_cache.start()
+        score_percentiles.start()
+        log_archiver.start()
         
         # Ensure a demo user exists
         if not db.query(models.User).filter(models.User.username == "student").first():
@@ -155,22 +194,33 @@ def startup_event():
     finally:
         db.close()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    log_writer.stop()
+    knowledge_cache.stop()
+    score_percentiles.stop()
+    log_archiver.stop()
+    for engine in (database.async_engine, database.async_read_engine):
+        if engine is not None:
+            await engine.dispose()
+
 # --- New Hierarchy Endpoints ---
+# Read-only endpoints take database.get_read_db (read engine / replica, see read_routing.py)
 
 @app.get("/streams")
-def get_streams(db: Session = Depends(get_db)):
+def get_streams(db: Session = Depends(database.get_read_db)):
     return db.query(models.Stream).all()
 
 @app.get("/exams")
-def get_exams(stream_id: int, db: Session = Depends(get_db)):
+def get_exams(stream_id: int, db: Session = Depends(database.get_read_db)):
     return db.query(models.Exam).filter(models.Exam.stream_id == stream_id).all()
 
 @app.get("/subjects")
-def get_subjects(exam_id: int, db: Session = Depends(get_db)):
+def get_subjects(exam_id: int, db: Session = Depends(database.get_read_db)):
     return db.query(models.Subject).filter(models.Subject.exam_id == exam_id).all()
 
 @app.get("/quizzes")
-def get_quizzes(subject_id: int, db: Session = Depends(get_db)):
+def get_quizzes(subject_id: int, db: Session = Depends(database.get_read_db)):
     return db.query(models.Quiz).filter(models.Quiz.subject_id == subject_id).all()
 
 # Modified Quiz Logic
@@ -191,7 +241,7 @@ class StartQuizRequest(BaseModel):
     subject_id: int
     type: str # 'basics', 'concept', 'mixed', 'full'
     topic: Optional[str] = None
-    mode: Optional[str] = "practice" # 'practice', 'topic_mock', 'final_mock'
+    mode: Optional[str] = None # 'practice', 'topic_mock', 'final_mock'; None = regular quiz
 
 @app.post("/quiz/start")
 def start_quiz_session(
@@ -200,51 +250,32 @@ def start_quiz_session(
     db: Session = Depends(get_db)
 ):
     """Starts a new quiz session for a subject and type."""
-    # Logic for Topic Mock / Final Mock
-    quiz_title = req.type
-    if req.topic:
-        quiz_title = f"{req.topic} ({req.mode})"
-    
-    # Check if a Quiz exists for this topic/mode, or create generic
-    # For now, we rely on dynamic filtering in get_next_question based on Attempt Metadata
-    # But QuizAttempt doesn't have 'topic' column. We can use quiz_id or add topic column to Attempt?
-    # Simpler: Create a temporary Quiz entry or just use the Subject and store metadata in a JSON field if we had one.
-    # BEST APPROACH: Reuse 'quiz_id' by creating a placeholder Quiz for this topic if needed, OR just store it in memory/context?
-    # Let's create a new Quiz entry dynamically if it's a Topic Mock to track it properly.
-    
-    quiz = None
-    if req.topic:
-        quiz = db.query(models.Quiz).filter(models.Quiz.title == quiz_title, models.Quiz.subject_id == req.subject_id).first()
-        if not quiz:
-            quiz = models.Quiz(
-                title=quiz_title, 
-                subject_id=req.subject_id, 
-                questions_count=30 if req.mode == 'topic_mock' else (1000 if req.mode == 'practice' else 50)
-            )
-            db.add(quiz)
-            db.commit()
-            db.refresh(quiz)
-
-    # ... logic continues ...
     if req.type not in QUIZ_TYPES and not req.topic:
         raise HTTPException(status_code=400, detail="Invalid quiz type")
 
+    # Topic / Mode / Cap are stored on the attempt and drive get_next_question
+    q_count = questions_for_mode(req.mode)
+
     # Create a new attempt
     attempt = models.QuizAttempt(
         user_id=user_id,
         subject_id=req.subject_id,
-        quiz_id=quiz.id if quiz else None, # Link to topic quiz
         score=0.0,
         timestamp=datetime.utcnow(),
         total_time=0.0,
         accuracy=0.0,
-        completed=False
+        completed=False,
+        mode=req.mode,
+        topic=req.topic,
+        max_questions=q_count
     )
     db.add(attempt)
+    user_stats.record_attempt_started(db, user_id)
     db.commit() # Get ID
     db.refresh(attempt)
+    dashboard_cache.invalidate(user_id)
+    read_router.note_write(user_id)
     
-    q_count = 30 if req.mode == 'topic_mock' else (1000 if req.mode == 'practice' else 50)
     return {"attempt_id": attempt.id, "message": "Quiz started", "total_questions": q_count}
 
 @app.post("/exam/{exam_id}/start_mock")
@@ -253,7 +284,10 @@ def start_mock_exam(
     user_id: int = 1,
     db: Session = Depends(get_db)
 ):
-    """Starts a full mock exam session."""
+    """Starts a full mock exam session. The whole paper is assembled up front from the exam blueprint."""
+    paper = MockExamAssembler(db).assemble(exam_id, answered=answered_cache.get(db, user_id))
+    total_questions = len(paper) or MOCK_EXAM_QUESTIONS
+
     attempt = models.QuizAttempt(
         user_id=user_id,
         exam_id=exam_id, # Track Exam
@@ -261,78 +295,131 @@ def start_mock_exam(
         timestamp=datetime.utcnow(),
         total_time=0.0,
         accuracy=0.0,
-        completed=False
+        completed=False,
+        mode=MOCK_EXAM_MODE,
+        max_questions=total_questions,
+        paper=paper or None
     )
     db.add(attempt)
+    user_stats.record_attempt_started(db, user_id)
     db.commit()
     db.refresh(attempt)
-    return {"attempt_id": attempt.id, "message": "Mock Exam Started", "total_questions": 90}
+    dashboard_cache.invalidate(user_id)
+    read_router.note_write(user_id)
+    return {"attempt_id": attempt.id, "message": "Mock Exam Started", "total_questions": total_questions}
 
 
-@app.get("/quiz/{attempt_id}/next")
-def get_next_question_for_attempt(
-    attempt_id: int,
-    current_question_index: int = 0, # Frontend tracks this
-    user_id: int = 1, # Should be gathered from token in real app but passed for now
-    db: Session = Depends(get_db)
-):
-    """Get next question for the attempt."""
-    attempt = db.query(models.QuizAttempt).filter(models.QuizAttempt.id == attempt_id).first()
-    if not attempt:
+def _check_attempt_open(db: Session, attempt_id: int):
+    """Resolves the attempt context and enforces its question limit. Returns (ctx, questions_answered)."""
+    ctx = attempt_contexts.get(db, attempt_id)
+    if not ctx:
         raise HTTPException(status_code=404, detail="Attempt not found")
-        
-    subject_id = attempt.subject_id
+
+    # Enforce Dynamic Questions Limit (answered_count is maintained by /quiz/submit,
+    # plus answers still queued in the write-behind buffer)
+    row = db.query(
+        models.QuizAttempt.answered_count, models.QuizAttempt.completed
+    ).filter(models.QuizAttempt.id == attempt_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Attempt not found")
+    answered_count, completed = row
+    questions_answered = (answered_count or 0) + log_writer.pending_answers(attempt_id)
+    if questions_answered >= ctx.max_questions:
+         # Mark attempt as completed if not already
+         if not completed:
+             if log_writer.pending_answers(attempt_id):
+                 log_writer.flush() # The final score needs the queued answers
+             marked = db.query(models.QuizAttempt).filter(
+                 models.QuizAttempt.id == attempt_id, models.QuizAttempt.completed.isnot(True)
+             ).update({"completed": True}, synchronize_session=False)
+             db.commit()
+             if marked: # Only the request that completed it records the score
+                 score_percentiles.record_attempt(db, attempt_id)
+         raise HTTPException(status_code=404, detail="Quiz Completed")
+
+    return ctx, questions_answered
+
+def _attempt_subject_id(db: Session, ctx):
+    """Subject to draw the next question from (mock exams pick one of the exam's subjects)."""
+    subject_id = ctx.subject_id
     
     # Mock Exam Logic
-    if attempt.exam_id:
+    if ctx.exam_id:
         # Find subjects for this exam
-        subjects = db.query(models.Subject).filter(models.Subject.exam_id == attempt.exam_id).all()
+        subjects = db.query(models.Subject.id).filter(models.Subject.exam_id == ctx.exam_id).all()
         if not subjects:
              raise HTTPException(status_code=404, detail="No subjects found for exam")
         
         # Simple Logic: Rotate subjects based on question index
         # e.g. 0-29 Subj 1, 30-59 Subj 2, etc. (assuming 30 q per sub)
         # OR just Randomly pick one
-        import random
-        selected_sub = random.choice(subjects)
-        subject_id = selected_sub.id
-    
-    if not subject_id and attempt.quiz_id:
-        # Fallback if quiz_id is used
-        quiz = db.query(models.Quiz).filter(models.Quiz.id == attempt.quiz_id).first()
-        if quiz:
-             subject_id = quiz.subject_id
+        subject_id = random.choice(subjects)[0]
              
     if not subject_id:
          raise HTTPException(status_code=400, detail="Corrupt attempt data (no subject)")
+    return subject_id
 
-    # Enforce Dynamic Questions Limit
-    max_q = 50
-    if attempt.quiz_id:
-        quiz_obj = db.query(models.Quiz).filter(models.Quiz.id == attempt.quiz_id).first()
-        if quiz_obj:
-            max_q = quiz_obj.questions_count
+def _select_for_attempt(db: Session, ctx, user_id: int, exclude=None):
+    gen = QuestionGenerator(db)
+    subject_id = _attempt_subject_id(db, ctx)
+    return gen.get_next_question(user_id, subject_id=subject_id, attempt_id=ctx.attempt_id, exclude=exclude)
 
-    questions_answered = db.query(models.QuestionLog).filter(models.QuestionLog.attempt_id == attempt_id).count()
-    if questions_answered >= max_q:
-         # Mark attempt as completed if not already
-         if not attempt.completed:
-             attempt.completed = True
-             db.commit()
-         raise HTTPException(status_code=404, detail="Quiz Completed")
+def _load_questions(db: Session, ids):
+    """Loads questions by ID in one query, keeping the given order."""
+    if not ids:
+        return []
+    by_id = {q.id: q for q in db.query(models.Question).filter(models.Question.id.in_(ids)).all()}
+    return [by_id[qid] for qid in ids if qid in by_id]
 
-    gen = QuestionGenerator(db)
-    q = gen.get_next_question(user_id, subject_id=subject_id, attempt_id=attempt_id)
-    
-    if not q:
-         raise HTTPException(status_code=404, detail="No questions available")
-    
-    # Get subject name for UI
+def _take_queued(db: Session, attempt_id: int, user_id: int, n: int):
+    """Pops up to n prefetched questions that are still unanswered, in queue order."""
+    ids = prefetch_queues.take(attempt_id, n)
+    if not ids:
+        return []
+    answered = answered_cache.get(db, user_id)
+    return _load_questions(db, [qid for qid in ids if qid not in answered])
+
+def _paper_position(ctx, questions_answered: int) -> int:
+    """Next position in a pre-assembled paper: past everything already served or answered."""
+    served = prefetch_queues.served(ctx.attempt_id)
+    return max(questions_answered, sum(1 for qid in ctx.paper if qid in served))
+
+def _fill_prefetch_queue(attempt_id: int, user_id: int):
+    """Background task: tops the attempt's prefetch queue up to PREFETCH_DEPTH."""
+    if not prefetch_queues.begin_refill(attempt_id):
+        return
+    db = database.SessionLocal()
     try:
-        sub_name = db.query(models.Subject).filter(models.Subject.id == subject_id).first().name
-    except:
-        sub_name = ""
-         
+        ctx = attempt_contexts.get(db, attempt_id)
+        if not ctx:
+            prefetch_queues.drop(attempt_id)
+            return
+        if ctx.paper:
+            # Pre-assembled mock exam: nothing to select
+            return
+        queued = prefetch_queues.queued(attempt_id)
+        exclude = set(queued) | prefetch_queues.served(attempt_id)
+        picked = []
+        for _ in range(config.PREFETCH_DEPTH - len(queued)):
+            q = _select_for_attempt(db, ctx, user_id, exclude=exclude)
+            if not q:
+                break
+            exclude.add(q.id)
+            picked.append(q.id)
+        prefetch_queues.extend(attempt_id, user_id, picked)
+    except Exception as e:
+        print(f"Prefetch Error: {e}")
+    finally:
+        prefetch_queues.end_refill(attempt_id)
+        db.close()
+
+def _subject_names(db: Session, questions):
+    subject_ids = {q.subject_id for q in questions if q.subject_id}
+    if not subject_ids:
+        return {}
+    return dict(db.query(models.Subject.id, models.Subject.name).filter(models.Subject.id.in_(subject_ids)).all())
+
+def _question_payload(q, attempt_id: int, subject_name: str, question_number: int, total_questions: int):
     return {
         "id": q.id,
         "topic": q.topic,
@@ -341,9 +428,109 @@ def get_next_question_for_attempt(
         "options": q.options,
         "pyq_year": q.pyq_year,
         "attempt_id": attempt_id,
-        "subject_name": sub_name,
-        "question_number": questions_answered + 1,
-        "total_questions": max_q
+        "subject_name": subject_name,
+        "question_number": question_number,
+        "total_questions": total_questions
+    }
+
+
+@app.get("/quiz/{attempt_id}/next")
+async def get_next_question_for_attempt(
+    attempt_id: int,
+    background_tasks: BackgroundTasks,
+    current_question_index: Optional[int] = None, # Frontend tracks this (mock exam papers only)
+    user_id: int = 1, # Should be gathered from token in real app but passed for now
+):
+    """Get next question for the attempt (served from the prefetch queue when ready)."""
+    return await database.run_db(_next_question_for_attempt, attempt_id, background_tasks, current_question_index, user_id)
+
+def _next_question_for_attempt(db: Session, attempt_id: int, background_tasks: BackgroundTasks,
+                               current_question_index: Optional[int], user_id: int):
+    ctx, questions_answered = _check_attempt_open(db, attempt_id)
+    max_q = ctx.max_questions
+
+    if ctx.paper:
+        # Mock exam: serve the pre-assembled paper by position
+        pos = current_question_index if current_question_index is not None else _paper_position(ctx, questions_answered)
+        if pos < 0 or pos >= len(ctx.paper):
+            raise HTTPException(status_code=404, detail="Quiz Completed")
+        q = _load_questions(db, [ctx.paper[pos]])
+        if not q:
+            raise HTTPException(status_code=404, detail="No questions available")
+        prefetch_queues.mark_served(attempt_id, user_id, [q[0].id])
+        return _question_payload(q[0], attempt_id, _subject_names(db, q).get(q[0].subject_id, ""), pos + 1, len(ctx.paper))
+
+    queued = _take_queued(db, attempt_id, user_id, 1)
+    q = queued[0] if queued else _select_for_attempt(db, ctx, user_id, exclude=prefetch_queues.served(attempt_id))
+    
+    if not q:
+         raise HTTPException(status_code=404, detail="No questions available")
+    prefetch_queues.mark_served(attempt_id, user_id, [q.id])
+
+    background_tasks.add_task(_fill_prefetch_queue, attempt_id, user_id)
+    
+    # Get subject name for UI
+    sub_name = _subject_names(db, [q]).get(q.subject_id, "")
+         
+    return _question_payload(q, attempt_id, sub_name, questions_answered + 1, max_q)
+
+
+@app.get("/quiz/{attempt_id}/next_batch")
+def get_next_questions_batch(
+    attempt_id: int,
+    background_tasks: BackgroundTasks,
+    n: int = 5,
+    user_id: int = 1,
+    db: Session = Depends(get_db)
+):
+    """
+    Get the next n adaptive questions for the attempt in one call.
+    Questions come from the prefetch queue first; the queue is refilled in the background.
+    """
+    ctx, questions_answered = _check_attempt_open(db, attempt_id)
+    max_q = ctx.max_questions
+    n = max(1, min(n, config.PREFETCH_MAX_BATCH, max_q - questions_answered))
+
+    if ctx.paper:
+        # Mock exam: the next n positions of the pre-assembled paper
+        pos = _paper_position(ctx, questions_answered)
+        questions = _load_questions(db, list(ctx.paper[pos:pos + n]))
+        if not questions:
+            raise HTTPException(status_code=404, detail="Quiz Completed")
+        prefetch_queues.mark_served(attempt_id, user_id, [q.id for q in questions])
+        names = _subject_names(db, questions)
+        return {
+            "attempt_id": attempt_id,
+            "total_questions": len(ctx.paper),
+            "questions": [
+                _question_payload(q, attempt_id, names.get(q.subject_id, ""), pos + 1 + i, len(ctx.paper))
+                for i, q in enumerate(questions)
+            ]
+        }
+
+    questions = _take_queued(db, attempt_id, user_id, n)
+    exclude = prefetch_queues.served(attempt_id)
+    while len(questions) < n:
+        q = _select_for_attempt(db, ctx, user_id, exclude=exclude)
+        if not q:
+            break
+        exclude.add(q.id)
+        questions.append(q)
+
+    if not questions:
+         raise HTTPException(status_code=404, detail="No questions available")
+    prefetch_queues.mark_served(attempt_id, user_id, [q.id for q in questions])
+
+    background_tasks.add_task(_fill_prefetch_queue, attempt_id, user_id)
+
+    names = _subject_names(db, questions)
+    return {
+        "attempt_id": attempt_id,
+        "total_questions": max_q,
+        "questions": [
+            _question_payload(q, attempt_id, names.get(q.subject_id, ""), questions_answered + 1 + i, max_q)
+            for i, q in enumerate(questions)
+        ]
     }
 
 
@@ -356,23 +543,8 @@ def get_adaptive_question(
 ):
     """Get the next adaptive question."""
     # check attempt limit
-    attempt = db.query(models.QuizAttempt).filter(models.QuizAttempt.id == attempt_id).first()
-    if not attempt:
-        raise HTTPException(status_code=404, detail="Attempt not found")
-
-    max_q = 50
-    if attempt.quiz_id:
-        quiz_obj = db.query(models.Quiz).filter(models.Quiz.id == attempt.quiz_id).first()
-        if quiz_obj:
-            max_q = quiz_obj.questions_count
-
-    questions_answered = db.query(models.QuestionLog).filter(models.QuestionLog.attempt_id == attempt_id).count()
-    if questions_answered >= max_q:
-         # Mark attempt as completed if not already
-         if not attempt.completed:
-             attempt.completed = True
-             db.commit()
-         raise HTTPException(status_code=404, detail="Quiz Completed")
+    ctx, questions_answered = _check_attempt_open(db, attempt_id)
+    max_q = ctx.max_questions
 
     gen = QuestionGenerator(db)
     q = gen.get_next_question(user_id, subject_id=subject_id, attempt_id=attempt_id)
@@ -381,34 +553,28 @@ def get_adaptive_question(
          raise HTTPException(status_code=404, detail="No questions available")
     
     # Get subject name for UI
-    try:
-        sub_name = db.query(models.Subject).filter(models.Subject.id == subject_id).first().name
-    except:
-        sub_name = ""
+    sub_name = _subject_names(db, [q]).get(q.subject_id, "")
 
-    return {
-        "id": q.id,
-        "topic": q.topic,
-        "difficulty": q.difficulty,
-        "content": q.content,
-        "options": q.options,
-        "pyq_year": q.pyq_year,
-        "attempt_id": attempt_id,
-        "subject_name": sub_name,
-        "question_number": questions_answered + 1,
-        "total_questions": max_q
-    }
+    return _question_payload(q, attempt_id, sub_name, questions_answered + 1, max_q)
 
 
 # 2. Submit Answer & Update Knowledge Graph
 @app.post("/quiz/submit")
-def submit_answer(submission: AnswerSubmission, user_id: int = 1, db: Session = Depends(get_db)):
+async def submit_answer(
+    submission: AnswerSubmission,
+    background_tasks: BackgroundTasks,
+    user_id: int = 1,
+):
     """
     Process answer:
     1. Check correctness.
     2. Update Knowledge Graph (strength score).
     3. Log attempt.
+    4. Re-rank the user's prefetched questions.
     """
+    return await database.run_db(_submit_answer, submission, background_tasks, user_id)
+
+def _submit_answer(db: Session, submission: AnswerSubmission, background_tasks: BackgroundTasks, user_id: int):
     q = db.query(models.Question).filter(models.Question.id == submission.question_id).first()
     if not q:
         raise HTTPException(status_code=404, detail="Question not found")
@@ -416,43 +582,47 @@ def submit_answer(submission: AnswerSubmission, user_id: int = 1, db: Session =
     is_correct = (submission.selected_answer == q.correct_answer)
     
     # --- Start: Log Attempt for "No Repeat" Logic ---
-    # Create a quiz attempt record
-    attempt = models.QuizAttempt(
-        user_id=user_id,
-        score=1.0 if is_correct else 0.0,
-        timestamp=datetime.utcnow()
-    )
-    db.add(attempt)
-    db.flush() # Get ID
+    if submission.attempt_id:
+        ctx = attempt_contexts.get(db, submission.attempt_id)
+        if not ctx:
+            raise HTTPException(status_code=404, detail="Attempt not found")
+        if ctx.user_id != user_id:
+            raise HTTPException(status_code=403, detail="Attempt belongs to another user")
+        attempt_id = submission.attempt_id
+        if not log_writer.enabled:
+            # Score / Accuracy / Time maintained incrementally in one atomic UPDATE
+            apply_answers(db, attempt_id, 1, int(is_correct), submission.time_taken)
+    else:
+        # Create a quiz attempt record holding just this answer
+        attempt = models.QuizAttempt(
+            user_id=user_id,
+            score=1.0 if is_correct else 0.0,
+            timestamp=datetime.utcnow(),
+            total_time=submission.time_taken,
+            accuracy=1.0 if is_correct else 0.0,
+            answered_count=1,
+            correct_count=int(is_correct)
+        )
+        db.add(attempt)
+        db.flush() # Get ID
+        attempt_id = attempt.id
+        user_stats.record_attempt_started(db, user_id)
     
     # Log the specific question details
-    log = models.QuestionLog(
-        attempt_id=attempt.id,
-        question_id=q.id,
-        selected_answer=submission.selected_answer,
-        is_correct=is_correct,
-        time_taken=submission.time_taken,
-        difficulty_at_time=q.difficulty
-    )
-    db.add(log)
-    db.commit()
-    # --- End: Log Attempt ---
-
+    log = {
+        "attempt_id": attempt_id,
+        "question_id": q.id,
+        "selected_answer": submission.selected_answer,
+        "is_correct": is_correct,
+        "time_taken": submission.time_taken,
+        "difficulty_at_time": q.difficulty,
+    }
+    # Session answers go through the write-behind buffer when enabled (log + aggregates)
+    write_behind = log_writer.enabled and submission.attempt_id is not None
+    if not write_behind:
+        db.add(models.QuestionLog(**log))
     # --- End: Log Attempt ---
 
-    # Update Attempt Stats
-    attempt = db.query(models.QuizAttempt).filter(models.QuizAttempt.id == attempt.id).first()
-    attempt.total_time += submission.time_taken
-    
-    # Recalculate Score/Accuracy
-    logs = db.query(models.QuestionLog).filter(models.QuestionLog.attempt_id == attempt.id).all()
-    total_q = len(logs)
-    correct_q = sum(1 for l in logs if l.is_correct)
-    
-    attempt.score = correct_q # Raw score
-    attempt.accuracy = (correct_q / total_q) if total_q > 0 else 0.0
-    db.commit()
-
     # Update Knowledge Graph
     kg = KnowledgeGraphEngine(db)
     new_strength = kg.update_topic_strength(
@@ -460,8 +630,27 @@ def submit_answer(submission: AnswerSubmission, user_id: int = 1, db: Session =
         q.topic, 
         is_correct, 
         q.difficulty,
-        subject_id=q.subject_id
+        subject_id=q.subject_id,
+        commit=False
     )
+
+    # Dashboard totals (the write-behind flush records them for buffered answers)
+    if not write_behind:
+        user_stats.record_answers(db, user_id, 1, int(is_correct))
+    db.flush()
+    user_stats.refresh_topics(db, user_id)
+
+    # Single commit for log, attempt aggregates, knowledge graph and user stats
+    db.commit()
+    if write_behind:
+        log_writer.enqueue(user_id, [log])
+    answered_cache.record(user_id, q.id)
+    dashboard_cache.invalidate(user_id)
+    read_router.note_write(user_id)
+    
+    # Mastery changed: drop queued questions and re-select in the background
+    for queued_attempt_id in prefetch_queues.invalidate_user(user_id):
+        background_tasks.add_task(_fill_prefetch_queue, queued_attempt_id, user_id)
     
     feedback = "Correct! Well done." if is_correct else f"Incorrect. The right answer was {q.correct_answer}."
     
@@ -472,27 +661,187 @@ def submit_answer(submission: AnswerSubmission, user_id: int = 1, db: Session =
         "feedback": feedback
     }
 
+# 2.1 Submit several answers at once (offline / bursty clients)
+@app.post("/quiz/submit_batch")
+def submit_answer_batch(
+    batch: BatchAnswerSubmission,
+    background_tasks: BackgroundTasks,
+    user_id: int = 1,
+    db: Session = Depends(get_db)
+):
+    """
+    Same as /quiz/submit for an ordered list of answers, in one transaction:
+    questions are loaded in one query, logs are bulk inserted and knowledge graph
+    updates are folded per topic in answer order. Returns feedback per answer.
+    """
+    if not batch.answers:
+        raise HTTPException(status_code=400, detail="No answers submitted")
+    if len(batch.answers) > config.SUBMIT_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {config.SUBMIT_BATCH_MAX} answers per batch")
+
+    if batch.attempt_id:
+        ctx = attempt_contexts.get(db, batch.attempt_id)
+        if not ctx:
+            raise HTTPException(status_code=404, detail="Attempt not found")
+        if ctx.user_id != user_id:
+            raise HTTPException(status_code=403, detail="Attempt belongs to another user")
+
+    question_ids = {a.question_id for a in batch.answers}
+    questions = {q.id: q for q in _load_questions(db, question_ids)}
+
+    # Grade in one pass; unknown questions are reported, not fatal
+    graded = []
+    for answer in batch.answers:
+        q = questions.get(answer.question_id)
+        if q is not None:
+            graded.append((answer, q, answer.selected_answer == q.correct_answer))
+    if not graded:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    correct = sum(1 for _, _, is_correct in graded if is_correct)
+    time_taken = sum(answer.time_taken for answer, _, _ in graded)
+
+    write_behind = log_writer.enabled and batch.attempt_id is not None
+    if batch.attempt_id:
+        attempt_id = batch.attempt_id
+        if not write_behind:
+            apply_answers(db, attempt_id, len(graded), correct, time_taken)
+    else:
+        attempt = models.QuizAttempt(
+            user_id=user_id,
+            score=correct,
+            timestamp=datetime.utcnow(),
+            total_time=time_taken,
+            accuracy=correct / len(graded),
+            answered_count=len(graded),
+            correct_count=correct
+        )
+        db.add(attempt)
+        db.flush() # Get ID
+        attempt_id = attempt.id
+        user_stats.record_attempt_started(db, user_id)
+
+    logs = [
+        {
+            "attempt_id": attempt_id,
+            "question_id": q.id,
+            "selected_answer": answer.selected_answer,
+            "is_correct": is_correct,
+            "time_taken": answer.time_taken,
+            "difficulty_at_time": q.difficulty,
+        }
+        for answer, q, is_correct in graded
+    ]
+    if not write_behind:
+        db.bulk_insert_mappings(models.QuestionLog, logs)
+
+    kg = KnowledgeGraphEngine(db)
+    strengths = kg.apply_answers(user_id, [
+        (q.subject_id, q.topic, is_correct, q.difficulty) for _, q, is_correct in graded
+    ])
+
+    if not write_behind:
+        user_stats.record_answers(db, user_id, len(graded), correct)
+    db.flush()
+    user_stats.refresh_topics(db, user_id)
+
+    # Single commit for logs, attempt aggregates, knowledge graph and user stats
+    db.commit()
+    if write_behind:
+        log_writer.enqueue(user_id, logs)
+    answered_cache.record_many(user_id, [q.id for _, q, _ in graded])
+    dashboard_cache.invalidate(user_id)
+    read_router.note_write(user_id)
+
+    for queued_attempt_id in prefetch_queues.invalidate_user(user_id):
+        background_tasks.add_task(_fill_prefetch_queue, queued_attempt_id, user_id)
+
+    results = []
+    strength_iter = iter(strengths)
+    for answer in batch.answers:
+        q = questions.get(answer.question_id)
+        if q is None:
+            results.append({"question_id": answer.question_id, "error": "Question not found"})
+            continue
+        is_correct = answer.selected_answer == q.correct_answer
+        results.append({
+            "question_id": q.id,
+            "correct": is_correct,
+            "correct_answer": q.correct_answer,
+            "new_topic_strength": round(next(strength_iter), 2),
+            "feedback": "Correct! Well done." if is_correct else f"Incorrect. The right answer was {q.correct_answer}."
+        })
+
+    return {
+        "attempt_id": attempt_id,
+        "answered": len(graded),
+        "correct": correct,
+        "results": results
+    }
+
 # 3. Dashboard Analytics
 @app.get("/dashboard/stats")
-def get_dashboard_stats(user_id: int = 1, db: Session = Depends(get_db)):
+async def get_dashboard_stats(request: Request, response: Response, user_id: int = 1):
+    """Cached per user until their next submit/reset; If-None-Match with a current ETag gets a 304."""
+    if_none_match = request.headers.get("if-none-match")
+    cached = dashboard_cache.get(user_id)
+    if cached:
+        etag, payload = cached
+        if etag_matches(if_none_match, etag):
+            dashboard_cache.count_not_modified()
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    else:
+        token = dashboard_cache.begin(user_id)
+        payload = await database.run_db(_dashboard_payload, user_id, read_only=True, user_id=user_id)
+        etag = dashboard_cache.put(user_id, token, payload)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return payload
+
+def _dashboard_payload(db: Session, user_id: int):
     analytics = AnalyticsEngine(db)
     predictor = PredictorEngine(db)
     kg = KnowledgeGraphEngine(db)
-
     return {
         "stats": analytics.get_student_stats(user_id),
         "weak_areas": predictor.predict_weak_areas(user_id),
         "knowledge_graph": kg.get_user_knowledge_graph(user_id)
     }
 
+# 3.1 Percentile among everyone preparing for the same exam / subject
+def _percentile_response(db: Session, scope: str, scope_id: int, user_id: int, score: Optional[float]):
+    if score is None:
+        score = best_score(db, user_id, scope, scope_id)
+    return {
+        f"{scope}_id": scope_id,
+        "score": round(score, 1) if score is not None else None,
+        **score_percentiles.lookup(db, scope, scope_id, score),
+    }
+
+@app.get("/leaderboard/exam/{exam_id}")
+def get_exam_percentile(exam_id: int, user_id: int = 1, score: Optional[float] = None, db: Session = Depends(database.get_read_db)):
+    """Percentile of the user's best completed attempt (or of `score`, percent correct) in the exam."""
+    return _percentile_response(db, EXAM, exam_id, user_id, score)
+
+@app.get("/leaderboard/subject/{subject_id}")
+def get_subject_percentile(subject_id: int, user_id: int = 1, score: Optional[float] = None, db: Session = Depends(database.get_read_db)):
+    """Same as /leaderboard/exam for one subject."""
+    return _percentile_response(db, SUBJECT, subject_id, user_id, score)
+
 # 3.5 Reset Quiz Progress
 @app.post("/quiz/reset")
 def reset_progress(user_id: int = 1, db: Session = Depends(get_db)):
     """Resets all progress for the user."""
+    log_writer.flush() # Don't let queued answers land after the delete
+    knowledge_cache.invalidate(user_id)
     # Delete logs first (foreign key dependency)
     
     # Get user attempts
     attempts = db.query(models.QuizAttempt).filter(models.QuizAttempt.user_id == user_id).all()
+    archived_months = log_archive.forget_user(db, user_id)
     for att in attempts:
         db.query(models.QuestionLog).filter(models.QuestionLog.attempt_id == att.id).delete()
     
@@ -500,10 +849,77 @@ def reset_progress(user_id: int = 1, db: Session = Depends(get_db)):
     
     # Reset Knowledge Graph (Delete or Reset Score)
     db.query(models.KnowledgeNode).filter(models.KnowledgeNode.user_id == user_id).delete()
+    user_stats.reset(db, user_id)
     
     db.commit()
+    for month in archived_months:
+        log_archive.prune(month) # Their archived logs
+    answered_cache.invalidate(user_id)
+    attempt_contexts.invalidate_user(user_id)
+    dashboard_cache.invalidate(user_id)
+    read_router.note_write(user_id)
+    for attempt_id in prefetch_queues.invalidate_user(user_id):
+        prefetch_queues.drop(attempt_id)
     return {"message": "Progress reset successfully"}
 
+# 3.5.1 Runtime metrics
+@app.get("/admin/metrics")
+def get_metrics():
+    return {
+        "write_behind": log_writer.stats(),
+        "knowledge_cache": knowledge_cache.stats(),
+        "dashboard_cache": dashboard_cache.stats(),
+        "score_percentiles": score_percentiles.stats(),
+        "read_routing": read_router.stats(),
+        "log_archive": log_archiver.stats(),
+    }
+
+# 3.5.2 Bulk export for analysis (keyset-paginated, doesn't block writers)
+@app.get("/admin/export/{table}")
+def export_table(
+    table: str,
+    request: Request,
+    format: str = "csv",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    exam_id: Optional[int] = None,
+    since: Optional[str] = None
+):
+    """
+    Streams quiz_attempts, question_logs or knowledge_nodes as CSV or Parquet.
+    The X-Export-Watermark header is the `since` value for the next incremental export
+    (knowledge_nodes has none: it is always exported in full).
+    """
+    if not config.EXPORT_TOKEN:
+        raise HTTPException(status_code=403, detail="Export disabled (set EXPORT_TOKEN)")
+    if not secrets.compare_digest(request.headers.get("x-export-token", "").encode(), config.EXPORT_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid export token")
+    if table not in data_export.TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table (expected one of {', '.join(data_export.TABLES)})")
+    if format not in ("csv", "parquet"):
+        raise HTTPException(status_code=400, detail="format must be csv or parquet")
+    try:
+        plan = data_export.plan(table, start=start, end=end, exam_id=exam_id, since=since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid since watermark")
+
+    headers = {"Content-Disposition": f'attachment; filename="{table}.{format}"'}
+    if plan.watermark is not None:
+        headers["X-Export-Watermark"] = str(data_export.format_watermark(plan.watermark))
+    if format == "csv":
+        return StreamingResponse(data_export.iter_csv(plan), media_type="text/csv", headers=headers)
+
+    # Parquet's footer is written last: spool to a temp file, then send it
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        data_export.write_parquet(plan, path)
+    except RuntimeError as e:
+        os.remove(path)
+        raise HTTPException(status_code=501, detail=str(e))
+    return FileResponse(path, media_type="application/vnd.apache.parquet", headers=headers,
+                        background=BackgroundTask(os.remove, path))
+
 # 3.6 PDF Quiz Generation
 from fastapi import File, UploadFile
 
@@ -678,7 +1094,7 @@ if os.path.exists(frontend_dist):
     @app.get("/{full_path:path}")
     async def serve_react_app(full_path: str):
         # 1. API Guard: Don't serve HTML for missing API endpoints
-        if full_path.startswith(("api", "chat", "quiz", "streams", "exams", "subjects", "dashboard", "auth")):
+        if full_path.startswith(("api", "chat", "quiz", "streams", "exams", "subjects", "dashboard", "auth", "admin", "leaderboard")):
             raise HTTPException(status_code=404, detail="API Endpoint not found")
         
         # 2. Serve static files if they exist (e.g., favicon.ico, manifest.json)
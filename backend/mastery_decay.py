@@ -0,0 +1,46 @@
+import math
+from datetime import datetime
+
+import config
+
+# Fixed origin for the time term of decay_key (keeps the stored values small)
+EPOCH = datetime(2020, 1, 1)
+# log2(0) is -inf: strengths are floored here for the key only
+MIN_STRENGTH = 1e-4
+
+
+def _days(ts) -> float:
+    return (ts - EPOCH).total_seconds() / 86400.0
+
+
+def decayed_strength(strength, last_updated, now: datetime = None) -> float:
+    """
+    Strength after exponential forgetting since last_updated:
+    s * 2^(-elapsed / half_life). Evaluated at read time; stored rows are never rewritten.
+    """
+    if strength is None:
+        return 0.0
+    half_life = config.MASTERY_HALF_LIFE_DAYS
+    if not half_life or last_updated is None:
+        return strength
+    elapsed = max(0.0, _days(now or datetime.utcnow()) - _days(last_updated))
+    return strength * 2.0 ** (-elapsed / half_life)
+
+
+def decay_key(strength, last_updated) -> float:
+    """
+    Stored sort key with the same order as decayed strength at any read time:
+    log2(decayed) = log2(s) + t_updated/H - t_now/H, and t_now/H is common to all rows.
+    So ORDER BY decay_key over the (user_id, decay_key) index ranks nodes by decayed strength.
+    Keys depend on MASTERY_HALF_LIFE_DAYS: re-run rebuild_decay_keys.py after changing it.
+    """
+    key = math.log2(max(strength or 0.0, MIN_STRENGTH))
+    half_life = config.MASTERY_HALF_LIFE_DAYS
+    if half_life and last_updated is not None:
+        key += _days(last_updated) / half_life
+    return key
+
+
+def current_strength(node, now: datetime = None) -> float:
+    """Decayed strength of a KnowledgeNode or cached NodeState."""
+    return decayed_strength(node.strength_score, node.last_updated, now)
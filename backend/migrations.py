@@ -0,0 +1,340 @@
+"""
+Versioned schema migrations. Each step has an up (and, where the database allows it,
+a down); applied versions are recorded in schema_migrations. Steps only add what is
+missing, so a database created by create_all() is simply stamped with every version.
+
+Usage: python migrations.py [status | up [VERSION] | down VERSION]
+"""
+import sys
+from datetime import datetime
+from typing import Callable, NamedTuple, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+import database
+import models
+from models import SchemaMigration
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    up: Callable
+    down: Optional[Callable] # None: irreversible
+
+
+def _columns(db, table):
+    return {c["name"] for c in inspect(db.connection()).get_columns(table)}
+
+
+def _add_columns(db, table, columns):
+    """columns: ((name, SQL type), ...); existing ones are skipped."""
+    existing = _columns(db, table)
+    for name, ddl in columns:
+        if name not in existing:
+            print(f"  Adding {table}.{name}")
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def _drop_columns(db, table, names):
+    existing = _columns(db, table)
+    for name in names:
+        if name in existing:
+            print(f"  Dropping {table}.{name}")
+            db.execute(text(f"ALTER TABLE {table} DROP COLUMN {name}"))
+
+
+def _index(model, name):
+    return next(i for i in model.__table__.indexes if i.name == name)
+
+
+def _index_names(db, table):
+    return {i["name"] for i in inspect(db.connection()).get_indexes(table)}
+
+
+def _create_indexes(db, indexes):
+    for index in indexes:
+        if index.name not in _index_names(db, index.table.name):
+            print(f"  Creating index {index.name}")
+            index.create(db.connection())
+
+
+def _drop_indexes(db, indexes):
+    for index in indexes:
+        if index.name in _index_names(db, index.table.name):
+            print(f"  Dropping index {index.name}")
+            index.drop(db.connection())
+
+
+def _create_tables(db, *models_):
+    models.Base.metadata.create_all(bind=db.connection(), tables=[m.__table__ for m in models_])
+
+
+def _drop_tables(db, *models_):
+    models.Base.metadata.drop_all(bind=db.connection(), tables=[m.__table__ for m in models_])
+
+
+# --- Steps ---
+
+def _legacy_columns_up(db):
+    _add_columns(db, "quiz_attempts", (
+        ("subject_id", "INTEGER REFERENCES subjects(id)"),
+        ("total_time", "FLOAT DEFAULT 0.0"),
+        ("accuracy", "FLOAT DEFAULT 0.0"),
+        ("completed", "BOOLEAN DEFAULT FALSE"),
+    ))
+    _add_columns(db, "questions", (
+        ("pyq_year", "INTEGER"),
+        ("exam_weightage", "FLOAT DEFAULT 1.0"),
+    ))
+
+
+def _mock_exam_up(db):
+    _add_columns(db, "quiz_attempts", (
+        ("exam_id", "INTEGER REFERENCES exams(id)"),
+        ("paper", "JSON"),
+    ))
+
+
+def _attempt_counts_up(db):
+    from attempt_scoring import recompute_aggregates
+    _add_columns(db, "quiz_attempts", (
+        ("answered_count", "INTEGER DEFAULT 0"),
+        ("correct_count", "INTEGER DEFAULT 0"),
+    ))
+    db.commit()
+    fixed = recompute_aggregates(db, fix=True, hot_only=False) # archived_month comes with step 10
+    print(f"  Backfilled counts of {len(fixed)} attempts")
+
+
+def _attempt_counts_down(db):
+    _drop_columns(db, "quiz_attempts", ("answered_count", "correct_count"))
+
+
+def _attempt_meta_up(db):
+    from attempt_context import parse_legacy_quiz_title, MOCK_EXAM_MODE, MOCK_EXAM_QUESTIONS, DEFAULT_MAX_QUESTIONS
+    _add_columns(db, "quiz_attempts", (
+        ("mode", "VARCHAR"),
+        ("topic", "VARCHAR"),
+        ("max_questions", "INTEGER"),
+    ))
+
+    # Backfill from placeholder Quiz titles like "Kinematics (topic_mock)"
+    rows = db.execute(text(
+        "SELECT a.id, a.exam_id, a.subject_id, q.title, q.questions_count, q.subject_id "
+        "FROM quiz_attempts a LEFT JOIN quizzes q ON q.id = a.quiz_id "
+        "WHERE a.max_questions IS NULL"
+    )).fetchall()
+    for attempt_id, exam_id, subject_id, title, questions_count, quiz_subject_id in rows:
+        if exam_id:
+            mode, topic, max_q = MOCK_EXAM_MODE, None, MOCK_EXAM_QUESTIONS
+        else:
+            mode, topic = parse_legacy_quiz_title(title)
+            max_q = questions_count or DEFAULT_MAX_QUESTIONS
+        db.execute(
+            text("UPDATE quiz_attempts SET mode = :mode, topic = :topic, max_questions = :max_q, "
+                 "subject_id = :subject_id WHERE id = :id"),
+            {"mode": mode, "topic": topic, "max_q": max_q,
+             "subject_id": subject_id or quiz_subject_id, "id": attempt_id}
+        )
+    print(f"  Backfilled metadata of {len(rows)} attempts")
+
+
+def _attempt_meta_down(db):
+    _drop_columns(db, "quiz_attempts", ("mode", "topic", "max_questions"))
+
+
+def _mastery_decay_up(db):
+    from rebuild_decay_keys import rebuild_decay_keys
+    _add_columns(db, "knowledge_nodes", (("decay_key", "FLOAT"),))
+    _create_indexes(db, [_index(models.KnowledgeNode, "ix_knowledge_nodes_user_decay")])
+    db.commit()
+    print(f"  Computed decay keys of {rebuild_decay_keys(db)} knowledge nodes")
+
+
+def _mastery_decay_down(db):
+    _drop_indexes(db, [_index(models.KnowledgeNode, "ix_knowledge_nodes_user_decay")])
+    _drop_columns(db, "knowledge_nodes", ("decay_key",))
+
+
+def _user_stats_up(db):
+    import user_stats
+    _create_tables(db, models.UserStats)
+    db.commit()
+    print(f"  Built stats for {user_stats.rebuild(db)} users")
+
+
+def _user_stats_down(db):
+    _drop_tables(db, models.UserStats)
+
+
+def _calibration_up(db):
+    _add_columns(db, "questions", (
+        ("seed_difficulty", "FLOAT"),
+        ("discrimination", "FLOAT"),
+    ))
+    _create_tables(db, models.ItemCalibration)
+
+
+def _calibration_down(db):
+    _drop_tables(db, models.ItemCalibration)
+    _drop_columns(db, "questions", ("seed_difficulty", "discrimination"))
+
+
+def _score_sketches_up(db):
+    import score_percentiles
+    _create_tables(db, models.ScoreSketch)
+    db.commit()
+    print(f"  Built {score_percentiles.rebuild(db)} score sketches")
+
+
+def _score_sketches_down(db):
+    _drop_tables(db, models.ScoreSketch)
+
+
+# Composite indexes behind the hot queries (see verify_indexes.py)
+HOT_PATH_INDEXES = (
+    (models.Question, "ix_questions_subject_topic_difficulty"),
+    (models.QuizAttempt, "ix_quiz_attempts_user_timestamp"),
+    (models.QuestionLog, "ix_question_logs_attempt_question"),
+    (models.KnowledgeNode, "ix_knowledge_nodes_user_subject_topic"),
+)
+
+
+def _hot_path_indexes_up(db):
+    _create_indexes(db, [_index(model, name) for model, name in HOT_PATH_INDEXES])
+
+
+def _hot_path_indexes_down(db):
+    _drop_indexes(db, [_index(model, name) for model, name in HOT_PATH_INDEXES])
+
+
+def _log_archive_up(db):
+    _add_columns(db, "quiz_attempts", (("archived_month", "VARCHAR"),))
+    _create_indexes(db, [_index(models.QuizAttempt, "ix_quiz_attempts_archived_month")])
+    _create_tables(db, models.QuestionLogArchive, models.QuestionLogRollup)
+
+
+def _log_archive_down(db):
+    if db.query(models.QuizAttempt.id).filter(models.QuizAttempt.archived_month.isnot(None)).first():
+        raise RuntimeError("Logs are archived: restore them first (python log_archive.py restore MONTH)")
+    _drop_tables(db, models.QuestionLogRollup, models.QuestionLogArchive)
+    _drop_indexes(db, [_index(models.QuizAttempt, "ix_quiz_attempts_archived_month")])
+    _drop_columns(db, "quiz_attempts", ("archived_month",))
+
+
+def _write_behind_entries_up(db):
+    _create_tables(db, models.WriteBehindEntry)
+
+
+def _write_behind_entries_down(db):
+    _drop_tables(db, models.WriteBehindEntry)
+
+
+def _dead_letters_up(db):
+    _create_tables(db, models.WriteBehindDeadLetter)
+
+
+def _dead_letters_down(db):
+    _drop_tables(db, models.WriteBehindDeadLetter)
+
+
+MIGRATIONS = [
+    # Columns referencing other tables can't be dropped by SQLite, so 1 and 2 are one-way
+    Migration(1, "legacy attempt and question columns", _legacy_columns_up, None),
+    Migration(2, "mock exam columns", _mock_exam_up, None),
+    Migration(3, "attempt answer counts", _attempt_counts_up, _attempt_counts_down),
+    Migration(4, "attempt session metadata", _attempt_meta_up, _attempt_meta_down),
+    Migration(5, "mastery decay key", _mastery_decay_up, _mastery_decay_down),
+    Migration(6, "user_stats table", _user_stats_up, _user_stats_down),
+    Migration(7, "item calibration", _calibration_up, _calibration_down),
+    Migration(8, "score_sketches table", _score_sketches_up, _score_sketches_down),
+    Migration(9, "hot path composite indexes", _hot_path_indexes_up, _hot_path_indexes_down),
+    Migration(10, "question log archive", _log_archive_up, _log_archive_down),
+    Migration(11, "write-behind journal entries", _write_behind_entries_up, _write_behind_entries_down),
+    Migration(12, "write-behind dead letters", _dead_letters_up, _dead_letters_down),
+]
+
+
+# --- Runner ---
+
+def applied_versions(db) -> set:
+    _create_tables(db, SchemaMigration)
+    db.commit()
+    return {v for (v,) in db.query(SchemaMigration.version)}
+
+
+def upgrade(target: int = None, engine=None) -> list:
+    """Applies pending steps up to target (default: latest). Returns the applied versions."""
+    db = Session(bind=engine or database.engine)
+    try:
+        done = applied_versions(db)
+        applied = []
+        for m in MIGRATIONS:
+            if m.version in done or (target is not None and m.version > target):
+                continue
+            print(f"Applying {m.version}: {m.name}")
+            m.up(db)
+            db.add(SchemaMigration(version=m.version, name=m.name, applied_at=datetime.utcnow()))
+            db.commit()
+            applied.append(m.version)
+        return applied
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def downgrade(target: int, engine=None) -> list:
+    """Reverts applied steps above target, newest first. Returns the reverted versions."""
+    db = Session(bind=engine or database.engine)
+    try:
+        done = applied_versions(db)
+        reverted = []
+        for m in reversed(MIGRATIONS):
+            if m.version <= target or m.version not in done:
+                continue
+            if m.down is None:
+                raise RuntimeError(f"Migration {m.version} ({m.name}) is irreversible")
+            print(f"Reverting {m.version}: {m.name}")
+            m.down(db)
+            db.query(SchemaMigration).filter(SchemaMigration.version == m.version).delete()
+            db.commit()
+            reverted.append(m.version)
+        return reverted
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def status(engine=None):
+    db = Session(bind=engine or database.engine)
+    try:
+        done = applied_versions(db)
+    finally:
+        db.close()
+    for m in MIGRATIONS:
+        print(f"[{'x' if m.version in done else ' '}] {m.version}: {m.name}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "up"
+    if command == "status":
+        status()
+    elif command == "up":
+        applied = upgrade(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        print(f"[DONE] Applied {len(applied)} migrations")
+    elif command == "down" and len(sys.argv) > 2:
+        try:
+            reverted = downgrade(int(sys.argv[2]))
+        except RuntimeError as e:
+            print(f"[ERROR] {e}")
+            sys.exit(1)
+        print(f"[DONE] Reverted {len(reverted)} migrations")
+    else:
+        print(__doc__)
+        sys.exit(1)
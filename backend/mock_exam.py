@@ -0,0 +1,133 @@
+import random
+
+from models import Exam, Subject, Question
+from attempt_context import MOCK_EXAM_QUESTIONS
+
+# Difficulty bands: (name, lower bound inclusive, upper bound exclusive)
+DIFFICULTY_BANDS = (
+    ("easy", 0.0, 0.45),
+    ("medium", 0.45, 0.7),
+    ("hard", 0.7, 1.01),
+)
+
+DEFAULT_BLUEPRINT = {
+    "total_questions": MOCK_EXAM_QUESTIONS,
+    "subject_quotas": None, # None = split evenly across the exam's subjects
+    "difficulty_mix": {"easy": 0.3, "medium": 0.5, "hard": 0.2},
+}
+
+# Per-exam overrides, keyed by Exam.name
+EXAM_BLUEPRINTS = {
+    "NEET UG": {
+        "total_questions": 180,
+        "subject_quotas": {"Physics": 45, "Chemistry": 45, "Biology (Botany)": 45, "Biology (Zoology)": 45},
+    },
+    "JEE Main": {
+        "total_questions": 90,
+        "difficulty_mix": {"easy": 0.25, "medium": 0.5, "hard": 0.25},
+    },
+}
+
+
+def split_quota(total: int, weights: dict) -> dict:
+    """Splits total across keys proportionally to weights (largest remainder, sums exactly to total)."""
+    weight_sum = sum(weights.values())
+    if total <= 0 or weight_sum <= 0:
+        return {k: 0 for k in weights}
+    raw = {k: total * w / weight_sum for k, w in weights.items()}
+    quotas = {k: int(v) for k, v in raw.items()}
+    leftover = total - sum(quotas.values())
+    for k in sorted(raw, key=lambda k: raw[k] - quotas[k], reverse=True)[:leftover]:
+        quotas[k] += 1
+    return quotas
+
+
+def weighted_sample(items, k: int, weight):
+    """k items without replacement, probability proportional to weight (Efraimidis-Spirakis)."""
+    if k >= len(items):
+        return list(items)
+    keyed = [(random.random() ** (1.0 / max(weight(it), 1e-6)), it) for it in items]
+    keyed.sort(key=lambda pair: pair[0], reverse=True)
+    return [it for _, it in keyed[:k]]
+
+
+def band_of(difficulty) -> str:
+    d = 0.5 if difficulty is None else difficulty
+    for name, lo, hi in DIFFICULTY_BANDS:
+        if lo <= d < hi:
+            return name
+    return DIFFICULTY_BANDS[-1][0]
+
+
+class MockExamAssembler:
+    """
+    Builds a full mock exam paper up front from the exam's blueprint:
+    subject quotas, a difficulty distribution within each subject, and topic weights
+    taken from Question.exam_weightage. Candidates come from a single query.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def blueprint_for(self, exam) -> dict:
+        blueprint = dict(DEFAULT_BLUEPRINT)
+        blueprint.update(EXAM_BLUEPRINTS.get(exam.name, {}))
+        return blueprint
+
+    def assemble(self, exam_id: int, answered=()) -> list:
+        """Returns the ordered list of question IDs (one section per subject). Unanswered questions are preferred."""
+        exam = self.db.query(Exam).filter(Exam.id == exam_id).first()
+        if not exam:
+            return []
+        subjects = self.db.query(Subject.id, Subject.name).filter(Subject.exam_id == exam_id).order_by(Subject.id).all()
+        if not subjects:
+            return []
+        blueprint = self.blueprint_for(exam)
+
+        # One batched query for every candidate of the exam
+        rows = self.db.query(
+            Question.id, Question.subject_id, Question.difficulty, Question.exam_weightage
+        ).filter(Question.subject_id.in_([s.id for s in subjects])).all()
+
+        pools = {s.id: [] for s in subjects}
+        for row in rows:
+            pools[row.subject_id].append(row)
+
+        quotas = blueprint["subject_quotas"]
+        if quotas:
+            subject_quotas = {s.id: quotas.get(s.name, 0) for s in subjects}
+        else:
+            subject_quotas = split_quota(blueprint["total_questions"], {s.id: 1 for s in subjects})
+
+        paper = []
+        for subject_id, _ in subjects:
+            section = self._assemble_section(pools[subject_id], subject_quotas[subject_id], blueprint["difficulty_mix"], answered)
+            random.shuffle(section)
+            paper.extend(section)
+        return paper
+
+    def _assemble_section(self, pool, quota: int, difficulty_mix: dict, answered) -> list:
+        if quota <= 0 or not pool:
+            return []
+
+        fresh = [q for q in pool if q.id not in answered]
+        by_band = {name: [] for name, _, _ in DIFFICULTY_BANDS}
+        for q in fresh:
+            by_band[band_of(q.difficulty)].append(q)
+
+        weight = lambda q: q.exam_weightage or 1.0
+        picked = []
+        for band, band_quota in split_quota(quota, difficulty_mix).items():
+            picked.extend(weighted_sample(by_band.get(band, []), band_quota, weight))
+
+        # Bands that ran short are topped up from the rest of the subject, then from answered questions
+        if len(picked) < quota:
+            chosen = {q.id for q in picked}
+            rest = [q for q in fresh if q.id not in chosen]
+            picked.extend(weighted_sample(rest, quota - len(picked), weight))
+        if len(picked) < quota:
+            chosen = {q.id for q in picked}
+            seen = [q for q in pool if q.id not in chosen]
+            picked.extend(weighted_sample(seen, quota - len(picked), weight))
+
+        return [q.id for q in picked]
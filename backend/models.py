@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date, Boolean, JSON, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -78,6 +78,15 @@ class Question(Base):
     # Exam Meta
     pyq_year = Column(Integer, nullable=True) # e.g. 2023
     exam_weightage = Column(Float, default=1.0) # Relative importance
+
+    # Calibration (calibrate_items.py)
+    seed_difficulty = Column(Float, nullable=True) # Hand-picked difficulty, kept when difficulty is calibrated
+    discrimination = Column(Float, nullable=True) # Point-biserial correlation with rest-of-attempt accuracy
+
+    __table_args__ = (
+        # Question selection: subject + topic + difficulty window
+        Index("ix_questions_subject_topic_difficulty", "subject_id", "topic", "difficulty"),
+    )
     
     subject = relationship("Subject", back_populates="questions")
 
@@ -95,8 +104,22 @@ class QuizAttempt(Base):
     # Enhanced Tracking
     total_time = Column(Float, default=0.0) # Total seconds
     accuracy = Column(Float, default=0.0)
+    answered_count = Column(Integer, default=0) # Maintained incrementally by /quiz/submit
+    correct_count = Column(Integer, default=0)
     completed = Column(Boolean, default=False)
     
+    # Session Metadata
+    mode = Column(String, nullable=True) # 'practice', 'topic_mock', 'final_mock', 'mock_exam'
+    topic = Column(String, nullable=True) # Forced topic for topic quizzes
+    max_questions = Column(Integer, nullable=True) # Question cap
+    paper = Column(JSON, nullable=True) # Ordered question IDs of a pre-assembled mock exam
+    archived_month = Column(String, nullable=True, index=True) # "YYYY-MM" once its logs moved to the archive (see log_archive.py)
+
+    __table_args__ = (
+        # A user's attempts (answered set, dashboard totals, streaks, reset)
+        Index("ix_quiz_attempts_user_timestamp", "user_id", "timestamp"),
+    )
+    
     user = relationship("User", back_populates="attempts")
     logs = relationship("QuestionLog", back_populates="attempt")
 
@@ -110,10 +133,64 @@ class QuestionLog(Base):
     is_correct = Column(Boolean)
     time_taken = Column(Float)  # in seconds
     difficulty_at_time = Column(Float)
+
+    __table_args__ = (
+        # An attempt's answers; covers the answered-question lookup without touching the table
+        Index("ix_question_logs_attempt_question", "attempt_id", "question_id"),
+    )
     
     attempt = relationship("QuizAttempt", back_populates="logs")
     question = relationship("Question")
 
+class QuestionLogArchive(Base):
+    """
+    Cold question_logs rows (same ids and columns). Lives in the main database, or
+    in per-month SQLite files with LOG_ARCHIVE_STORE=files (see log_archive.py).
+    """
+    __tablename__ = "question_logs_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    attempt_id = Column(Integer, index=True)
+    question_id = Column(Integer)
+    selected_answer = Column(String)
+    is_correct = Column(Boolean)
+    time_taken = Column(Float)
+    difficulty_at_time = Column(Float)
+    archived_month = Column(String, index=True)
+
+class QuestionLogRollup(Base):
+    """Per-user, per-question totals of archived logs, kept in the hot database."""
+    __tablename__ = "question_log_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True)
+    answered = Column(Integer, default=0)
+    correct = Column(Integer, default=0)
+    time_taken = Column(Float, default=0.0) # Total seconds
+
+class WriteBehindEntry(Base):
+    """Journal entries applied by a write-behind flush, until their journal segment is deleted (see write_behind.py)."""
+    __tablename__ = "write_behind_entries"
+
+    id = Column(String, primary_key=True) # Entry id written in the journal line
+    journal = Column(String)
+    segment = Column(Integer) # Journal segment of the flush that applied it
+
+    __table_args__ = (
+        Index("ix_write_behind_entries_journal_segment", "journal", "segment"),
+    )
+
+class WriteBehindDeadLetter(Base):
+    """Queued answers the database rejected after repeated flush failures (see write_behind.py)."""
+    __tablename__ = "write_behind_dead_letters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer)
+    attempt_id = Column(Integer)
+    row = Column(JSON) # QuestionLog column values as queued
+    error = Column(String)
+    failed_at = Column(DateTime, default=datetime.utcnow)
+
 class KnowledgeNode(Base):
     __tablename__ = "knowledge_nodes"
 
@@ -124,7 +201,65 @@ class KnowledgeNode(Base):
     strength_score = Column(Float, default=0.0)  # 0.0 to 1.0 (Mastery)
     volatility = Column(Float, default=0.5) # How fast it changes
     last_updated = Column(DateTime, default=datetime.utcnow)
+    decay_key = Column(Float, nullable=True) # Orders nodes by decayed strength (see mastery_decay.py)
+
+    __table_args__ = (
+        Index("ix_knowledge_nodes_user_decay", "user_id", "decay_key"),
+        Index("ix_knowledge_nodes_user_subject_topic", "user_id", "subject_id", "topic"),
+    )
 
     user = relationship("User", back_populates="knowledge_nodes")
 
+class SchemaMigration(Base):
+    """Applied schema versions (see migrations.py)."""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+class UserStats(Base):
+    """Per-user dashboard totals, maintained on submit (see user_stats.py)."""
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_quizzes = Column(Integer, default=0) # Attempts started
+    score_sum = Column(Float, default=0.0) # Sum of attempt scores (average = score_sum / total_quizzes)
+    total_answered = Column(Integer, default=0)
+    total_correct = Column(Integer, default=0)
+    strongest_topic = Column(String, nullable=True)
+    weakest_topic = Column(String, nullable=True)
+    current_streak = Column(Integer, default=0) # Consecutive days with answers, ending at last_active_date
+    longest_streak = Column(Integer, default=0)
+    last_active_date = Column(Date, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ItemCalibration(Base):
+    """One row per question per calibration run (history of fitted parameters)."""
+    __tablename__ = "item_calibrations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), index=True)
+    run_at = Column(DateTime, default=datetime.utcnow, index=True)
+    responses = Column(Integer)
+    p_correct = Column(Float) # Raw proportion correct
+    difficulty_before = Column(Float)
+    difficulty_after = Column(Float)
+    discrimination = Column(Float, nullable=True)
+    applied = Column(Boolean, default=True) # False for dry runs and items below the response threshold
+
+class ScoreSketch(Base):
+    """Quantile sketch of completed-attempt scores for one exam or subject (see score_percentiles.py)."""
+    __tablename__ = "score_sketches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String) # 'exam' or 'subject'
+    scope_id = Column(Integer)
+    attempts = Column(Integer, default=0)
+    sketch = Column(JSON) # KLLSketch.to_dict()
+    version = Column(Integer, default=0) # Optimistic concurrency between worker processes
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ux_score_sketches_scope", "scope", "scope_id", unique=True),
+    )
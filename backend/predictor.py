@@ -1,5 +1,13 @@
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
 from sqlalchemy.orm import Session
-from models import KnowledgeNode
+
+from models import QuestionLog, QuizAttempt, Question
+from knowledge_cache import knowledge_cache
+from mastery_decay import current_strength
+from fail_model import fail_model, topic_features, RECENT_WINDOW, LOOKBACK
 
 class PredictorEngine:
     def __init__(self, db: Session):
@@ -8,21 +16,57 @@ class PredictorEngine:
     def predict_weak_areas(self, user_id: int, top_n: int = 3):
         """
         Identifies the top N topics the user is likely to fail next.
-        Logic: Lowest strength scores.
-        Future Upgrade: Look at recent consecutive failures.
+        Logic: every topic is scored by the trained fail model (fail_model.py) in one
+        vectorized call; without a model, lowest strength after forgetting-curve decay.
         """
-        nodes = self.db.query(KnowledgeNode).filter(
-            KnowledgeNode.user_id == user_id
-        ).order_by(KnowledgeNode.strength_score.asc()).limit(top_n).all()
+        now = datetime.utcnow()
+        if not fail_model.loaded:
+            nodes = knowledge_cache.weakest(self.db, user_id, top_n)
+            strengths = [current_strength(node, now) for node in nodes]
+            probabilities = fail_model.predict(np.array(strengths, dtype=np.float64).reshape(-1, 1))
+        else:
+            nodes = knowledge_cache.nodes(self.db, user_id)
+            if not nodes:
+                return []
+            recent = self._recent_answers(user_id)
+            strengths, rows = [], []
+            for node in nodes:
+                strength = current_strength(node, now)
+                idle_days = (now - node.last_updated).total_seconds() / 86400.0 if node.last_updated else 0.0
+                strengths.append(strength)
+                rows.append(topic_features(strength, recent.get((node.subject_id, node.topic), ()), idle_days))
+            probabilities = fail_model.predict(rows)
+            order = np.argsort(-probabilities, kind="stable")[:top_n]
+            nodes = [nodes[i] for i in order]
+            strengths = [strengths[i] for i in order]
+            probabilities = probabilities[order]
 
         recommendations = []
-        for node in nodes:
-            risk = "CRITICAL" if node.strength_score < 0.3 else "MODERATE"
+        for node, strength, probability in zip(nodes, strengths, probabilities.tolist()):
+            risk = "CRITICAL" if strength < 0.3 else "MODERATE"
             recommendations.append({
                 "topic": node.topic,
-                "current_mastery": round(node.strength_score * 100, 1),
+                "current_mastery": round(strength * 100, 1),
                 "risk_level": risk,
-                "predicted_fail_probability": round((1.0 - node.strength_score) * 0.9, 2) # Heuristic
+                "predicted_fail_probability": round(probability, 2)
             })
-        
-        return recommendations
\ No newline at end of file
+
+        return recommendations
+
+    def _recent_answers(self, user_id: int):
+        """(subject_id, topic) -> up to RECENT_WINDOW latest (is_correct, time_taken, difficulty), oldest first."""
+        rows = self.db.query(
+            Question.subject_id, Question.topic,
+            QuestionLog.is_correct, QuestionLog.time_taken, QuestionLog.difficulty_at_time,
+        ).join(QuizAttempt, QuestionLog.attempt_id == QuizAttempt.id).join(
+            Question, QuestionLog.question_id == Question.id
+        ).filter(QuizAttempt.user_id == user_id).order_by(QuestionLog.id.desc()).limit(LOOKBACK).all()
+
+        recent = defaultdict(list)
+        for subject_id, topic, is_correct, time_taken, difficulty in rows:
+            answers = recent[(subject_id, topic)]
+            if len(answers) < RECENT_WINDOW:
+                answers.append((bool(is_correct), time_taken, difficulty))
+        for answers in recent.values():
+            answers.reverse()
+        return recent
@@ -1,25 +1,52 @@
 from sqlalchemy.orm import Session
-from sqlalchemy.sql.expression import func
 import models
-from models import Question, KnowledgeNode, Exam
+from models import Question, Exam
+from knowledge_cache import knowledge_cache
+from mastery_decay import current_strength
+from answered_cache import answered_cache
+from question_index import question_index
+from sampling import SAMPLERS, sample_rank
+from irt import IRTSelectionEngine, item_bank
+from attempt_context import attempt_contexts
+from predictor import PredictorEngine
+from topic_graph import topic_graph, get_category
+import config
 import random
 
+# Accept questions within target difficulty ± this window
+DIFFICULTY_WINDOW = 0.3
+# Topics below this (decayed) strength are re-tested
+WEAK_STRENGTH = 0.4
+
+class ExcludedIds:
+    """Answered IDs plus IDs already handed out (e.g. queued) but not yet answered."""
+    __slots__ = ("answered", "extra")
+
+    def __init__(self, answered, extra):
+        self.answered = answered
+        self.extra = extra
+
+    def __contains__(self, qid):
+        return qid in self.answered or qid in self.extra
+
+    def __iter__(self):
+        yield from self.answered
+        yield from self.extra
+
 class QuestionGenerator:
     def __init__(self, db: Session):
         self.db = db
 
-    def get_next_question(self, user_id: int, subject_id: int = None, attempt_id: int = None):
+    def get_next_question(self, user_id: int, subject_id: int = None, attempt_id: int = None, exclude=None):
         """
         Adapts to the user.
-        - If attempt_id is provided, check the Quiz linked to it for specific Topic/Mode constraints.
+        - If attempt_id is provided, apply the attempt's Topic/Mode constraints.
+        - IDs in exclude are skipped as if already answered.
         """
-        # Get list of answered question IDs for this user
-        answered_ids = [
-            r[0] for r in self.db.query(models.QuestionLog.question_id)
-            .join(models.QuizAttempt, models.QuestionLog.attempt_id == models.QuizAttempt.id)
-            .filter(models.QuizAttempt.user_id == user_id)
-            .all()
-        ]
+        # Answered question IDs for this user (cached, maintained by /quiz/submit)
+        answered = answered_cache.get(self.db, user_id)
+        if exclude:
+            answered = ExcludedIds(answered, exclude)
         
         topic = None
         target_difficulty = 0.5
@@ -30,20 +57,22 @@ class QuestionGenerator:
         forced_topic = None
         
         if attempt_id:
-            attempt = self.db.query(models.QuizAttempt).filter(models.QuizAttempt.id == attempt_id).first()
-            if attempt and attempt.quiz_id:
-                quiz_obj = self.db.query(models.Quiz).filter(models.Quiz.id == attempt.quiz_id).first()
-                if quiz_obj:
-                    # Check for Topic in title
-                    title = quiz_obj.title
-                    if "Final Adaptive Mock" in title:
-                        is_final_mock = True
-                    elif "Mock" in title:
-                        is_topic_mock = True
-                        forced_topic = title.rpartition(" (")[0]
-                    elif "practice" in title and "(" in title:
-                        is_topic_mock = True # Reuse logic for strict filtering
-                        forced_topic = title.rpartition(" (")[0]
+            ctx = attempt_contexts.get(self.db, attempt_id)
+            if ctx:
+                if ctx.mode == "final_mock":
+                    is_final_mock = True
+                elif ctx.forced_topic:
+                    is_topic_mock = True # Practice on a topic reuses the strict filtering
+                    forced_topic = ctx.forced_topic
+
+        # --- PLUGGABLE ENGINE ---
+        if config.SELECTION_ENGINE == "irt" and subject_id and not is_final_mock:
+            question = IRTSelectionEngine(self.db).select(
+                user_id, subject_id, answered, topic=forced_topic if is_topic_mock else None
+            )
+            if question is not None:
+                return question
+            # Nothing eligible for IRT (e.g. topic not in bank): use the heuristic below
 
         # --- LOGIC BRANCHING ---
 
@@ -60,7 +89,7 @@ class QuestionGenerator:
         
         elif is_final_mock:
             # STRICT FILTER: Weak Areas + High Weightage
-            predictor = models.PredictorEngine(self.db)
+            predictor = PredictorEngine(self.db)
             weak_areas = predictor.predict_weak_areas(user_id)
             
             if weak_areas:
@@ -73,36 +102,35 @@ class QuestionGenerator:
         
         else:
             # STANDARD ADAPTIVE LOGIC (Existing)
-            # Base query for KnowledgeNode
-            kn_query = self.db.query(KnowledgeNode).filter(KnowledgeNode.user_id == user_id)
-            if subject_id:
-                kn_query = kn_query.filter(KnowledgeNode.subject_id == subject_id)
+            # User's knowledge nodes (one read, from the write-back cache when enabled)
+            nodes = knowledge_cache.nodes(self.db, user_id, subject_id)
 
             # Get weak nodes
-            weak_nodes = kn_query.filter(KnowledgeNode.strength_score < 0.4).all()
+            strengths = {n.topic: current_strength(n) for n in nodes}
+            weak_nodes = [n for n in nodes if strengths[n.topic] < WEAK_STRENGTH]
 
             if weak_nodes and random.random() < 0.3:
                 # Re-test weak area
                 node = random.choice(weak_nodes)
                 topic = node.topic
-                target_difficulty = max(0.1, node.strength_score)
+                # Weak foundations first: a weak or never practised prerequisite with questions left
+                graph = topic_graph.for_subject(self.db, subject_id)
+                if graph.prerequisites.get(topic):
+                    topic = topic_graph.route(
+                        graph, topic, strengths.get,
+                        lambda s: s is None or s < WEAK_STRENGTH,
+                        set(self._available_topics(subject_id, answered)),
+                    )
+                target_difficulty = max(0.1, strengths.get(topic, 0.3))
             else:
                 # Explore/Random
                 # Find available topics that have unanswered questions
-                available_topics_query = self.db.query(Question.topic)
-                if subject_id:
-                    available_topics_query = available_topics_query.filter(Question.subject_id == subject_id)
-                    
-                if answered_ids:
-                    available_topics_query = available_topics_query.filter(~Question.id.in_(answered_ids))
-                
-                available_topics = available_topics_query.distinct().all()
+                available_topics = self._available_topics(subject_id, answered)
                 
                 if available_topics:
-                    topic = random.choice(available_topics)[0]
+                    topic = random.choice(available_topics)
                     # Get current strength for this topic
-                    node = kn_query.filter(KnowledgeNode.topic == topic).first()
-                    target_difficulty = node.strength_score if node else 0.3 # Default to easy-medium if new
+                    target_difficulty = strengths.get(topic, 0.3) # Default to easy-medium if new
         
         
         # --- QUERY EXECUTION ---
@@ -113,25 +141,65 @@ class QuestionGenerator:
         if not topic:
             # Fallback for general/final mock if no weak areas found
             if subject_id:
-                fallback_q = self.db.query(Question).filter(Question.subject_id == subject_id)
-                if answered_ids:
-                    fallback_q = fallback_q.filter(~Question.id.in_(answered_ids))
-                return fallback_q.order_by(func.random()).first()
+                return self._select(subject_id, None, None, answered)
             return None
 
         # Find question with difficulty close to that strength
+        question = self._select(subject_id, topic, target_difficulty, answered)
+        if question is None and subject_id and not forced_topic:
+            # Chosen topic is exhausted or outside this subject (e.g. a weak area elsewhere)
+            question = self._select(subject_id, None, None, answered)
+        return question
+
+    def _available_topics(self, subject_id, answered):
+        """Topics that still have unanswered questions."""
+        if subject_id and config.QUESTION_SAMPLING == "index":
+            question_index.ensure_built(self.db)
+            return question_index.available_topics(subject_id, answered)
+
+        topics = self.db.query(Question.topic)
+        if subject_id:
+            topics = topics.filter(Question.subject_id == subject_id)
+        if answered:
+            topics = topics.filter(Question.id.not_in(answered))
+        return [t for (t,) in topics.distinct()]
+
+    def _select(self, subject_id, topic, target_difficulty, answered):
+        """
+        Picks an unanswered question of the topic (or whole subject if topic is None)
+        near target_difficulty. Uses the in-memory index when the subject is known
+        and QUESTION_SAMPLING is "index", otherwise the configured SQL sampler.
+        """
+        if subject_id and config.QUESTION_SAMPLING == "index":
+            question_index.ensure_built(self.db)
+            if topic is None:
+                qid = question_index.pick_any(subject_id, answered)
+            else:
+                qid = question_index.pick(subject_id, topic, target_difficulty, DIFFICULTY_WINDOW, answered)
+            if qid is None:
+                return None
+            question = self.db.get(Question, qid)
+            if question is not None:
+                return question
+            # Index is stale (question removed); rebuild on next call and use SQL for now
+            question_index.invalidate()
+
+        return self._select_sql(subject_id, topic, target_difficulty, answered)
+
+    def _select_sql(self, subject_id, topic, target_difficulty, answered):
+        if topic is None:
+            query = self.db.query(Question).filter(Question.subject_id == subject_id)
+            return self._pick_unanswered(query, answered)
+
         # Relax range for high-end questions
         query = self.db.query(Question).filter(
             Question.topic == topic,
-            Question.difficulty.between(target_difficulty - 0.3, target_difficulty + 0.3)
+            Question.difficulty.between(target_difficulty - DIFFICULTY_WINDOW, target_difficulty + DIFFICULTY_WINDOW)
         )
         if subject_id:
             query = query.filter(Question.subject_id == subject_id)
             
-        if answered_ids:
-            query = query.filter(~Question.id.in_(answered_ids))
-            
-        question = query.order_by(func.random()).first()
+        question = self._pick_unanswered(query, answered)
 
         # Fallback
         if not question:
@@ -139,12 +207,19 @@ class QuestionGenerator:
             fallback_query = self.db.query(Question).filter(Question.topic == topic)
             if subject_id:
                 fallback_query = fallback_query.filter(Question.subject_id == subject_id)
-            if answered_ids:
-                fallback_query = fallback_query.filter(~Question.id.in_(answered_ids))
-            question = fallback_query.order_by(func.random()).first()
+            question = self._pick_unanswered(fallback_query, answered)
             
         return question
 
+    def _pick_unanswered(self, query, answered):
+        """
+        Picks a random unanswered candidate with the configured sampler.
+        Only IDs cross the wire; the full row is loaded by primary key.
+        """
+        sampler = SAMPLERS.get(config.QUESTION_SAMPLING, sample_rank)
+        qid = sampler(query, answered)
+        return self.db.get(Question, qid) if qid is not None else None
+
     def seed_questions(self):
         """
         Populate the database with high-end, category-specific realistic exam questions.
@@ -207,18 +282,6 @@ class QuestionGenerator:
             ]
         }
 
-        # Mapping Helpers
-        def get_category(sub_name):
-            n = sub_name.lower()
-            if "phys" in n: return "Physics"
-            if "chem" in n: return "Chemistry"
-            if "math" in n or "quant" in n: return "Mathematics"
-            if "bio" in n or "zoo" in n or "bot" in n: return "Biology"
-            if "law" in n or "legal" in n: return "Law"
-            if "account" in n or "business" in n or "econ" in n or "cost" in n: return "Commerce"
-            if "logic" in n or "reason" in n or "aptitude" in n or "mental" in n or "general" in n or "english" in n or "verbal" in n: return "General"
-            return "General"
-
         all_subjects = self.db.query(Subject).all()
 
         for sub in all_subjects:
@@ -263,4 +326,6 @@ class QuestionGenerator:
                     count += 1
             
         self.db.commit()
+        question_index.invalidate()
+        item_bank.invalidate()
         print("High-End Question Seeding Complete!")
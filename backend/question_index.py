@@ -0,0 +1,157 @@
+from array import array
+from bisect import bisect_left, bisect_right
+import random
+import threading
+import time
+
+import config
+from models import Question
+
+# Random probes tried before falling back to a linear scan of the candidate range
+RANDOM_PROBES = 8
+
+
+class TopicBucket:
+    """Question IDs of one (subject_id, topic) pair, sorted by difficulty."""
+    __slots__ = ("difficulties", "ids")
+
+    def __init__(self):
+        self.difficulties = array("d")
+        self.ids = array("q")
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _pick_in_range(ids, lo, hi, answered):
+    """Uniform-ish random unanswered ID from ids[lo:hi], or None."""
+    if lo >= hi:
+        return None
+    for _ in range(RANDOM_PROBES):
+        qid = ids[random.randrange(lo, hi)]
+        if qid not in answered:
+            return qid
+    # Mostly answered range: scan from a random offset so picks stay spread out
+    n = hi - lo
+    start = random.randrange(n)
+    for k in range(n):
+        qid = ids[lo + (start + k) % n]
+        if qid not in answered:
+            return qid
+    return None
+
+
+class QuestionIndex:
+    """
+    Process-local index of the question bank.
+    Keeps question IDs per (subject_id, topic) in compact arrays sorted by difficulty,
+    so difficulty-window lookups are a bisect instead of a SQL scan + sort.
+    Built lazily, rebuilt after invalidate() or once it is older than QUESTION_INDEX_TTL.
+    """
+
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        self._buckets = {}   # (subject_id, topic) -> TopicBucket
+        self._subjects = {}  # subject_id -> [topic, ...]
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def build(self, db):
+        buckets = {}
+        subjects = {}
+        rows = (
+            db.query(Question.id, Question.subject_id, Question.topic, Question.difficulty)
+            .filter(Question.subject_id.isnot(None))
+            .order_by(Question.subject_id, Question.topic, Question.difficulty)
+            .yield_per(5000)
+        )
+        for qid, subject_id, topic, difficulty in rows:
+            key = (subject_id, topic)
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = TopicBucket()
+                subjects.setdefault(subject_id, []).append(topic)
+            bucket.difficulties.append(difficulty if difficulty is not None else 0.5)
+            bucket.ids.append(qid)
+
+        # Swap in one step so concurrent readers never see a half-built index
+        self._buckets, self._subjects = buckets, subjects
+        self._built_at = time.monotonic()
+
+    def _fresh(self):
+        return self._built_at is not None and not (self.ttl and time.monotonic() - self._built_at > self.ttl)
+
+    def ensure_built(self, db):
+        if self._fresh():
+            return
+        # During a rebuild other requests keep using the current index instead of waiting
+        # (an async request holds the lock across its DB awaits, on the event loop thread)
+        if not self._lock.acquire(blocking=not self._buckets):
+            return
+        try:
+            if not self._fresh():
+                self.build(db)
+        finally:
+            self._lock.release()
+
+    def invalidate(self):
+        """Call after the question bank changes; the next lookup rebuilds the index."""
+        self._built_at = None
+
+    def available_topics(self, subject_id: int, answered) -> list:
+        """Topics of the subject that still have at least one unanswered question."""
+        topics = []
+        for topic in self._subjects.get(subject_id, ()):
+            if any(qid not in answered for qid in self._buckets[(subject_id, topic)].ids):
+                topics.append(topic)
+        return topics
+
+    def pick(self, subject_id: int, topic: str, target_difficulty: float, window: float, answered):
+        """
+        Random unanswered question ID of the topic within target ± window.
+        Falls back to the unanswered question of closest difficulty.
+        """
+        bucket = self._buckets.get((subject_id, topic))
+        if bucket is None:
+            return None
+
+        diffs, ids = bucket.difficulties, bucket.ids
+        lo = bisect_left(diffs, target_difficulty - window)
+        hi = bisect_right(diffs, target_difficulty + window)
+        qid = _pick_in_range(ids, lo, hi, answered)
+        if qid is not None:
+            return qid
+
+        # Walk outwards from the target for the closest unanswered difficulty
+        left = bisect_left(diffs, target_difficulty) - 1
+        right = left + 1
+        while left >= 0 or right < len(ids):
+            if right >= len(ids) or (left >= 0 and target_difficulty - diffs[left] <= diffs[right] - target_difficulty):
+                if ids[left] not in answered:
+                    return ids[left]
+                left -= 1
+            else:
+                if ids[right] not in answered:
+                    return ids[right]
+                right += 1
+        return None
+
+    def pick_any(self, subject_id: int, answered):
+        """Random unanswered question ID from the whole subject (topics weighted by size)."""
+        topics = self._subjects.get(subject_id)
+        if not topics:
+            return None
+        buckets = [self._buckets[(subject_id, t)] for t in topics]
+        for bucket in random.choices(buckets, weights=[len(b) for b in buckets], k=RANDOM_PROBES):
+            qid = bucket.ids[random.randrange(len(bucket))]
+            if qid not in answered:
+                return qid
+        random.shuffle(buckets)
+        for bucket in buckets:
+            qid = _pick_in_range(bucket.ids, 0, len(bucket), answered)
+            if qid is not None:
+                return qid
+        return None
+
+
+question_index = QuestionIndex(ttl=config.QUESTION_INDEX_TTL)
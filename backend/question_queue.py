@@ -0,0 +1,93 @@
+from collections import OrderedDict, deque
+import threading
+
+import config
+
+
+class PrefetchQueues:
+    """
+    Server-side queue of pre-selected question IDs per attempt.
+    Filled in the background after each fetch and dropped for re-ranking after
+    each submit, so /next and /next_batch rarely run selection inline.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._queues = OrderedDict()  # attempt_id -> deque of question IDs
+        self._owners = {}             # attempt_id -> user_id
+        self._served = {}             # attempt_id -> IDs already handed to the client
+        self._refilling = set()
+        self._lock = threading.Lock()
+
+    def take(self, attempt_id: int, n: int) -> list:
+        """Pops up to n queued question IDs."""
+        with self._lock:
+            queue = self._queues.get(attempt_id)
+            if not queue:
+                return []
+            self._queues.move_to_end(attempt_id)
+            taken = [queue.popleft() for _ in range(min(n, len(queue)))]
+            self._served.setdefault(attempt_id, set()).update(taken)
+            return taken
+
+    def queued(self, attempt_id: int) -> list:
+        with self._lock:
+            return list(self._queues.get(attempt_id, ()))
+
+    def mark_served(self, attempt_id: int, user_id: int, question_ids):
+        with self._lock:
+            self._register(attempt_id, user_id)
+            self._served.setdefault(attempt_id, set()).update(question_ids)
+
+    def served(self, attempt_id: int) -> set:
+        with self._lock:
+            return set(self._served.get(attempt_id, ()))
+
+    def extend(self, attempt_id: int, user_id: int, question_ids):
+        with self._lock:
+            queue = self._register(attempt_id, user_id)
+            queue.extend(qid for qid in question_ids if qid not in queue)
+
+    def _register(self, attempt_id: int, user_id: int):
+        """Returns the attempt's queue, creating it and evicting the least recently used one if needed."""
+        queue = self._queues.get(attempt_id)
+        if queue is None:
+            queue = self._queues[attempt_id] = deque()
+            self._owners[attempt_id] = user_id
+        self._queues.move_to_end(attempt_id)
+        while len(self._queues) > self.capacity:
+            evicted, _ = self._queues.popitem(last=False)
+            self._owners.pop(evicted, None)
+            self._served.pop(evicted, None)
+        return queue
+
+    def invalidate_user(self, user_id: int) -> list:
+        """Drops all queues of a user (their mastery changed). Returns the affected attempt IDs."""
+        with self._lock:
+            attempts = [a for a, owner in self._owners.items() if owner == user_id]
+            for attempt_id in attempts:
+                queue = self._queues.get(attempt_id)
+                if queue is not None:
+                    queue.clear()
+            return attempts
+
+    def drop(self, attempt_id: int):
+        with self._lock:
+            self._queues.pop(attempt_id, None)
+            self._owners.pop(attempt_id, None)
+            self._served.pop(attempt_id, None)
+
+    def begin_refill(self, attempt_id: int) -> bool:
+        """Claims the refill of an attempt. False if one is already running."""
+        with self._lock:
+            if attempt_id in self._refilling:
+                return False
+            self._refilling.add(attempt_id)
+            return True
+
+    def end_refill(self, attempt_id: int):
+        with self._lock:
+            self._refilling.discard(attempt_id)
+
+
+prefetch_queues = PrefetchQueues(config.PREFETCH_MAX_ATTEMPTS)
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+import threading
+import time
+
+import config
+
+
+class ReadRouter:
+    """
+    Decides where read-only requests run: the read engine (replica), or the primary
+    for users who wrote within the last `window` seconds so they see their own
+    answers despite replica lag. Writers call note_write(user_id) after committing.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._recent = OrderedDict()  # user_id -> monotonic time of the write, oldest first
+        self._lock = threading.Lock()
+        self.metrics = {"replica_reads": 0, "primary_reads": 0, "read_your_writes": 0, "writes": 0}
+
+    def note_write(self, user_id: int):
+        with self._lock:
+            self._recent[user_id] = time.monotonic()
+            self._recent.move_to_end(user_id)
+            self.metrics["writes"] += 1
+
+    def use_replica(self, user_id=None) -> bool:
+        """True unless user_id wrote within the window. Counts the decision."""
+        with self._lock:
+            self._expire()
+            if user_id is not None and user_id in self._recent:
+                self.metrics["primary_reads"] += 1
+                self.metrics["read_your_writes"] += 1
+                return False
+            self.metrics["replica_reads"] += 1
+            return True
+
+    def count_primary_read(self):
+        """A read that ran on the primary because there is no read engine."""
+        with self._lock:
+            self.metrics["primary_reads"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire()
+            reads = self.metrics["replica_reads"] + self.metrics["primary_reads"]
+            return {
+                "window": self.window,
+                "recent_writers": len(self._recent),
+                "replica_share": round(self.metrics["replica_reads"] / reads, 3) if reads else None,
+                **self.metrics,
+            }
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.window
+        while self._recent:
+            user_id, written = next(iter(self._recent.items()))
+            if written >= cutoff:
+                break
+            del self._recent[user_id]
+
+
+read_router = ReadRouter(config.READ_YOUR_WRITES_SECONDS)
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+from database import SessionLocal
+from mastery_decay import decay_key
+
+def rebuild_decay_keys(db):
+    """Recomputes knowledge_nodes.decay_key for every node. Returns the number of nodes."""
+    rows = db.execute(text("SELECT id, strength_score, last_updated FROM knowledge_nodes")).fetchall()
+    for node_id, strength, last_updated in rows:
+        if isinstance(last_updated, str):
+            last_updated = datetime.fromisoformat(last_updated)
+        db.execute(
+            text("UPDATE knowledge_nodes SET decay_key = :key WHERE id = :id"),
+            {"key": decay_key(strength, last_updated), "id": node_id}
+        )
+    db.commit()
+    return len(rows)
+
+if __name__ == "__main__":
+    # Re-run after changing MASTERY_HALF_LIFE_DAYS
+    db = SessionLocal()
+    try:
+        print("--- Rebuilding decay keys ---")
+        print(f"[DONE] Updated {rebuild_decay_keys(db)} knowledge nodes")
+    finally:
+        db.close()
@@ -0,0 +1,20 @@
+from database import SessionLocal, engine
+import models
+import score_percentiles
+
+def rebuild_score_sketches():
+    """
+    Recomputes the per-exam / per-subject score sketches from completed attempts.
+    Run with the API stopped (running workers would re-flush their pending deltas on top).
+    """
+    models.Base.metadata.create_all(bind=engine, tables=[models.ScoreSketch.__table__])
+    db = SessionLocal()
+    try:
+        print("--- Rebuilding score_sketches ---")
+        count = score_percentiles.rebuild(db)
+        print(f"[DONE] Rebuilt {count} sketches")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild_score_sketches()
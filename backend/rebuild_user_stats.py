@@ -0,0 +1,21 @@
+import sys
+from database import SessionLocal, engine
+import models
+import user_stats
+
+def rebuild_user_stats(user_ids=None):
+    """
+    Backfills / repairs the user_stats table from quiz_attempts and knowledge nodes.
+    Usage: python rebuild_user_stats.py [user_id ...]   (default: every user with an attempt)
+    """
+    models.Base.metadata.create_all(bind=engine, tables=[models.UserStats.__table__])
+    db = SessionLocal()
+    try:
+        print("--- Rebuilding user_stats ---")
+        count = user_stats.rebuild(db, user_ids)
+        print(f"[DONE] Rebuilt stats for {count} users")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild_user_stats([int(a) for a in sys.argv[1:]] or None)
@@ -0,0 +1,22 @@
+import sys
+import time
+from database import SessionLocal
+from bkt import bkt_engine
+
+def replay_bkt(subject_ids=None):
+    """
+    Offline: recomputes BKT mastery for every user from question_logs and its archives.
+    Usage: python replay_bkt.py [subject_id ...]   (default: subjects in BKT_SUBJECTS)
+    Stop the server first if KNOWLEDGE_WRITE_BACK is on, or restart it afterwards.
+    """
+    db = SessionLocal()
+    try:
+        print("--- BKT Replay ---")
+        start = time.perf_counter()
+        written = bkt_engine.replay(db, subject_ids=subject_ids)
+        print(f"[DONE] Wrote {written} knowledge nodes in {time.perf_counter() - start:.1f}s")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    replay_bkt([int(a) for a in sys.argv[1:]] or None)
@@ -0,0 +1,71 @@
+import random
+
+from sqlalchemy.sql.expression import func
+
+from models import Question
+
+# Random probes tried before falling back to a single unsorted scan
+SAMPLE_RETRIES = 5
+
+
+def sample_sorted(query, answered):
+    """Legacy: ORDER BY random(), first unanswered row. Sorts the whole candidate set."""
+    rows = query.with_entities(Question.id).order_by(func.random()).yield_per(256)
+    for (qid,) in rows:
+        if qid not in answered:
+            return qid
+    return None
+
+
+def sample_rank(query, answered, retries: int = SAMPLE_RETRIES):
+    """
+    Rank-based: COUNT the candidates, then fetch the row at a random OFFSET.
+    Uniform over the candidate set, no sort.
+    """
+    ids = query.with_entities(Question.id).order_by(None)
+    n = query.with_entities(func.count(Question.id)).order_by(None).scalar() or 0
+    if n == 0:
+        return None
+    for _ in range(retries):
+        qid = ids.offset(random.randrange(n)).limit(1).scalar()
+        if qid is not None and qid not in answered:
+            return qid
+    return _scan_unanswered(ids, answered)
+
+
+def sample_id_range(query, answered, retries: int = SAMPLE_RETRIES):
+    """
+    ID-range: pick a random ID between the candidates' MIN and MAX id and take the next
+    candidate at or above it, walking the primary key. Cheapest per probe, but not uniform:
+    a candidate is picked with probability proportional to the ID gap below it, so it is
+    only close to uniform when the candidates' IDs are evenly spread.
+    """
+    ids = query.with_entities(Question.id).order_by(None)
+    lo, hi = query.with_entities(func.min(Question.id), func.max(Question.id)).order_by(None).one()
+    if lo is None:
+        return None
+    for _ in range(retries):
+        pivot = random.randint(lo, hi)
+        qid = ids.filter(Question.id >= pivot).order_by(Question.id).limit(1).scalar()
+        if qid is not None and qid not in answered:
+            return qid
+    return _scan_unanswered(ids, answered)
+
+
+def _scan_unanswered(ids, answered):
+    """Reservoir-samples one unanswered ID in a single pass (no sort)."""
+    chosen, seen = None, 0
+    for (qid,) in ids.yield_per(1000):
+        if qid in answered:
+            continue
+        seen += 1
+        if random.randrange(seen) == 0:
+            chosen = qid
+    return chosen
+
+
+SAMPLERS = {
+    "sort": sample_sorted,
+    "rank": sample_rank,
+    "idrange": sample_id_range,
+}
@@ -0,0 +1,249 @@
+from datetime import datetime
+import threading
+import time
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+import config
+import database
+from models import ScoreSketch, QuizAttempt, Subject
+from quantile_sketch import KLLSketch
+
+EXAM = "exam"
+SUBJECT = "subject"
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+def attempt_score(answered, correct):
+    """Score used for ranking: percent correct, comparable across attempt lengths."""
+    return 100.0 * (correct or 0) / answered if answered else None
+
+
+class ScorePercentiles:
+    """
+    Score distribution per exam and per subject as KLL sketches, for percentile lookups
+    without scanning quiz_attempts.
+
+    Each process records completed attempts into local delta sketches. A background thread
+    merges the deltas into the score_sketches rows every flush_seconds (optimistic version
+    check, so several workers can flush the same row) and reloads the merged sketches.
+    Lookups read the stored sketch plus the local delta.
+    Deltas not yet flushed are lost on a crash; rebuild_score_sketches.py recomputes everything.
+    """
+
+    def __init__(self, k: int, flush_seconds: float):
+        self.k = k
+        self.flush_seconds = flush_seconds
+        self._stored = {}  # (scope, scope_id) -> (loaded_at, KLLSketch)
+        self._delta = {}  # (scope, scope_id) -> KLLSketch of local completions not flushed yet
+        self._flushing = {}  # Deltas being merged into the DB right now
+        self._views = {}  # (scope, scope_id) -> stored merged with delta
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.metrics = {"recorded": 0, "flushes": 0, "conflicts": 0, "loads": 0}
+
+    # --- Recording ---
+
+    def record(self, keys, score: float):
+        with self._lock:
+            for key in keys:
+                delta = self._delta.get(key)
+                if delta is None:
+                    delta = self._delta[key] = KLLSketch(self.k)
+                delta.update(score)
+                self._views.pop(key, None)
+            self.metrics["recorded"] += 1
+
+    def record_attempt(self, db, attempt_id: int):
+        """Adds a completed attempt to its exam and subject distributions."""
+        row = db.query(
+            QuizAttempt.exam_id, QuizAttempt.subject_id, QuizAttempt.answered_count, QuizAttempt.correct_count,
+            Subject.exam_id,
+        ).outerjoin(Subject, QuizAttempt.subject_id == Subject.id).filter(QuizAttempt.id == attempt_id).first()
+        if row is None:
+            return
+        exam_id, subject_id, answered, correct, subject_exam_id = row
+        score = attempt_score(answered, correct)
+        if score is None:
+            return
+        self.record(scope_keys(exam_id or subject_exam_id, subject_id), score)
+
+    # --- Lookups ---
+
+    def sketch(self, db, scope: str, scope_id: int) -> KLLSketch:
+        """Current distribution (stored + local); the caller must not modify it."""
+        key = (scope, scope_id)
+        with self._lock:
+            view = self._views.get(key)
+            stored = self._stored.get(key)
+            if view is not None and stored is not None and stored[0] > time.monotonic() - self.flush_seconds:
+                return view
+
+        loaded = self._load(db, key)
+        with self._lock:
+            self._stored[key] = (time.monotonic(), loaded)
+            view = KLLSketch(self.k)
+            view.merge(loaded)
+            for pending in (self._flushing, self._delta):
+                if key in pending:
+                    view.merge(pending[key])
+            self._views[key] = view
+            return view
+
+    def lookup(self, db, scope: str, scope_id: int, score: float = None) -> dict:
+        """Number of ranked attempts, the score's percentile and a few quantiles of the distribution."""
+        sketch = self.sketch(db, scope, scope_id)
+        with self._lock:
+            return {
+                "attempts": sketch.n,
+                "percentile": round(sketch.percentile(score), 1) if score is not None and sketch.n else None,
+                "quantiles": {f"p{int(q * 100)}": _round(sketch.quantile(q)) for q in QUANTILES},
+            }
+
+    def _load(self, db, key) -> KLLSketch:
+        row = db.query(ScoreSketch.sketch).filter(ScoreSketch.scope == key[0], ScoreSketch.scope_id == key[1]).first()
+        self.metrics["loads"] += 1
+        return KLLSketch.from_dict(row.sketch) if row and row.sketch else KLLSketch(self.k)
+
+    # --- Flushing ---
+
+    def flush(self) -> int:
+        """Merges local deltas into score_sketches. Returns the number of rows written."""
+        with self._lock:
+            deltas, self._delta = self._delta, {}
+            self._flushing = deltas
+        if not deltas:
+            return 0
+
+        db = database.SessionLocal()
+        written = 0
+        try:
+            for key, delta in list(deltas.items()):
+                merged = self._merge_row(db, key, delta)
+                with self._lock:
+                    self._stored[key] = (time.monotonic(), merged)
+                    self._views.pop(key, None)
+                    del self._flushing[key]
+                written += 1
+        except Exception as e:
+            db.rollback()
+            print(f"Score sketch flush failed, will retry: {e}")
+            with self._lock:
+                for key, delta in self._flushing.items():
+                    if key in self._delta:
+                        delta.merge(self._delta[key])
+                    self._delta[key] = delta
+        finally:
+            with self._lock:
+                self._flushing = {}
+            db.close()
+        self.metrics["flushes"] += 1
+        return written
+
+    def _merge_row(self, db, key, delta: KLLSketch) -> KLLSketch:
+        scope, scope_id = key
+        while True:
+            row = db.query(ScoreSketch.id, ScoreSketch.sketch, ScoreSketch.version).filter(
+                ScoreSketch.scope == scope, ScoreSketch.scope_id == scope_id
+            ).first()
+            merged = KLLSketch.from_dict(row.sketch) if row and row.sketch else KLLSketch(self.k)
+            merged.merge(delta)
+            values = {"sketch": merged.to_dict(), "attempts": merged.n, "updated_at": datetime.utcnow()}
+            try:
+                if row is None:
+                    db.add(ScoreSketch(scope=scope, scope_id=scope_id, version=1, **values))
+                    db.commit()
+                    return merged
+                updated = db.query(ScoreSketch).filter(
+                    ScoreSketch.id == row.id, ScoreSketch.version == row.version
+                ).update({**values, "version": row.version + 1}, synchronize_session=False)
+                db.commit()
+                if updated:
+                    return merged
+            except IntegrityError:
+                db.rollback() # Row created by another worker
+            self.metrics["conflicts"] += 1
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="score-sketch-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending_sketches": len(self._delta), "loaded_sketches": len(self._stored), **self.metrics}
+
+
+def scope_keys(exam_id, subject_id):
+    keys = []
+    if exam_id:
+        keys.append((EXAM, exam_id))
+    if subject_id:
+        keys.append((SUBJECT, subject_id))
+    return keys
+
+
+def best_score(db, user_id: int, scope: str, scope_id: int):
+    """The user's best completed-attempt score in the exam (incl. its subjects) or subject."""
+    query = db.query(QuizAttempt.answered_count, QuizAttempt.correct_count).filter(
+        QuizAttempt.user_id == user_id, QuizAttempt.completed == True, QuizAttempt.answered_count > 0
+    )
+    if scope == EXAM:
+        subject_ids = db.query(Subject.id).filter(Subject.exam_id == scope_id)
+        query = query.filter(or_(QuizAttempt.exam_id == scope_id, QuizAttempt.subject_id.in_(subject_ids)))
+    else:
+        query = query.filter(QuizAttempt.subject_id == scope_id)
+    scores = [attempt_score(answered, correct) for answered, correct in query]
+    return max(scores, default=None)
+
+
+def rebuild(db, k: int = None) -> int:
+    """Recomputes every sketch from completed attempts and replaces score_sketches. Run offline."""
+    k = k or config.PERCENTILE_SKETCH_K
+    sketches = {}
+    rows = db.query(
+        QuizAttempt.exam_id, QuizAttempt.subject_id, QuizAttempt.answered_count, QuizAttempt.correct_count,
+        Subject.exam_id,
+    ).outerjoin(Subject, QuizAttempt.subject_id == Subject.id).filter(
+        QuizAttempt.completed == True, QuizAttempt.answered_count > 0
+    ).order_by(QuizAttempt.id)
+    for exam_id, subject_id, answered, correct, subject_exam_id in rows.yield_per(10000):
+        score = attempt_score(answered, correct)
+        for key in scope_keys(exam_id or subject_exam_id, subject_id):
+            sketch = sketches.get(key)
+            if sketch is None:
+                sketch = sketches[key] = KLLSketch(k)
+            sketch.update(score)
+
+    db.query(ScoreSketch).delete(synchronize_session=False)
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(ScoreSketch, [
+        {"scope": scope, "scope_id": scope_id, "attempts": sketch.n, "sketch": sketch.to_dict(),
+         "version": 1, "updated_at": now}
+        for (scope, scope_id), sketch in sketches.items()
+    ])
+    db.commit()
+    return len(sketches)
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+score_percentiles = ScorePercentiles(config.PERCENTILE_SKETCH_K, config.PERCENTILE_FLUSH_SECONDS)
@@ -11,9 +11,10 @@ def seed_exams():
         # Clear existing data provided we are re-seeding
         # Note: In production you'd be more careful.
         print("Clearing existing hierarchy...")
+        # Children first so foreign keys hold on PostgreSQL
+        db.query(models.Subject).delete()
         db.query(models.Exam).delete()
         db.query(models.Stream).delete()
-        db.query(models.Subject).delete()
         db.commit()
 
         # Define Hierarchy
@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+from typing import NamedTuple
+
+import networkx as nx
+
+import config
+from models import Subject
+
+# Prerequisite -> dependent topic edges per subject category (see get_category)
+PREREQUISITES = {
+    "Physics": [
+        ("Kinematics", "Laws of Motion"),
+        ("Laws of Motion", "Rotational Motion"),
+        ("Electrostatics", "Magnetism"),
+        ("Magnetism", "Modern Physics"),
+        ("Thermodynamics", "Modern Physics"),
+    ],
+    "Chemistry": [
+        ("Chemical Bonding", "Coordination Compounds"),
+        ("Chemical Bonding", "Solid State"),
+        ("Organic Chemistry", "Aldehydes & Ketones"),
+        ("Redox Reactions", "Electrochemistry"),
+    ],
+    "Mathematics": [
+        ("Calculus", "Integral Calculus"),
+        ("Quadratic Equations", "Complex Numbers"),
+        ("Permutations & Combinations", "Probability"),
+    ],
+    "Biology": [
+        ("Genetics", "Biotechnology"),
+        ("Human Physiology", "Immunology"),
+    ],
+    "Law": [
+        ("Legal Maxims", "Contract Law"),
+        ("Legal Maxims", "Law of Torts"),
+    ],
+    "Commerce": [
+        ("Accountancy Basics", "Accounting"),
+        ("Accounting", "Cost Accounting"),
+        ("Economics", "Business Studies"),
+    ],
+    "General": [],
+}
+
+
+def get_category(sub_name):
+    """Content category of a subject, from its name (e.g. "Physics", "Commerce")."""
+    n = (sub_name or "").lower()
+    if "phys" in n: return "Physics"
+    if "chem" in n: return "Chemistry"
+    if "math" in n or "quant" in n: return "Mathematics"
+    if "bio" in n or "zoo" in n or "bot" in n: return "Biology"
+    if "law" in n or "legal" in n: return "Law"
+    if "account" in n or "business" in n or "econ" in n or "cost" in n: return "Commerce"
+    if "logic" in n or "reason" in n or "aptitude" in n or "mental" in n or "general" in n or "english" in n or "verbal" in n: return "General"
+    return "General"
+
+
+class CompiledGraph(NamedTuple):
+    """Plain-tuple form of one category's graph; nothing here touches networkx at request time."""
+    prerequisites: dict  # topic -> direct prerequisites
+    ancestors: dict      # topic -> ((prerequisite, weight), ...) within the propagation depth
+    descendants: dict    # topic -> ((dependent, weight), ...) within the propagation depth
+
+
+EMPTY_GRAPH = CompiledGraph({}, {}, {})
+
+
+def compile_graph(edges, depth: int, weight: float) -> CompiledGraph:
+    """
+    Validates the edges as a DAG with networkx and precomputes, for every topic, the related
+    topics up to `depth` edges away with weight**distance. Raises ValueError on a cycle.
+    """
+    graph = nx.DiGraph(list(edges))
+    if not nx.is_directed_acyclic_graph(graph):
+        cycle = " -> ".join(u for u, _ in nx.find_cycle(graph))
+        raise ValueError(f"Prerequisite cycle: {cycle}")
+
+    def within(g, topic):
+        lengths = nx.single_source_shortest_path_length(g, topic, cutoff=depth)
+        return tuple(sorted(((t, weight ** d) for t, d in lengths.items() if d > 0), key=lambda p: -p[1]))
+
+    reverse = graph.reverse(copy=False)
+    return CompiledGraph(
+        prerequisites={t: tuple(sorted(graph.predecessors(t))) for t in graph if graph.in_degree(t)},
+        ancestors={t: within(reverse, t) for t in graph if graph.in_degree(t)},
+        descendants={t: within(graph, t) for t in graph if graph.out_degree(t)},
+    )
+
+
+def load_prerequisites(path: str) -> dict:
+    """Default edges, with categories replaced from a JSON file: {"Physics": [["Kinematics", "Laws of Motion"], ...]}."""
+    edges = dict(PREREQUISITES)
+    if path and os.path.exists(path):
+        with open(path) as f:
+            edges.update({category: [tuple(e) for e in pairs] for category, pairs in json.load(f).items()})
+    return edges
+
+
+class TopicGraph:
+    """
+    Prerequisite graphs per subject category, compiled once at import.
+    Answers move related topics' strengths by weight * (change of the answered topic):
+    gains flow to prerequisites (solving the dependent topic shows they are known),
+    losses flow to dependents (a shaky prerequisite puts them at risk).
+    Work per answer is bounded by the number of topics within `depth` edges.
+    """
+
+    def __init__(self, edges_by_category: dict, depth: int, weight: float):
+        self.depth = depth
+        self.weight = weight
+        self._graphs = {
+            category: compile_graph(edges, depth, weight) for category, edges in edges_by_category.items()
+        }
+        self._subjects = {}  # subject_id -> CompiledGraph
+        self._lock = threading.Lock()
+
+    def for_subject(self, db, subject_id) -> CompiledGraph:
+        if not subject_id:
+            return EMPTY_GRAPH
+        with self._lock:
+            graph = self._subjects.get(subject_id)
+        if graph is None:
+            name = db.query(Subject.name).filter(Subject.id == subject_id).scalar()
+            graph = self._graphs.get(get_category(name), EMPTY_GRAPH) if name else EMPTY_GRAPH
+            with self._lock:
+                self._subjects[subject_id] = graph
+        return graph
+
+    def propagation(self, graph: CompiledGraph, topic: str, delta: float):
+        """((related topic, weight), ...) to shift by weight * delta after an answer in topic."""
+        if self.depth <= 0 or not delta:
+            return ()
+        return (graph.ancestors if delta > 0 else graph.descendants).get(topic, ())
+
+    def route(self, graph: CompiledGraph, topic: str, strength_of, is_weak, available) -> str:
+        """
+        Topic to practise instead of a weak `topic`: follows weak prerequisites that still
+        have questions up the graph (at most `depth` steps); returns topic if there are none.
+        strength_of(topic) -> strength or None for never practised.
+        """
+        for _ in range(max(self.depth, 1)):
+            weak = [
+                p for p in graph.prerequisites.get(topic, ())
+                if p in available and is_weak(strength_of(p))
+            ]
+            if not weak:
+                break
+            topic = min(weak, key=lambda p: strength_of(p) or 0.0)
+        return topic
+
+
+topic_graph = TopicGraph(
+    load_prerequisites(config.TOPIC_GRAPH_FILE),
+    depth=config.TOPIC_PROPAGATION_DEPTH,
+    weight=config.TOPIC_PROPAGATION_WEIGHT,
+)
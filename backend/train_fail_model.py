@@ -0,0 +1,41 @@
+import argparse
+import time
+from database import SessionLocal
+import config
+import fail_model
+
+def train_fail_model(path=None, max_rows=1_000_000):
+    """
+    Offline: builds (topic history -> next answer wrong) examples from question_logs,
+    fits the logistic regression and pickles it for the predictor. Restart the API to load it.
+    """
+    path = path or config.FAIL_MODEL_PATH
+    db = SessionLocal()
+    try:
+        print("--- Training fail model ---")
+        start = time.perf_counter()
+        X, y, users = fail_model.build_training_set(db, max_rows=max_rows)
+        print(f"Built {len(y)} examples from {len(set(users.tolist()))} users in {time.perf_counter() - start:.1f}s")
+        if len(set(y.tolist())) < 2:
+            print("[SKIP] Need both right and wrong answers to train")
+            return
+
+        pipeline, metrics = fail_model.train(X, y, users)
+        if "holdout_auc" in metrics:
+            print(f"Holdout AUC {metrics['holdout_auc']:.3f} (heuristic {metrics['heuristic_auc']:.3f}), "
+                  f"log loss {metrics['holdout_log_loss']:.3f} (heuristic {metrics['heuristic_log_loss']:.3f})")
+        weights = pipeline.named_steps["clf"].coef_[0]
+        for name, w in zip(fail_model.FEATURES, weights):
+            print(f"  {name:<16} {w:+.3f}")
+
+        fail_model.save(pipeline, metrics, path)
+        print(f"[DONE] Saved to {path} in {time.perf_counter() - start:.1f}s")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the fail-probability model")
+    parser.add_argument("--out", help=f"Model file (default: FAIL_MODEL_PATH={config.FAIL_MODEL_PATH})")
+    parser.add_argument("--max-rows", type=int, default=1_000_000, help="Subsample examples above this")
+    args = parser.parse_args()
+    train_fail_model(args.out, args.max_rows)
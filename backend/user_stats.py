@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, case
+from sqlalchemy.exc import IntegrityError
+
+from models import UserStats, QuizAttempt
+from knowledge_cache import knowledge_cache
+from mastery_decay import current_strength
+
+
+# Incremental updates only touch existing rows: a user without a row gets it built
+# from full history on first read, which already includes those writes.
+
+def record_attempt_started(db, user_id: int):
+    """A new attempt counts as a quiz with score 0 (no commit)."""
+    db.query(UserStats).filter(UserStats.user_id == user_id).update({
+        UserStats.total_quizzes: func.coalesce(UserStats.total_quizzes, 0) + 1,
+        UserStats.updated_at: datetime.utcnow(),
+    }, synchronize_session=False)
+
+
+def record_answers(db, user_id: int, answered: int, correct: int, when: datetime = None):
+    """Folds answers into totals and the day streak with one atomic UPDATE (no commit)."""
+    today = (when or datetime.utcnow()).date()
+    row = db.query(UserStats.last_active_date, UserStats.current_streak).filter(UserStats.user_id == user_id).first()
+    if row is None:
+        return
+    last_day, streak = row
+
+    values = {
+        UserStats.total_answered: func.coalesce(UserStats.total_answered, 0) + answered,
+        UserStats.total_correct: func.coalesce(UserStats.total_correct, 0) + correct,
+        UserStats.score_sum: func.coalesce(UserStats.score_sum, 0.0) + correct, # Attempt score = correct answers
+        UserStats.updated_at: datetime.utcnow(),
+    }
+    if last_day != today:
+        streak = (streak or 0) + 1 if last_day == today - timedelta(days=1) else 1
+        values[UserStats.current_streak] = streak
+        values[UserStats.longest_streak] = case(
+            (func.coalesce(UserStats.longest_streak, 0) < streak, streak), else_=UserStats.longest_streak
+        )
+        values[UserStats.last_active_date] = today
+    db.query(UserStats).filter(UserStats.user_id == user_id).update(values, synchronize_session=False)
+
+
+def refresh_topics(db, user_id: int):
+    """
+    Re-derives strongest/weakest topic from the user's knowledge nodes (no commit).
+    Decay scales every node by the same factor per day, so the ranking stays valid until the next answer.
+    """
+    strongest, weakest = _topic_extremes(knowledge_cache.nodes(db, user_id))
+    db.query(UserStats).filter(UserStats.user_id == user_id).update({
+        UserStats.strongest_topic: strongest,
+        UserStats.weakest_topic: weakest,
+    }, synchronize_session=False)
+
+
+def _topic_extremes(nodes):
+    if not nodes:
+        return None, None
+    now = datetime.utcnow()
+    strength = lambda n: current_strength(n, now)
+    return max(nodes, key=strength).topic, min(nodes, key=strength).topic
+
+
+def reset(db, user_id: int):
+    db.query(UserStats).filter(UserStats.user_id == user_id).delete(synchronize_session=False)
+
+
+def get_stats(db, user_id: int):
+    """The user's stats row (one primary-key lookup); built from history on first access."""
+    stats = db.get(UserStats, user_id)
+    if stats is None and db.info.get("read_only"):
+        return compute_stats(db, user_id) # Persisted by the next read on the primary
+    if stats is None:
+        # Computed before the savepoint: SQLite can't turn a transaction that has already
+        # read into a writer once another connection has committed ("database is locked")
+        built = compute_stats(db, user_id)
+        try:
+            with db.begin_nested():
+                db.add(built)
+            db.commit()
+        except IntegrityError:
+            db.rollback() # Built by a concurrent request
+        stats = db.get(UserStats, user_id)
+    return stats
+
+
+def compute_stats(db, user_id: int) -> UserStats:
+    """Full recomputation from quiz_attempts, question_logs and knowledge nodes."""
+    total_quizzes, score_sum, answered, correct = db.query(
+        func.count(QuizAttempt.id),
+        func.sum(QuizAttempt.score),
+        func.sum(QuizAttempt.answered_count),
+        func.sum(QuizAttempt.correct_count),
+    ).filter(QuizAttempt.user_id == user_id).one()
+
+    # Days with at least one answer (attempt timestamps stand in for answer times)
+    days = sorted({
+        ts.date() for (ts,) in db.query(QuizAttempt.timestamp)
+        .filter(QuizAttempt.user_id == user_id, QuizAttempt.timestamp.isnot(None), QuizAttempt.answered_count > 0)
+    })
+    current, longest = 0, 0
+    for i, day in enumerate(days):
+        current = current + 1 if i and days[i - 1] == day - timedelta(days=1) else 1
+        longest = max(longest, current)
+
+    strongest, weakest = _topic_extremes(knowledge_cache.nodes(db, user_id))
+    return UserStats(
+        user_id=user_id,
+        total_quizzes=total_quizzes or 0,
+        score_sum=score_sum or 0.0,
+        total_answered=answered or 0,
+        total_correct=correct or 0,
+        strongest_topic=strongest,
+        weakest_topic=weakest,
+        current_streak=current,
+        longest_streak=longest,
+        last_active_date=days[-1] if days else None,
+        updated_at=datetime.utcnow(),
+    )
+
+
+def rebuild(db, user_ids=None) -> int:
+    """Recomputes user_stats for the given users (default: everyone with an attempt)."""
+    if user_ids is None:
+        user_ids = [uid for (uid,) in db.query(QuizAttempt.user_id).filter(QuizAttempt.user_id.isnot(None)).distinct()]
+    for user_id in user_ids:
+        db.merge(compute_stats(db, user_id))
+    db.commit()
+    return len(user_ids)
@@ -0,0 +1,108 @@
+"""
+Checks that the hot queries are index lookups. Drives the quiz flow (start, next,
+submit, batch submit, dashboard, mock exam, reset) against a throwaway SQLite database,
+captures every statement it issues and runs EXPLAIN QUERY PLAN on each.
+Fails (exit 1) if any of them scans a whole table.
+
+Two passes: with the default in-memory caches, then with the SQL question sampler
+and a cold user so the database paths behind the caches are covered too.
+
+Usage: python verify_indexes.py
+"""
+import os
+import sys
+import tempfile
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'verify.db')}"
+os.environ["WRITE_BEHIND"] = "false"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import config
+import database
+import main
+import models
+from seed_exams import seed_exams
+
+HOT_TABLES = ("questions", "question_logs", "quiz_attempts", "knowledge_nodes", "user_stats", "question_log_rollups")
+
+captured = {}  # statement -> parameters of its first run
+
+
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+        captured.setdefault(statement, parameters)
+
+
+def run_flow(client, user_id):
+    start = client.post(f"/quiz/start?user_id={user_id}", json={
+        "subject_id": 1, "type": "basics", "topic": "Magnetism", "mode": "topic_mock",
+    }).json()
+    attempt_id = start["attempt_id"]
+    for _ in range(3):
+        q = client.get(f"/quiz/{attempt_id}/next?user_id={user_id}").json()
+        client.post(f"/quiz/submit?user_id={user_id}", json={
+            "question_id": q["id"], "selected_answer": q["options"][0], "time_taken": 4.0, "attempt_id": attempt_id,
+        })
+    batch = client.get(f"/quiz/{attempt_id}/next_batch?user_id={user_id}&count=3").json()
+    client.post(f"/quiz/submit_batch?user_id={user_id}", json={"attempt_id": attempt_id, "answers": [
+        {"question_id": q["id"], "selected_answer": q["options"][1], "time_taken": 3.0} for q in batch.get("questions", [])
+    ]})
+    client.post(f"/quiz/submit?user_id={user_id}", json={"question_id": 1, "selected_answer": "x", "time_taken": 2.0})
+    client.get(f"/dashboard/stats?user_id={user_id}")
+
+    mock = client.post(f"/exam/1/start_mock?user_id={user_id}").json()
+    q = client.get(f"/quiz/{mock['attempt_id']}/next?user_id={user_id}").json()
+    client.post(f"/quiz/submit?user_id={user_id}", json={
+        "question_id": q["id"], "selected_answer": "x", "time_taken": 5.0, "attempt_id": mock["attempt_id"],
+    })
+    client.get(f"/dashboard/stats?user_id={user_id}")
+    client.post(f"/quiz/reset?user_id={user_id}")
+
+
+def full_scans(conn, statement, parameters):
+    """Plan lines that scan a hot table (SQLite reports those as "SCAN <table>")."""
+    plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    details = [row[-1] for row in plan]
+    return [d for d in details if d.startswith("SCAN") and d.split()[1] in HOT_TABLES], details
+
+
+def verify_indexes():
+    seed_exams()
+    with TestClient(main.app) as client:
+        db = database.SessionLocal()
+        db.add(models.User(username="verify", email="verify@demo.com", hashed_password="x", is_verified=True))
+        db.commit()
+        cold_user = db.query(models.User.id).filter(models.User.username == "verify").scalar()
+        db.close()
+
+        engines = [e for e in (database.engine, database.read_engine) if e is not None] + [
+            e.sync_engine for e in (database.async_engine, database.async_read_engine) if e is not None
+        ]
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", _capture)
+        run_flow(client, 1)
+        config.QUESTION_SAMPLING = "sort"
+        run_flow(client, cold_user)
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", _capture)
+
+    failures = 0
+    with database.engine.connect() as conn:
+        for statement, parameters in captured.items():
+            scans, details = full_scans(conn, statement, parameters)
+            first_line = " ".join(statement.split())[:110]
+            if scans:
+                failures += 1
+                print(f"[SCAN] {first_line}\n       {'; '.join(details)}")
+            else:
+                print(f"[OK]   {first_line}")
+
+    print(f"\n{len(captured)} statements, {failures} with full table scans")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verify_indexes() else 1)
@@ -0,0 +1,487 @@
+import glob
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque, defaultdict
+from contextlib import contextmanager
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+import config
+import database
+from models import QuestionLog, WriteBehindEntry, WriteBehindDeadLetter
+from attempt_scoring import apply_answers
+import user_stats
+from dashboard_cache import dashboard_cache
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock(f, blocking: bool = False) -> bool:
+    """Exclusive lock on an open file; False if another process holds it."""
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+class LogWriter:
+    """
+    Write-behind buffer for graded answers of session attempts.
+    Submits append their QuestionLog rows here instead of inserting them; a background
+    thread flushes every flush_ms or flush_rows rows in one transaction: a bulk insert
+    plus one aggregate UPDATE per attempt and per user (user_stats).
+
+    Durability: every row is first appended to a local JSONL journal (fsync'd per
+    WRITE_BEHIND_FSYNC) under its own entry id. The journal is rotated into a segment on
+    each flush and the segment is deleted once the flush commits; leftover segments are
+    replayed at startup. A flush records its entry ids in write_behind_entries in the same
+    transaction, and replay skips those, so a crash between commit and segment delete
+    doesn't double-count. Ids are dropped by the next flush once their segment is gone.
+
+    Each process journals to its own "<journal_path>-<pid>" and holds an exclusive lock on
+    it while running. At startup, journals whose lock is free (their process is gone) are
+    replayed, one process at a time under "<journal_path>.lock".
+
+    A batch that fails max_retries flushes in a row is written one row per transaction;
+    rows the database rejects (integrity or data errors, e.g. a question deleted since
+    the submit) go to write_behind_dead_letters so they can't block the queue. Other
+    errors (database unreachable) keep the rows queued.
+    """
+
+    def __init__(self, enabled: bool, flush_ms: int, flush_rows: int, max_queue: int,
+                 journal_path: str = None, fsync: str = "always", max_retries: int = 3):
+        self.enabled = enabled
+        self.flush_interval = flush_ms / 1000.0
+        self.flush_rows = flush_rows
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.journal_base = journal_path or None
+        self.journal_path = None  # This process's journal, set by start()
+        self.fsync = fsync
+
+        self._queue = deque()  # (user_id, row)
+        self._pending_attempts = defaultdict(int)  # attempt_id -> rows not yet flushed
+        self._pending_users = defaultdict(list)  # user_id -> question IDs not yet flushed
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._failures = 0  # Consecutive failed flushes
+
+        self._journal = None
+        self._owner_lock = None
+        self._segment = 0
+        self._cleared = 0  # Highest segment deleted from disk; its entry ids can go
+        self._last_fsync = 0.0
+
+        self.metrics = {
+            "enqueued": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "flush_failures": 0,
+            "dead_letters": 0,
+            "replayed": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+            "max_depth": 0,
+        }
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        if self.journal_base:
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_base)), exist_ok=True)
+            with self._recovery_lock():
+                self.replay()
+                self._open_journal()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flushes everything still queued and stops the worker."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+            with self._recovery_lock():
+                self._owner_lock.close()
+                self._owner_lock = None
+                if not self._segments(self.journal_path):
+                    # Clean shutdown: nothing left to replay
+                    self._clear_entries(self.journal_path)
+                    os.remove(self.journal_path)
+                    os.remove(f"{self.journal_path}.lock")
+
+    # --- Producers ---
+
+    def enqueue(self, user_id: int, rows):
+        """Journals and queues QuestionLog rows (dicts of column values)."""
+        rows = [(row, uuid.uuid4().hex if self._journal else None) for row in rows]
+        with self._cond:
+            while len(self._queue) >= self.max_queue and self._thread is not None:
+                # Backpressure: wake the worker and wait for it to drain
+                self._cond.notify_all()
+                self._cond.wait(self.flush_interval)
+
+            if self._journal:
+                for row, entry_id in rows:
+                    self._journal.write(json.dumps({"id": entry_id, "user_id": user_id, "row": row}) + "\n")
+                self._journal.flush()
+                self._sync_journal()
+
+            for row, entry_id in rows:
+                self._queue.append((user_id, row, entry_id))
+                self._pending_attempts[row["attempt_id"]] += 1
+                self._pending_users[user_id].append(row["question_id"])
+            self.metrics["enqueued"] += len(rows)
+            self.metrics["max_depth"] = max(self.metrics["max_depth"], len(self._queue))
+            if len(self._queue) >= self.flush_rows:
+                self._cond.notify_all()
+
+    def pending_answers(self, attempt_id: int) -> int:
+        """Rows of the attempt still waiting to be flushed (not in answered_count yet)."""
+        with self._cond:
+            return self._pending_attempts.get(attempt_id, 0)
+
+    def pending_question_ids(self, user_id: int):
+        with self._cond:
+            return list(self._pending_users.get(user_id, ()))
+
+    # --- Flushing ---
+
+    def flush(self) -> int:
+        """Writes every queued row in one transaction. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._cond:
+                if not self._queue:
+                    return 0
+                batch = list(self._queue)
+                self._queue.clear()
+                segment = self._rotate_journal()
+                self._cond.notify_all()
+
+            start = time.perf_counter()
+            try:
+                self._write(batch, segment)
+            except Exception as e:
+                self._failures += 1
+                if self._failures < self.max_retries:
+                    print(f"Write-behind flush failed, will retry: {e}")
+                    with self._cond:
+                        self._queue.extendleft(reversed(batch))
+                        self.metrics["flush_failures"] += 1
+                    return 0
+                print(f"Write-behind flush failed {self._failures} times, writing rows one by one: {e}")
+                return self._flush_rows(batch, segment)
+            self._failures = 0
+
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._cond:
+                for user_id, row, _ in batch:
+                    self._forget(user_id, row)
+                self.metrics["flushes"] += 1
+                self.metrics["flushed"] += len(batch)
+                self.metrics["last_flush_ms"] = round(elapsed, 2)
+                self.metrics["max_flush_ms"] = round(max(self.metrics["max_flush_ms"], elapsed), 2)
+                self.metrics["total_flush_ms"] += elapsed
+            if segment is not None:
+                self._delete_segments(segment)
+                self._cleared = segment
+            return len(batch)
+
+    def _flush_rows(self, batch, segment):
+        """Fallback flush of a failing batch; see _write_rows. Called under the flush lock."""
+        written, dead, remaining = self._write_rows(batch, segment)
+        with self._cond:
+            for user_id, row, _ in batch[:len(batch) - len(remaining)]:
+                self._forget(user_id, row)
+            self._queue.extendleft(reversed(remaining))
+            self.metrics["flushed"] += written
+            self.metrics["dead_letters"] += dead
+            if remaining:
+                self.metrics["flush_failures"] += 1
+        if not remaining:
+            self._failures = 0
+            if segment is not None:
+                self._delete_segments(segment)
+                self._cleared = segment
+        return written
+
+    def _write_rows(self, batch, segment: int = None, journal: str = None):
+        """
+        Writes rows one transaction each; rows the database rejects are dead-lettered.
+        Stops at any other error. Returns (written, dead-lettered, rows not yet handled).
+        """
+        written = dead = 0
+        for i, item in enumerate(batch):
+            try:
+                try:
+                    written += self._write([item], segment, journal)
+                except (IntegrityError, DataError) as e:
+                    self._dead_letter(item, e, segment, journal)
+                    dead += 1
+            except Exception as e:
+                print(f"Write-behind row write failed, keeping {len(batch) - i} rows queued: {e}")
+                return written, dead, batch[i:]
+        return written, dead, []
+
+    def _dead_letter(self, item, error, segment: int = None, journal: str = None):
+        user_id, row, entry_id = item
+        db = database.SessionLocal()
+        try:
+            db.add(WriteBehindDeadLetter(
+                user_id=user_id, attempt_id=row.get("attempt_id"), row=row, error=str(getattr(error, "orig", error))[:1000],
+            ))
+            if segment is not None and entry_id:
+                db.add(WriteBehindEntry(id=entry_id, journal=_entry_journal(journal or self.journal_path), segment=segment))
+            db.commit()
+        finally:
+            db.close()
+
+    def _write(self, batch, segment: int = None, journal: str = None, skip_applied: bool = False):
+        """journal: path whose entry ids are recorded (default: this process's journal)."""
+        journal = _entry_journal(journal or self.journal_path) if segment is not None else None
+        db = database.SessionLocal()
+        try:
+            if skip_applied:
+                batch = self._unapplied(db, batch, journal)
+            db.bulk_insert_mappings(QuestionLog, [row for _, row, _ in batch])
+            if segment is not None:
+                db.bulk_insert_mappings(WriteBehindEntry, [
+                    {"id": entry_id, "journal": journal, "segment": segment}
+                    for _, _, entry_id in batch if entry_id
+                ])
+                if self._cleared:
+                    db.query(WriteBehindEntry).filter(
+                        WriteBehindEntry.journal == journal, WriteBehindEntry.segment <= self._cleared
+                    ).delete(synchronize_session=False)
+
+            totals = defaultdict(lambda: [0, 0, 0.0])
+            user_totals = defaultdict(lambda: [0, 0])
+            for user_id, row, _ in batch:
+                t = totals[row["attempt_id"]]
+                t[0] += 1
+                t[1] += int(bool(row["is_correct"]))
+                t[2] += row["time_taken"] or 0.0
+                u = user_totals[user_id]
+                u[0] += 1
+                u[1] += int(bool(row["is_correct"]))
+            for attempt_id, (answered, correct, time_taken) in totals.items():
+                apply_answers(db, attempt_id, answered, correct, time_taken)
+            for user_id, (answered, correct) in user_totals.items():
+                user_stats.record_answers(db, user_id, answered, correct)
+            db.commit()
+            dashboard_cache.invalidate_many(user_totals)
+            return len(batch)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _unapplied(self, db, batch, journal: str):
+        """Journal entries whose flush didn't commit."""
+        applied = {entry_id for (entry_id,) in
+                   db.query(WriteBehindEntry.id).filter(WriteBehindEntry.journal == journal)}
+        # Lines journaled before entry ids existed: fall back to the logged (attempt, question) pairs
+        legacy_attempts = {row["attempt_id"] for _, row, entry_id in batch if entry_id is None}
+        logged = set(
+            db.query(QuestionLog.attempt_id, QuestionLog.question_id)
+            .filter(QuestionLog.attempt_id.in_(legacy_attempts)).all()
+        ) if legacy_attempts else set()
+        fresh = []
+        for user_id, row, entry_id in batch:
+            if entry_id is None:
+                key = (row["attempt_id"], row["question_id"])
+                if key in logged:
+                    continue
+                logged.add(key)
+            elif entry_id in applied:
+                continue
+            fresh.append((user_id, row, entry_id))
+        return fresh
+
+    def _clear_entries(self, path: str):
+        """Drops a journal's entry ids once no segment of it is left on disk."""
+        db = database.SessionLocal()
+        try:
+            db.query(WriteBehindEntry).filter(WriteBehindEntry.journal == _entry_journal(path)).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _forget(self, user_id, row):
+        attempt_id = row["attempt_id"]
+        self._pending_attempts[attempt_id] -= 1
+        if self._pending_attempts[attempt_id] <= 0:
+            del self._pending_attempts[attempt_id]
+        pending = self._pending_users.get(user_id)
+        if pending:
+            pending.remove(row["question_id"])
+            if not pending:
+                del self._pending_users[user_id]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._queue) < self.flush_rows:
+                    self._cond.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            self.flush()
+
+    # --- Journal ---
+
+    @contextmanager
+    def _recovery_lock(self):
+        """Serializes replay and journal hand-over between processes."""
+        with open(f"{self.journal_base}.lock", "a") as guard:
+            _lock(guard, blocking=True)
+            yield
+
+    def _open_journal(self):
+        self.journal_path = f"{self.journal_base}-{os.getpid()}"
+        self._owner_lock = open(f"{self.journal_path}.lock", "a")
+        if not _lock(self._owner_lock):
+            raise RuntimeError(f"Write-behind journal {self.journal_path} is locked by another process")
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _sync_journal(self):
+        if self.fsync == "always":
+            os.fsync(self._journal.fileno())
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.flush_interval:
+                os.fsync(self._journal.fileno())
+                self._last_fsync = now
+
+    def _rotate_journal(self):
+        """Closes the active journal as a numbered segment. Called under the queue lock."""
+        if not self._journal:
+            return None
+        self._journal.flush()
+        if self.fsync != "off":
+            os.fsync(self._journal.fileno())
+        self._journal.close()
+        self._segment += 1
+        os.replace(self.journal_path, f"{self.journal_path}.{self._segment}")
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        return self._segment
+
+    def _delete_segments(self, upto: int):
+        for path, number in self._segments(self.journal_path):
+            if number <= upto:
+                os.remove(path)
+
+    @staticmethod
+    def _segments(journal: str):
+        found = []
+        for path in glob.glob(f"{glob.escape(journal)}.*"):
+            suffix = path.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                found.append((path, int(suffix)))
+        return sorted(found, key=lambda pair: pair[1])
+
+    def replay(self) -> int:
+        """
+        Re-applies journals left by processes that are gone (their lock is free), including
+        a pre per-process "<journal_path>" journal. Safe to run more than once; start() runs
+        it holding "<journal_path>.lock" so processes don't replay the same journal.
+        """
+        written = self._replay_journal(self.journal_base)
+        prefix = f"{self.journal_base}-"
+        owners = {path[len(prefix):].split(".", 1)[0] for path in glob.glob(f"{glob.escape(prefix)}*")}
+        for pid in sorted(p for p in owners if p.isdigit()):
+            journal = f"{prefix}{pid}"
+            with open(f"{journal}.lock", "a") as owner:
+                if not _lock(owner):
+                    continue # Live process
+                written += self._replay_journal(journal)
+            os.remove(f"{journal}.lock")
+        return written
+
+    def _replay_journal(self, journal: str) -> int:
+        paths = [path for path, _ in self._segments(journal)]
+        if os.path.exists(journal):
+            paths.append(journal)
+        batch = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break # Torn write at the tail
+                    batch.append((entry["user_id"], entry["row"], entry.get("id")))
+        dead = 0
+        try:
+            written = self._write(batch, segment=0, journal=journal, skip_applied=True) if batch else 0
+        except Exception as e:
+            print(f"Write-behind replay of {journal} failed, writing rows one by one: {e}")
+            db = database.SessionLocal()
+            try:
+                fresh = self._unapplied(db, batch, _entry_journal(journal))
+            finally:
+                db.close()
+            written, dead, remaining = self._write_rows(fresh, segment=0, journal=journal)
+            self.metrics["dead_letters"] += dead
+            if remaining:
+                raise RuntimeError(f"Could not replay {len(remaining)} answers from {journal}")
+        for path in paths:
+            os.remove(path)
+        self._clear_entries(journal)
+        if batch:
+            self.metrics["replayed"] += written
+            print(f"Write-behind: replayed {written} answers from {journal} "
+                  f"({len(batch) - written - dead} already logged, {dead} dead-lettered)")
+        return written
+
+    def stats(self) -> dict:
+        with self._cond:
+            flushes = self.metrics["flushes"]
+            return {
+                "enabled": self.enabled,
+                "queue_depth": len(self._queue),
+                "journal": self.journal_path,
+                **{k: (round(v, 2) if isinstance(v, float) else v) for k, v in self.metrics.items()},
+                "avg_flush_ms": round(self.metrics["total_flush_ms"] / flushes, 2) if flushes else 0.0,
+            }
+
+
+def _entry_journal(path: str) -> str:
+    """Journal name stored with entry ids; processes on other hosts may share the database."""
+    return f"{socket.gethostname()}:{os.path.basename(path)}"
+
+
+log_writer = LogWriter(
+    enabled=config.WRITE_BEHIND,
+    flush_ms=config.WRITE_BEHIND_FLUSH_MS,
+    flush_rows=config.WRITE_BEHIND_FLUSH_ROWS,
+    max_queue=config.WRITE_BEHIND_MAX_QUEUE,
+    journal_path=config.WRITE_BEHIND_JOURNAL,
+    fsync=config.WRITE_BEHIND_FSYNC,
+    max_retries=config.WRITE_BEHIND_MAX_RETRIES,
+)
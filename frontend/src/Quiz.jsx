@@ -163,7 +163,8 @@ export default function Quiz() {
                 await submitAnswer(1, {
                     question_id: currentQ.id,
                     selected_answer: ans,
-                    time_taken: (180 * 60) - timer // time taken = max - current
+                    time_taken: (180 * 60) - timer, // time taken = max - current
+                    attempt_id: quizId
                 });
             } catch (e) {
                 console.error("Save failed", e);
@@ -187,7 +188,8 @@ export default function Quiz() {
                 await submitAnswer(1, {
                     question_id: currentQ.id,
                     selected_answer: ans,
-                    time_taken: (180 * 60) - timer
+                    time_taken: (180 * 60) - timer,
+                    attempt_id: quizId
                 });
             } catch (e) { console.error(e); }
         }
@@ -17,7 +17,10 @@ export const getNextQuestion = (userId, quizId = null, subjectId = null) => {
     return api.get(url);
 };
 export const submitAnswer = (user_id, data) => api.post(`/quiz/submit?user_id=${user_id}`, data);
+export const submitAnswerBatch = (user_id, data) => api.post(`/quiz/submit_batch?user_id=${user_id}`, data);
 export const getDashboardStats = (userId) => api.get(`/dashboard/stats?user_id=${userId}`);
+export const getExamPercentile = (examId, userId) => api.get(`/leaderboard/exam/${examId}?user_id=${userId}`);
+export const getSubjectPercentile = (subjectId, userId) => api.get(`/leaderboard/subject/${subjectId}?user_id=${userId}`);
 // Multi-Stream Hierarchy
 export const getStreams = () => api.get('/streams');
 export const getExams = (streamId) => api.get(`/exams?stream_id=${streamId}`);
@@ -27,6 +30,7 @@ export const getQuizTypes = () => api.get('/quiz-types');
 export const startQuizSession = (subjectId, type, userId, topic = null, mode = 'practice') => api.post(`/quiz/start?user_id=${userId}`, { subject_id: subjectId, type });
 export const startMockExam = (examId, userId) => api.post(`/exam/${examId}/start_mock?user_id=${userId}`);
 export const getNextQuestionForAttempt = (attemptId) => api.get(`/quiz/${attemptId}/next`);
+export const getNextQuestionsBatch = (attemptId, n = 5) => api.get(`/quiz/${attemptId}/next_batch?n=${n}`);
 export const getAdaptiveQuestion = (subjectId, attemptId, userId) => api.get(`/quiz/question/next?subject_id=${subjectId}&attempt_id=${attemptId}&user_id=${userId}`);
 
 